@@ -0,0 +1,17 @@
+import pytest
+from django.core.cache import cache
+
+from core.testing import isolated_caches
+
+
+@pytest.fixture(scope='session', autouse=True)
+def isolated_cache_files():
+    with isolated_caches():
+        yield
+
+
+@pytest.fixture(autouse=True)
+def clear_cache(isolated_cache_files):
+    # Данные теста откатываются вместе с транзакцией, а сброс кэша
+    # после фиксации так и не выполняется.
+    cache.clear()
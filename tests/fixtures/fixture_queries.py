@@ -0,0 +1,14 @@
+import pytest
+from django.core.cache import cache
+
+from core.testing import request_within_budget
+
+
+@pytest.fixture
+def query_budget():
+    """Return a function that makes a client request and fails when it
+    issues more SQL queries than `core.testing.QUERY_BUDGETS` allows."""
+    def check(client, path, method='get', **kwargs):
+        cache.clear()
+        return request_within_budget(client, path, method, **kwargs)
+    return check
@@ -0,0 +1,25 @@
+import pytest
+
+from posts.models import Post
+
+pytestmark = [pytest.mark.django_db]
+
+
+class TestQueryBudget:
+
+    def test_feed_pages_within_budget(self, mixer, user_client, user, group, query_budget):
+        posts = mixer.cycle(20).blend(Post, author=user, group=group, image='')
+        urls = (
+            '/',
+            f'/group/{group.slug}/',
+            f'/profile/{user.username}/',
+            f'/posts/{posts[0].id}/',
+            '/follow/',
+        )
+        for url in urls:
+            response = query_budget(user_client, url)
+            assert response.status_code == 200, f'Страница `{url}` работает неправильно'
+
+    def test_comment_within_budget(self, user_client, post, query_budget):
+        response = query_budget(user_client, f'/posts/{post.id}/comment/', 'post', data={'text': 'Комментарий'})
+        assert response.status_code in (301, 302), 'Проверьте, что после комментария происходит редирект'
@@ -0,0 +1,419 @@
+"""Бэкенды кэша.
+
+TieredCache — двухуровневый кэш: небольшой LRU в памяти процесса перед
+общим для всех процессов кэшем (SQLiteCache в файле). Он же умеет
+get_or_set без «стада»: значение вычисляет один вызов на ключ, а
+остальные ждут его или получают прежнее значение, и пересчитывает
+значение заранее, с вероятностью, растущей к концу срока жизни.
+"""
+import math
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache as BaseLocMemCache
+
+from .instrumentation import InstrumentedCacheMixin, record_cache
+
+
+class LocMemCache(InstrumentedCacheMixin, BaseLocMemCache):
+    pass
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в файле SQLite, общий для всех процессов на машине."""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.location = location
+        self._local = threading.local()
+
+    @property
+    def _connection(self):
+        # После fork соединение родителя использовать нельзя.
+        if getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(
+                self.location, timeout=5, isolation_level=None,
+                check_same_thread=False,
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+            )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def _key(self, key, version):
+        key = self.make_key(key, version)
+        self.validate_key(key)
+        return key
+
+    def _expires(self, timeout):
+        # get_backend_timeout возвращает момент истечения, а не срок.
+        return self.get_backend_timeout(timeout)
+
+    def _rows(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        placeholders = ', '.join('?' * len(keys))
+        rows = self._connection.execute(
+            f'SELECT key, value FROM cache WHERE key IN ({placeholders}) '
+            f'AND (expires IS NULL OR expires > ?)',
+            (*keys, time.time()),
+        )
+        return {key: pickle.loads(value) for key, value in rows}
+
+    def _write(self, items, expires):
+        self._connection.executemany(
+            'INSERT OR REPLACE INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)',
+            [(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires)
+             for key, value in items],
+        )
+        if random.random() < 1 / self._cull_frequency / 100:
+            self._cull()
+
+    def _cull(self):
+        connection = self._connection
+        connection.execute(
+            'DELETE FROM cache WHERE expires <= ?', (time.time(),)
+        )
+        count, = connection.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if count > self._max_entries:
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY expires IS NULL, expires LIMIT ?)',
+                (count // self._cull_frequency,),
+            )
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        return self._rows([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        made = {self._key(key, version): key for key in keys}
+        return {made[key]: value for key, value in self._rows(made).items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write([(self._key(key, version), value)],
+                    self._expires(timeout))
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._connection:
+            self._connection.execute('BEGIN')
+            self._write(
+                [(self._key(key, version), value)
+                 for key, value in data.items()],
+                self._expires(timeout),
+            )
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._connection:
+            self._connection.execute('BEGIN IMMEDIATE')
+            self._connection.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, time.time()),
+            )
+            cursor = self._connection.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                 self._expires(timeout)),
+            )
+            return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        # BEGIN IMMEDIATE не даёт другому процессу прочитать старое
+        # значение между чтением и записью.
+        with self._connection:
+            self._connection.execute('BEGIN IMMEDIATE')
+            row = self._connection.execute(
+                'SELECT value, expires FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)', (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            self._connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key),
+            )
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self._connection.execute(
+            'UPDATE cache SET expires = ? WHERE key = ?',
+            (self._expires(timeout), self._key(key, version)),
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        self._connection.executemany(
+            'DELETE FROM cache WHERE key = ?',
+            [(self._key(key, version),) for key in keys],
+        )
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return key in self._rows([key])
+
+    def clear(self):
+        self._connection.execute('DELETE FROM cache')
+
+
+# Значение, сохранённое get_or_set: срок жизни и время вычисления нужны
+# для досрочного пересчёта.
+Fresh = namedtuple('Fresh', 'value expires delta')
+
+_MISSING = object()
+
+
+def _unwrap(value):
+    return value.value if isinstance(value, Fresh) else value
+
+
+# Экземпляры бэкендов в Django свои у каждого потока, а локальный
+# уровень должен быть общим для процесса, как в LocMemCache.
+_lrus = {}
+_flights = {}
+_registry_lock = threading.Lock()
+
+
+class BaseTieredCache(BaseCache):
+    """LRU в памяти процесса перед общим кэшем SHARED.
+
+    Локальная копия живёт не дольше LOCAL_TIMEOUT секунд: удаление
+    ключа в другом процессе становится видно здесь не позже этого срока.
+    Ключи, начинающиеся с SHARED_ONLY_PREFIXES, локально не хранятся:
+    их изменения в другом процессе должны быть видны сразу.
+    """
+    # Сколько секунд вычисление значения может держать ключ занятым.
+    LOCK_TIMEOUT = 30
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options.get('SHARED', 'shared')
+        self._local_max_entries = options.get('LOCAL_MAX_ENTRIES', 1000)
+        self._local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self._shared_only = tuple(options.get('SHARED_ONLY_PREFIXES', ()))
+        self._beta = options.get('EARLY_EXPIRATION_BETA', 1.0)
+        name = location or self._shared_alias
+        with _registry_lock:
+            self._lru, self._lru_lock = _lrus.setdefault(
+                name, (OrderedDict(), threading.Lock())
+            )
+            self._flights, self._flights_lock = _flights.setdefault(
+                name, ({}, threading.Lock())
+            )
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _local_key(self, key, version):
+        """Ключ локального уровня или None, если ключ там не хранится."""
+        if key.startswith(self._shared_only):
+            return None
+        return self.make_key(key, version)
+
+    def _local_get(self, key):
+        if key is None:
+            return _MISSING
+        with self._lru_lock:
+            value, expires = self._lru.get(key, (_MISSING, 0))
+            if value is _MISSING:
+                return _MISSING
+            if expires <= time.monotonic():
+                del self._lru[key]
+                return _MISSING
+            self._lru.move_to_end(key)
+        return pickle.loads(value)
+
+    def _local_set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        if key is None:
+            return
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is not None and timeout <= 0:
+            return self._local_delete(key)
+        if timeout is None or timeout > self._local_timeout:
+            timeout = self._local_timeout
+        # Значения хранятся сериализованными, чтобы потоки не делили
+        # один изменяемый объект, например HttpResponse.
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lru_lock:
+            self._lru[key] = (value, time.monotonic() + timeout)
+            self._lru.move_to_end(key)
+            while len(self._lru) > self._local_max_entries:
+                self._lru.popitem(last=False)
+
+    def _local_delete(self, key):
+        if key is None:
+            return
+        with self._lru_lock:
+            self._lru.pop(key, None)
+
+    def _get_entry(self, key, version):
+        made = self._local_key(key, version)
+        value = self._local_get(made)
+        if value is _MISSING:
+            value = self.shared.get(key, _MISSING, version)
+            if value is not _MISSING:
+                self._local_set(made, value)
+        return value
+
+    def get(self, key, default=None, version=None):
+        value = self._get_entry(key, version)
+        if value is _MISSING:
+            return default
+        return _unwrap(value)
+
+    def get_many(self, keys, version=None):
+        found = {}
+        missing = []
+        for key in keys:
+            value = self._local_get(self._local_key(key, version))
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        for key, value in self.shared.get_many(missing, version).items():
+            self._local_set(self._local_key(key, version), value)
+            found[key] = value
+        return {
+            key: _unwrap(value)
+            for key, value in found.items()
+        }
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version)
+        self._local_set(self._local_key(key, version), value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set_many(data, timeout, version)
+        for key, value in data.items():
+            self._local_set(self._local_key(key, version), value, timeout)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version)
+        if added:
+            self._local_set(self._local_key(key, version), value, timeout)
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        self._local_delete(self._local_key(key, version))
+        return self.shared.incr(key, delta, version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._local_delete(self._local_key(key, version))
+        return self.shared.touch(key, timeout, version)
+
+    def delete(self, key, version=None):
+        self._local_delete(self._local_key(key, version))
+        self.shared.delete(key, version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        for key in keys:
+            self._local_delete(self._local_key(key, version))
+        self.shared.delete_many(keys, version)
+
+    def has_key(self, key, version=None):
+        return self._get_entry(key, version) is not _MISSING
+
+    def clear(self):
+        with self._lru_lock:
+            self._lru.clear()
+        self.shared.clear()
+
+    def _is_stale(self, entry):
+        """Досрочный пересчёт (XFetch): чем ближе конец срока и чем
+        дольше вычисляется значение, тем вероятнее пересчёт."""
+        if entry.expires is None:
+            return False
+        early = entry.delta * self._beta * -math.log(1 - random.random())
+        return time.time() + early >= entry.expires
+
+    @contextmanager
+    def _flight_lock(self, key):
+        """Блокировка вычисления ключа в этом процессе. Запись о ней
+        удаляется, когда блокировку больше никто не ждёт."""
+        with self._flights_lock:
+            flight = self._flights.setdefault(key, [threading.Lock(), 0])
+            flight[1] += 1
+        try:
+            with flight[0]:
+                yield
+        finally:
+            with self._flights_lock:
+                flight[1] -= 1
+                if not flight[1]:
+                    del self._flights[key]
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT,
+                   version=None):
+        """Как BaseCache.get_or_set, но default вычисляется одним
+        вызовом на ключ во всех потоках и процессах. Если default вернул
+        None, ничего не сохраняется."""
+        entry = self._get_entry(key, version)
+        if entry is not _MISSING and not (
+            isinstance(entry, Fresh) and self._is_stale(entry)
+        ):
+            record_cache(1, 0)
+            return _unwrap(entry)
+        record_cache(0, 1)
+        made = self.make_key(key, version)
+        with self._flight_lock(made):
+            # Пока ждали блокировку, значение мог обновить другой поток.
+            fresh = self._get_entry(key, version)
+            if fresh is not _MISSING and not (
+                isinstance(fresh, Fresh) and self._is_stale(fresh)
+            ):
+                return _unwrap(fresh)
+            lock_key = f'{made}:single-flight'
+            deadline = time.monotonic() + self.LOCK_TIMEOUT
+            while not self.shared.add(lock_key, 1, self.LOCK_TIMEOUT):
+                # Значение вычисляет другой процесс: пока есть старое
+                # значение, отдаём его, иначе ждём нового.
+                if entry is not _MISSING:
+                    return _unwrap(entry)
+                time.sleep(0.05)
+                entry = self._get_entry(key, version)
+                if entry is not _MISSING:
+                    return _unwrap(entry)
+                if time.monotonic() > deadline:
+                    break
+            try:
+                started = time.time()
+                value = default() if callable(default) else default
+                if value is not None:
+                    expires = self.get_backend_timeout(timeout)
+                    delta = time.time() - started
+                    self.set(key, Fresh(value, expires, delta), timeout,
+                             version)
+            finally:
+                self.shared.delete(lock_key)
+        return value
+
+
+class TieredCache(InstrumentedCacheMixin, BaseTieredCache):
+    pass
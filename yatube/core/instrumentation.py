@@ -0,0 +1,130 @@
+import threading
+import time
+
+from django.template.base import Template
+
+_local = threading.local()
+
+
+class RequestStats:
+    """Показатели производительности одного запроса."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_time = 0.0
+        self.queries = 0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.queries += 1
+
+    def record_cache(self, hits, misses):
+        self.cache_hits += hits
+        self.cache_misses += misses
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.started
+
+    def as_dict(self):
+        return {
+            'total_ms': round(self.total_time * 1000, 2),
+            'sql_ms': round(self.sql_time * 1000, 2),
+            'queries': self.queries,
+            'template_ms': round(self.template_time * 1000, 2),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+        }
+
+    def server_timing(self):
+        """Значение заголовка Server-Timing."""
+        return ', '.join((
+            f'sql;dur={self.sql_time * 1000:.2f};'
+            f'desc="{self.queries} queries"',
+            f'tpl;dur={self.template_time * 1000:.2f}',
+            f'cache;desc="{self.cache_hits} hits, '
+            f'{self.cache_misses} misses"',
+            f'total;dur={self.total_time * 1000:.2f}',
+        ))
+
+
+def current_stats():
+    """Показатели запроса, который сейчас измеряется, или None."""
+    return getattr(_local, 'stats', None)
+
+
+def start_request():
+    _local.stats = RequestStats()
+    return _local.stats
+
+
+def finish_request():
+    _local.stats = None
+
+
+def record_cache(hits, misses):
+    stats = current_stats()
+    if stats is not None:
+        stats.record_cache(hits, misses)
+
+
+def instrument_templates():
+    """Учитывает время отрисовки шаблонов в показателях запроса.
+
+    Считается только внешний шаблон, чтобы {% include %} и {% extends %}
+    не учитывались дважды.
+    """
+    render = Template.render
+    if getattr(render, 'instrumented', False):
+        return
+
+    def timed_render(self, context):
+        stats = current_stats()
+        if stats is None:
+            return render(self, context)
+        stats.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            stats.template_depth -= 1
+            if not stats.template_depth:
+                stats.template_time += time.perf_counter() - started
+
+    timed_render.instrumented = True
+    Template.render = timed_render
+
+
+class InstrumentedCacheMixin:
+    """Учитывает попадания и промахи кэша в показателях запроса."""
+
+    def get(self, key, default=None, version=None):
+        sentinel = object()
+        value = super().get(key, sentinel, version)
+        if getattr(_local, 'in_get_many', False):
+            return default if value is sentinel else value
+        if value is sentinel:
+            record_cache(0, 1)
+            return default
+        record_cache(1, 0)
+        return value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        # Базовый get_many вызывает get для каждого ключа: такие вызовы
+        # уже учтены здесь и не должны считаться второй раз.
+        _local.in_get_many = True
+        try:
+            values = super().get_many(keys, version)
+        finally:
+            _local.in_get_many = False
+        record_cache(len(values), len(keys) - len(values))
+        return values
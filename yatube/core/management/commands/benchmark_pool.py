@@ -0,0 +1,109 @@
+import copy
+import threading
+import time
+from io import BytesIO
+from urllib.parse import urlencode, urlsplit
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.urls import reverse
+
+from yatube.db.backends.sqlite3.pool import pool_stats
+
+# Адрес вне INTERNAL_IPS, чтобы не подключалась debug_toolbar.
+REMOTE_ADDR = '203.0.113.1'
+
+
+def environ(path):
+    url = urlsplit(path)
+    return {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': url.path,
+        'QUERY_STRING': url.query,
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'REMOTE_ADDR': REMOTE_ADDR,
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': BytesIO(),
+        'wsgi.errors': BytesIO(),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        'wsgi.version': (1, 0),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает число запросов в секунду к странице с пулом '
+            'соединений и без него. Запросы идут через WSGI-обработчик, '
+            'поэтому соединение закрывается в конце каждого запроса, как '
+            'на сервере.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument(
+            '--path', default=None,
+            help='Страница без кэша, по умолчанию — поиск.',
+        )
+
+    def run(self, handler, path, threads, seconds):
+        done = []
+        failed = []
+
+        def start_response(status, headers):
+            if not status.startswith('200'):
+                failed.append(status)
+
+        def work():
+            count = 0
+            deadline = time.perf_counter() + seconds
+            try:
+                while time.perf_counter() < deadline:
+                    response = handler(environ(path), start_response)
+                    b''.join(response)
+                    # Как WSGI-сервер: close() отправляет request_finished,
+                    # и Django закрывает соединение с базой.
+                    response.close()
+                    count += 1
+            except Exception as error:
+                failed.append(repr(error))
+            done.append(count)
+
+        workers = [threading.Thread(target=work) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        if failed:
+            raise CommandError(f'{path}: ответ {failed[0]}')
+        return sum(done) / seconds
+
+    def handle(self, *args, **options):
+        path = options['path'] or (
+            reverse('posts:search') + '?' + urlencode({'q': 'пост'})
+        )
+        settings_dict = connections.databases[DEFAULT_DB_ALIAS]
+        saved = copy.deepcopy(settings_dict['OPTIONS'])
+        pool = saved.get('pool') or {'size': options['threads']}
+        handler = WSGIHandler()
+        self.stdout.write(
+            f'{path}: {options["threads"]} потоков, '
+            f'{options["seconds"]:g} с на режим'
+        )
+        try:
+            for mode, pool_options in (
+                ('без пула', {'size': 0}),
+                ('с пулом', pool),
+            ):
+                # Новые потоки создают соединения по этим настройкам.
+                settings_dict['OPTIONS'] = {**saved, 'pool': pool_options}
+                rate = self.run(
+                    handler, path, options['threads'], options['seconds']
+                )
+                self.stdout.write(f'{mode:<10}{rate:>10.0f} запросов/с')
+        finally:
+            settings_dict['OPTIONS'] = saved
+        for alias, stats in pool_stats().items():
+            self.stdout.write(f'Пул {alias}: {stats}')
@@ -0,0 +1,175 @@
+import math
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from yatube.db.backends.sqlite3.base import DEFAULT_PRAGMAS, apply_pragmas
+
+# Режимы сравнения: PRAGMA и начало транзакции. «default» — как SQLite
+# и Django работают без настроек.
+MODES = {
+    'default': ({}, 'DEFERRED'),
+    'tuned': (DEFAULT_PRAGMAS, 'IMMEDIATE'),
+}
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, author_id INTEGER, '
+    'text TEXT, pub_date REAL)',
+    'CREATE INDEX post_pub_date_idx ON post (pub_date DESC, id DESC)',
+    'CREATE INDEX post_author_idx ON post (author_id, pub_date DESC)',
+)
+AUTHORS = 1000
+
+
+def connect(path, mode):
+    pragmas, _ = MODES[mode]
+    # Без PRAGMA busy_timeout действует timeout модуля sqlite3 — 5 с.
+    connection = sqlite3.connect(path, isolation_level=None)
+    apply_pragmas(connection, pragmas)
+    return connection
+
+
+def read(connection, rng, rows):
+    """Страница ленты, как на главной."""
+    connection.execute(
+        'SELECT id, author_id, text FROM post '
+        'ORDER BY pub_date DESC, id DESC LIMIT 10 OFFSET ?',
+        [rng.randrange(min(rows, 1000))],
+    ).fetchall()
+
+
+def write(connection, rng, transaction_mode):
+    """Новый пост: как post_create, транзакция сначала читает, потом
+    пишет."""
+    author = rng.randrange(AUTHORS)
+    connection.execute(f'BEGIN {transaction_mode}')
+    try:
+        connection.execute(
+            'SELECT count(*) FROM post WHERE author_id = ?', [author]
+        ).fetchone()
+        connection.execute(
+            'INSERT INTO post (author_id, text, pub_date) VALUES (?, ?, ?)',
+            [author, 'Пост из нагрузочного теста', time.time()],
+        )
+        connection.execute('COMMIT')
+    except sqlite3.OperationalError:
+        connection.execute('ROLLBACK')
+        raise
+
+
+def work(path, mode, role, seconds, rows, seed):
+    """Выполняет чтения или записи до истечения seconds.
+
+    Возвращает (число операций, число ошибок блокировки, задержки в мс).
+    """
+    rng = random.Random(seed)
+    connection = connect(path, mode)
+    _, transaction_mode = MODES[mode]
+    done = errors = 0
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            if role == 'reader':
+                read(connection, rng, rows)
+            else:
+                write(connection, rng, transaction_mode)
+        except sqlite3.OperationalError:
+            errors += 1
+            continue
+        latencies.append((time.perf_counter() - started) * 1000)
+        done += 1
+    connection.close()
+    return done, errors, latencies
+
+
+def percentile(values, percent):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(math.ceil(percent / 100 * len(ordered)), 1) - 1]
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность чтения SQLite при '
+            'одновременной записи без настроек и с настройками бэкенда '
+            'yatube.db.backends.sqlite3. Работает с временной базой.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument(
+            '--rows', type=int, default=50000,
+            help='Сколько постов в базе перед началом замера.',
+        )
+
+    def prepare(self, path, mode, rows):
+        connection = connect(path, mode)
+        for sql in SCHEMA:
+            connection.execute(sql)
+        rng = random.Random(0)
+        now = time.time()
+        connection.execute('BEGIN')
+        connection.executemany(
+            'INSERT INTO post (author_id, text, pub_date) VALUES (?, ?, ?)',
+            ((rng.randrange(AUTHORS), f'Пост {i}', now - i)
+             for i in range(rows)),
+        )
+        connection.execute('COMMIT')
+        connection.close()
+
+    def run(self, mode, options):
+        roles = (['reader'] * options['readers']
+                 + ['writer'] * options['writers'])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, f'{mode}.sqlite3')
+            self.prepare(path, mode, options['rows'])
+            with ProcessPoolExecutor(max_workers=len(roles)) as executor:
+                futures = [
+                    executor.submit(
+                        work, path, mode, role, options['seconds'],
+                        options['rows'], seed,
+                    )
+                    for seed, role in enumerate(roles)
+                ]
+                results = [future.result() for future in futures]
+        totals = {}
+        for role, (done, errors, latencies) in zip(roles, results):
+            total = totals.setdefault(role, [0, 0, []])
+            total[0] += done
+            total[1] += errors
+            total[2] += latencies
+        return totals
+
+    def handle(self, *args, **options):
+        seconds = options['seconds']
+        self.stdout.write(
+            f'Читателей: {options["readers"]}, писателей: '
+            f'{options["writers"]}, {seconds:g} с на режим'
+        )
+        self.stdout.write(
+            f'{"Режим":<10}{"чтений/с":>10}{"p99, мс":>10}'
+            f'{"записей/с":>11}{"p99, мс":>10}{"locked":>8}'
+        )
+        for mode in MODES:
+            totals = self.run(mode, options)
+            reads, read_errors, read_latencies = totals.get(
+                'reader', (0, 0, [])
+            )
+            writes, write_errors, write_latencies = totals.get(
+                'writer', (0, 0, [])
+            )
+            self.stdout.write(
+                f'{mode:<10}'
+                f'{reads / seconds:>10.0f}'
+                f'{percentile(read_latencies, 99):>10.1f}'
+                f'{writes / seconds:>11.0f}'
+                f'{percentile(write_latencies, 99):>10.1f}'
+                f'{read_errors + write_errors:>8}'
+            )
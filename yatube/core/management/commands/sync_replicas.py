@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from yatube.db.replicas import mark_synced
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в локальные реплики из '
+            'DATABASE_REPLICAS через backup API, не останавливая запись. '
+            'Страницы читаются с реплики, только если она получила все '
+            'их изменения, поэтому команду нужно запускать регулярно.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', action='append', dest='replicas',
+            help='Реплика для обновления, по умолчанию — все.',
+        )
+        parser.add_argument(
+            '--pages', type=int, default=1024,
+            help='Сколько страниц копировать за шаг; между шагами '
+                 'основная база доступна для записи.',
+        )
+
+    def handle(self, *args, **options):
+        replicas = options['replicas'] or settings.DATABASE_REPLICAS
+        if not replicas:
+            raise CommandError('Реплики не настроены: DATABASE_REPLICAS пуст.')
+        primary = connections[DEFAULT_DB_ALIAS]
+        primary.ensure_connection()
+        for alias in replicas:
+            replica = connections[alias]
+            if replica.vendor != 'sqlite' or primary.vendor != 'sqlite':
+                raise CommandError(f'{alias}: поддерживаются только SQLite.')
+            replica.ensure_connection()
+            # Копия содержит всё, что зафиксировано до начала копирования.
+            copied_at = time.time_ns()
+            primary.connection.backup(
+                replica.connection, pages=options['pages']
+            )
+            mark_synced(alias, copied_at)
+            self.stdout.write(self.style.SUCCESS(f'{alias}: обновлена'))
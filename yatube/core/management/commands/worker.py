@@ -0,0 +1,112 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.queue import claim, complete, execute
+
+
+class Command(BaseCommand):
+    help = 'Выполняет задачи фоновой очереди в пуле процессов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count(),
+            help='Число процессов, по умолчанию — число ядер. При одном '
+                 'процессе задачи выполняются без пула.',
+        )
+        parser.add_argument(
+            '--poll', type=float, default=1.0,
+            help='Через сколько секунд снова проверить пустую очередь.',
+        )
+        parser.add_argument(
+            '--lease', type=int, default=300,
+            help='На сколько секунд задача закрепляется за обработчиком.',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи и выйти.',
+        )
+
+    def finish(self, task, error):
+        complete(task, error)
+        if error is None:
+            self.done += 1
+        else:
+            self.failed += 1
+            self.stderr.write(f'{task.name} (попытка {task.attempts}):\n'
+                              f'{error}')
+
+    def run_inline(self, options):
+        while True:
+            tasks = claim(1, options['lease'])
+            if tasks:
+                self.finish(tasks[0], execute(tasks[0].name,
+                                              tasks[0].arguments))
+            elif options['once']:
+                return
+            else:
+                time.sleep(options['poll'])
+
+    def run_pool(self, options):
+        while True:
+            # Соединения с базой не должны достаться дочерним процессам.
+            connections.close_all()
+            running = {}
+            try:
+                with ProcessPoolExecutor(
+                    max_workers=options['processes'],
+                    initializer=django.setup,
+                ) as executor:
+                    if self.run_executor(executor, running, options):
+                        return
+            except BrokenProcessPool:
+                # Дочерний процесс упал, например, его завершил OOM
+                # killer, и пул больше не принимает задачи. Какая задача
+                # виновата, неизвестно, поэтому все незавершённые
+                # возвращаются в очередь как неудачная попытка: задача,
+                # которая роняет процесс, не повторяется бесконечно.
+                for future, task in running.items():
+                    if future.done() and future.exception() is None:
+                        self.finish(task, future.result())
+                    else:
+                        self.finish(task, 'Процесс пула аварийно завершился.')
+                self.stderr.write('Пул процессов создаётся заново.')
+
+    def run_executor(self, executor, running, options):
+        """Раздаёт задачи пулу. Возвращает True, когда пора выходить."""
+        while True:
+            free = options['processes'] - len(running)
+            for task in claim(free, options['lease']) if free else ():
+                future = executor.submit(execute, task.name, task.arguments)
+                running[future] = task
+            if not running:
+                if options['once']:
+                    return True
+                time.sleep(options['poll'])
+                continue
+            finished, _ = wait(
+                running, timeout=options['poll'],
+                return_when=FIRST_COMPLETED,
+            )
+            for future in finished:
+                error = future.result()
+                self.finish(running.pop(future), error)
+
+    def handle(self, *args, **options):
+        self.done = self.failed = 0
+        try:
+            if options['processes'] <= 1:
+                self.run_inline(options)
+            else:
+                self.run_pool(options)
+        except KeyboardInterrupt:
+            # Незавершённые задачи подхватятся после окончания аренды.
+            pass
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено задач: {self.done}, с ошибками: {self.failed}'
+        ))
@@ -0,0 +1,51 @@
+import json
+import logging
+import random
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from yatube.db.backends.sqlite3.pool import pool_stats
+
+from .instrumentation import finish_request, start_request
+
+logger = logging.getLogger(__name__)
+
+
+class ServerTimingMiddleware:
+    """Измеряет время SQL, число запросов, время отрисовки шаблонов
+    и обращения к кэшу и отдаёт их в заголовке Server-Timing и в логе
+    (если он включён через SERVER_TIMING_LOG_LEVEL). В лог также
+    пишется состояние пулов соединений с базой.
+
+    Измеряется только доля запросов SERVER_TIMING_SAMPLE_RATE,
+    остальные проходят без накладных расходов.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.SERVER_TIMING_SAMPLE_RATE:
+            return self.get_response(request)
+        stats = start_request()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(stats.record_query)
+                    )
+                response = self.get_response(request)
+        finally:
+            finish_request()
+        response['Server-Timing'] = stats.server_timing()
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                **stats.as_dict(),
+                'db_pool': pool_stats(),
+            }))
+        return response
@@ -1,4 +1,22 @@
+from contextlib import contextmanager
+
 from django.db import models
+from django.template.defaultfilters import linebreaksbr
+from django.utils import timezone
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Позволяет задать даты полям с auto_now и auto_now_add при
+    bulk_create."""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
 
 
 class CreatedModel(models.Model):
@@ -11,3 +29,117 @@ class CreatedModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class CountersModel(models.Model):
+    """Абстрактная модель со счётчиками, которые меняются через UPDATE.
+
+    При сохранении уже существующего объекта поля из counter_fields
+    не записываются, чтобы не затереть значения, которые другие
+    запросы успели изменить после загрузки объекта.
+    """
+    counter_fields = ()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and not kwargs.get('force_insert')
+                and kwargs.get('update_fields') is None):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+def render_text(text):
+    """HTML текста: экранированный, с <br> на месте переводов строк."""
+    return str(linebreaksbr(text, autoescape=True))
+
+
+class RenderedTextModel(models.Model):
+    """Абстрактная модель. Хранит готовый HTML поля text, чтобы шаблоны
+    не прогоняли текст через linebreaksbr при каждом показе."""
+    text_html = models.TextField(
+        blank=True,
+        editable=False,
+        verbose_name='HTML текста',
+    )
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        self.text_html = render_text(self.text)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'text' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'text_html'}
+        super().save(*args, **kwargs)
+
+
+class Task(models.Model):
+    """Задача фоновой очереди. Выполненные задачи удаляются."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'Ожидает'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Завершилась ошибкой'),
+    )
+
+    name = models.CharField(
+        max_length=255,
+        verbose_name='Функция',
+    )
+    arguments = models.TextField(
+        default='{}',
+        verbose_name='Аргументы в JSON',
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING,
+        verbose_name='Состояние',
+    )
+    attempts = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Сделано попыток',
+    )
+    max_attempts = models.PositiveIntegerField(
+        default=3,
+        verbose_name='Всего попыток',
+    )
+    run_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Выполнить не раньше',
+    )
+    locked_until = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Занята обработчиком до',
+    )
+    last_error = models.TextField(
+        blank=True,
+        verbose_name='Последняя ошибка',
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата создания',
+    )
+
+    class Meta:
+        ordering = ('run_at', 'id')
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = (
+            models.Index(
+                fields=('status', 'run_at'),
+                name='task_status_run_at_idx',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.name} ({self.get_status_display()})'
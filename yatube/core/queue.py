@@ -0,0 +1,116 @@
+"""Фоновая очередь задач в базе данных.
+
+Функция, помеченная @task, ставится в очередь вызовом delay(), а
+выполняется командой manage.py worker. Задача хранится в таблице
+core_task, поэтому переживает перезапуск: обработчик берёт её в аренду
+на lease секунд, и если он упал, задачу по истечении аренды подхватит
+другой. Ошибка откладывает следующую попытку с экспоненциальной
+задержкой, после max_attempts попыток задача остаётся в состоянии
+FAILED.
+"""
+import json
+import traceback
+from datetime import timedelta
+
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Task
+
+
+class TaskFunction:
+    """Функция, которую можно выполнить сразу или поставить в очередь."""
+
+    def __init__(self, func, max_attempts, retry_delay):
+        self.func = func
+        self.name = f'{func.__module__}.{func.__qualname__}'
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        """Ставит вызов в очередь. Аргументы должны сериализоваться
+        в JSON."""
+        return Task.objects.create(
+            name=self.name,
+            arguments=json.dumps({'args': args, 'kwargs': kwargs}),
+            max_attempts=self.max_attempts,
+        )
+
+
+def task(func=None, *, max_attempts=3, retry_delay=30):
+    """Декоратор фоновой задачи.
+
+    retry_delay — задержка перед второй попыткой в секундах, каждая
+    следующая вдвое дольше.
+    """
+    def decorator(func):
+        return TaskFunction(func, max_attempts, retry_delay)
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+def _claimable(now):
+    return (
+        Q(status=Task.PENDING, run_at__lte=now)
+        | Q(status=Task.RUNNING, locked_until__lt=now)
+    )
+
+
+def claim(limit, lease=300):
+    """Берёт в аренду до limit задач, готовых к выполнению.
+
+    Задача достаётся тому обработчику, чей UPDATE её изменил, поэтому
+    несколько обработчиков могут работать с одной очередью.
+    """
+    now = timezone.now()
+    candidates = list(
+        Task.objects.filter(_claimable(now))
+        .order_by('run_at', 'id').values_list('pk', flat=True)[:limit]
+    )
+    claimed = [
+        pk for pk in candidates
+        if Task.objects.filter(_claimable(now), pk=pk).update(
+            status=Task.RUNNING,
+            locked_until=now + timedelta(seconds=lease),
+            attempts=F('attempts') + 1,
+        )
+    ]
+    return list(Task.objects.filter(pk__in=claimed))
+
+
+def execute(name, arguments):
+    """Выполняет задачу. Возвращает текст ошибки или None."""
+    try:
+        arguments = json.loads(arguments)
+        import_string(name)(*arguments['args'], **arguments['kwargs'])
+    except Exception:
+        return traceback.format_exc()
+    return None
+
+
+def complete(task, error=None):
+    """Удаляет выполненную задачу или назначает ей новую попытку."""
+    if error is None:
+        task.delete()
+        return
+    task.last_error = error
+    task.locked_until = None
+    if task.attempts >= task.max_attempts:
+        task.status = Task.FAILED
+    else:
+        try:
+            retry_delay = import_string(task.name).retry_delay
+        except ImportError:
+            retry_delay = 0
+        task.status = Task.PENDING
+        task.run_at = timezone.now() + timedelta(
+            seconds=retry_delay * 2 ** (task.attempts - 1)
+        )
+    task.save(update_fields=('last_error', 'locked_until', 'status',
+                             'run_at'))
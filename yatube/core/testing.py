@@ -0,0 +1,180 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+from django.urls import resolve
+
+# Сколько SQL-запросов может выполнить один запрос к странице.
+# Бюджет задаётся для самого дорогого обычного случая: GET-запроса
+# авторизованного пользователя (для форм — отправки формы). Формы из
+# GET_ONLY_BUDGETS открывает аноним, и их бюджет покрывает только GET:
+# отправку этих форм бюджет не ограничивает.
+QUERY_BUDGETS = {
+    'posts:index': 4,
+    'posts:group_list': 4,
+    'posts:profile': 5,
+    'posts:post_detail': 4,
+    'posts:post_create': 10,
+    'posts:post_edit': 7,
+    'posts:add_comment': 5,
+    'posts:follow_index': 6,
+    'posts:profile_follow': 11,
+    'posts:profile_unfollow': 9,
+    'posts:search': 4,
+    'users:signup': 0,
+    'users:logout': 4,
+    'users:login': 0,
+    'users:password_change': 2,
+    'users:password_change_done': 2,
+    'users:password_reset': 0,
+    'users:password_reset_done': 0,
+    'users:password_reset_confirm': 5,
+    'users:password_reset_complete': 1,
+    'about:author': 1,
+    'about:tech': 1,
+}
+GET_ONLY_BUDGETS = frozenset({
+    'users:signup',
+    'users:login',
+    'users:password_reset',
+})
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def budget_for(path):
+    """Бюджет запросов для адреса страницы."""
+    view_name = resolve(path.split('?')[0]).view_name
+    if view_name not in QUERY_BUDGETS:
+        raise QueryBudgetExceeded(
+            f'Для страницы {view_name} не задан бюджет запросов '
+            f'в core.testing.QUERY_BUDGETS'
+        )
+    return view_name, QUERY_BUDGETS[view_name]
+
+
+@contextmanager
+def capture_queries():
+    """Записывает запросы ко всем базам из DATABASES.
+
+    Отдаёт список пар (псевдоним базы, запрос), который заполняется
+    при выходе из блока. Соединения не открываются заранее, поэтому
+    базы, недоступные тесту, не мешают.
+    """
+    captured = []
+    started = []
+    for connection in connections.all():
+        started.append((
+            connection, connection.force_debug_cursor,
+            len(connection.queries_log),
+        ))
+        connection.force_debug_cursor = True
+    try:
+        yield captured
+    finally:
+        for connection, force_debug_cursor, start in started:
+            connection.force_debug_cursor = force_debug_cursor
+            captured.extend(
+                (connection.alias, query)
+                for query in list(connection.queries_log)[start:]
+            )
+
+
+@contextmanager
+def query_budget(path):
+    """Падает, если внутри блока выполнено больше запросов ко всем
+    базам вместе, чем разрешено странице path."""
+    view_name, budget = budget_for(path)
+    with capture_queries() as queries:
+        yield queries
+    if len(queries) > budget:
+        executed = '\n'.join(
+            f'{number}. [{alias}] {query["sql"]}'
+            for number, (alias, query) in enumerate(queries, 1)
+        )
+        raise QueryBudgetExceeded(
+            f'{view_name} ({path}): выполнено {len(queries)} запросов '
+            f'при бюджете {budget}:\n{executed}'
+        )
+
+
+@contextmanager
+def on_commit_callbacks(using='default'):
+    """Выполняет при выходе из блока колбэки transaction.on_commit,
+    добавленные внутри него.
+
+    TestCase не фиксирует транзакцию, поэтому без этого колбэки не
+    выполняются никогда. Аналог captureOnCommitCallbacks(execute=True)
+    из Django 3.2.
+    """
+    callbacks = connections[using].run_on_commit
+    start = len(callbacks)
+    yield
+    for _, callback in callbacks[start:]:
+        callback()
+
+
+def request_within_budget(client, path, method='get', **kwargs):
+    """Выполняет запрос клиентом и проверяет бюджет запросов."""
+    with query_budget(path):
+        return getattr(client, method)(path, **kwargs)
+
+
+class QueryBudgetMixin:
+    """Примесь к TestCase с проверкой бюджета запросов страницы."""
+
+    def assertWithinQueryBudget(self, path, client=None, method='get',
+                                **kwargs):
+        return request_within_budget(
+            client or self.client, path, method, **kwargs
+        )
+
+
+@contextmanager
+def isolated_caches():
+    """Переносит файлы SQLiteCache во временный каталог, а TieredCache
+    даёт отдельный LRU в памяти процесса.
+
+    Общий кэш переживает перезапуск, поэтому без этого тесты видели бы
+    страницы, закэшированные прошлым запуском или запущенным сайтом.
+    """
+    directory = tempfile.mkdtemp()
+    locations = {
+        'core.cache.SQLiteCache': lambda alias: os.path.join(
+            directory, f'{alias}.db'
+        ),
+        # По LOCATION TieredCache выбирает свой LRU в памяти процесса.
+        'core.cache.TieredCache': lambda alias: f'{directory}:{alias}',
+    }
+    caches = {
+        alias: (
+            dict(params, LOCATION=locations[params['BACKEND']](alias))
+            if params['BACKEND'] in locations else params
+        )
+        for alias, params in settings.CACHES.items()
+    }
+    try:
+        with override_settings(CACHES=caches):
+            yield
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class IsolatedCachesRunner(DiscoverRunner):
+    """Запускает тесты с кэшем во временном каталоге."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._isolated_caches = isolated_caches()
+        self._isolated_caches.__enter__()
+
+    def teardown_test_environment(self, **kwargs):
+        self._isolated_caches.__exit__(None, None, None)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,128 @@
+import datetime
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Comment, Follow, Group, Post, User
+
+from ..admin import EstimatedCountPaginator, estimated_count
+from ..models import Task
+
+
+class FastAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin',
+        )
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='admin', description='',
+        )
+        Group.objects.create(title='Другая', slug='other', description='')
+        Follow.objects.create(user=cls.admin, author=cls.author)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_posts(self, count):
+        for i in range(count):
+            post = Post.objects.create(
+                author=self.author, text=f'Пост {i}', group=self.group,
+            )
+            Comment.objects.create(
+                post=post, author=self.admin, text=f'Комментарий {i}',
+            )
+
+    def changelist(self, model, data=None):
+        url = reverse(f'admin:posts_{model}_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, data or {})
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_queries_do_not_grow_with_rows(self):
+        self.add_posts(3)
+        small = {
+            model: self.changelist(model)[1]
+            for model in ('post', 'comment', 'follow')
+        }
+        self.add_posts(30)
+        for model, queries in small.items():
+            with self.subTest(model=model):
+                self.assertEqual(self.changelist(model)[1], queries)
+
+    def test_search_by_username_and_text(self):
+        self.add_posts(3)
+        other = User.objects.create_user(username='other')
+        Post.objects.create(author=other, text='Совсем другое')
+        response, _ = self.changelist('post', {'q': 'other'})
+        self.assertEqual(
+            [post.author for post in response.context['cl'].result_list],
+            [other],
+        )
+        response, _ = self.changelist('post', {'q': 'Совсем'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+        response, _ = self.changelist('comment', {'q': 'admin'})
+        self.assertEqual(response.context['cl'].result_count, 3)
+        response, _ = self.changelist('comment', {'q': 'нет такого'})
+        self.assertEqual(response.context['cl'].result_count, 0)
+        response, _ = self.changelist('comment', {'q': 'комментарий 1'})
+        self.assertEqual(
+            [comment.text for comment in response.context['cl'].result_list],
+            ['Комментарий 1'],
+        )
+
+    def test_date_drill_down(self):
+        self.add_posts(2)
+        old = Post.objects.create(author=self.author, text='Старый')
+        Post.objects.filter(pk=old.pk).update(
+            pub_date=timezone.now() - datetime.timedelta(days=800)
+        )
+        now = timezone.now()
+        response, _ = self.changelist('post', {'period': str(now.year)})
+        self.assertEqual(response.context['cl'].result_count, 2)
+        response, _ = self.changelist(
+            'post', {'period': f'{now.year}-{now.month:02d}'}
+        )
+        self.assertEqual(response.context['cl'].result_count, 2)
+        self.assertContains(response, f'?period={now.year - 2}')
+
+    def test_task_arguments_are_hidden(self):
+        queued = Task.objects.create(
+            name='users.tasks.send_password_reset',
+            arguments='{"args": ["секрет"], "kwargs": {}}',
+        )
+        url = reverse('admin:core_task_change', args=[queued.pk])
+        self.assertNotContains(self.client.get(url), 'секрет')
+        self.client.post(url, {
+            'name': queued.name, 'arguments': '{}', 'status': Task.PENDING,
+            'attempts': 0, 'max_attempts': 3, 'run_at_0': '2020-01-01',
+            'run_at_1': '00:00:00',
+        })
+        queued.refresh_from_db()
+        self.assertIn('секрет', queued.arguments)
+
+
+class EstimatedCountTests(TestCase):
+    def setUp(self):
+        author = User.objects.create_user(username='author')
+        for i in range(12):
+            Post.objects.create(author=author, text=f'Пост {i}')
+
+    def test_small_tables_are_counted_exactly(self):
+        paginator = EstimatedCountPaginator(Post.objects.all(), 5)
+        self.assertEqual(paginator.count, 12)
+
+    @mock.patch.object(EstimatedCountPaginator, 'exact_limit', 5)
+    def test_large_tables_are_estimated(self):
+        Post.objects.filter(pk=Post.objects.order_by('pk')[3].pk).delete()
+        self.assertEqual(estimated_count(Post.objects.all()), 12)
+        paginator = EstimatedCountPaginator(Post.objects.all(), 5)
+        self.assertEqual(paginator.count, 12)
+        filtered = Post.objects.filter(text__startswith='Пост')
+        self.assertEqual(EstimatedCountPaginator(filtered, 5).count, 5)
@@ -0,0 +1,104 @@
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache, caches
+from django.test import SimpleTestCase
+
+from ..cache import Fresh
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = caches['shared']
+        self.cache.clear()
+
+    def test_operations(self):
+        self.cache.set('a', {'value': 1})
+        self.assertEqual(self.cache.get('a'), {'value': 1})
+        self.assertFalse(self.cache.add('a', 2))
+        self.assertTrue(self.cache.add('b', 2))
+        self.assertEqual(self.cache.incr('b', 3), 5)
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c']),
+                         {'a': {'value': 1}, 'b': 5})
+        self.cache.delete_many(['a', 'b'])
+        self.assertIsNone(self.cache.get('a'))
+        with self.assertRaises(ValueError):
+            self.cache.incr('a')
+
+    def test_expired_value_is_missing(self):
+        self.cache.set('a', 1, timeout=1)
+        with mock.patch('core.cache.time.time',
+                        return_value=time.time() + 2):
+            self.assertIsNone(self.cache.get('a'))
+            self.assertTrue(self.cache.add('a', 2))
+
+
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_local_tier_serves_without_shared(self):
+        cache.set('a', [1])
+        with mock.patch.object(
+            type(caches['shared']), 'get', side_effect=AssertionError
+        ):
+            value = cache.get('a')
+        self.assertEqual(value, [1])
+        # Локальная копия отдаётся новым объектом.
+        value.append(2)
+        self.assertEqual(cache.get('a'), [1])
+
+    def test_local_tier_expires(self):
+        cache.set('a', 1)
+        caches['shared'].delete('a')
+        self.assertEqual(cache.get('a'), 1)
+        with mock.patch('core.cache.time.monotonic',
+                        return_value=time.monotonic() + 60):
+            self.assertIsNone(cache.get('a'))
+
+    def test_generations_skip_local_tier(self):
+        """Поколение, изменённое другим процессом, видно сразу."""
+        cache.set_many({'generation:posts': 1, 'a': 1})
+        caches['shared'].set_many({'generation:posts': 2, 'a': 2})
+        self.assertEqual(
+            cache.get_many(['generation:posts', 'a']),
+            {'generation:posts': 2, 'a': 1},
+        )
+        self.assertEqual(cache.get('generation:posts'), 2)
+
+    def test_get_or_set_computes_once(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(cache.get_or_set('k', compute))
+            )
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 5)
+        # Блокировки вычислений не копятся по одной на каждый ключ.
+        self.assertEqual(cache._flights, {})
+
+    def test_none_is_not_stored(self):
+        self.assertIsNone(cache.get_or_set('k', lambda: None))
+        self.assertFalse(cache.has_key('k'))
+
+    def test_early_expiration(self):
+        cache.set('far', Fresh('old', time.time() + 3600, 0.1))
+        cache.set('near', Fresh('old', time.time() + 1, 10))
+        with mock.patch('core.cache.random.random', return_value=0.5):
+            self.assertEqual(cache.get_or_set('far', lambda: 'new'), 'old')
+            self.assertEqual(cache.get_or_set('near', lambda: 'new'), 'new')
+        self.assertEqual(cache.get('near'), 'new')
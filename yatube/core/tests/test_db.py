@@ -0,0 +1,132 @@
+import os
+import tempfile
+import time
+from unittest import mock
+
+from django.db import connection, transaction
+from django.test import SimpleTestCase
+from django.test.utils import CaptureQueriesContext
+
+from yatube.db.backends.sqlite3.base import DatabaseWrapper
+from yatube.db.backends.sqlite3.pool import pool_stats
+
+
+class SQLiteTuningTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_dict = dict(
+            connection.settings_dict,
+            NAME=os.path.join(directory.name, 'db.sqlite3'),
+            OPTIONS={
+                'transaction_mode': 'immediate',
+                'pragmas': {'cache_size': -1024, 'temp_store': None},
+            },
+        )
+        self.db = DatabaseWrapper(settings_dict, alias='tuning')
+        self.addCleanup(self.db.close)
+
+    def pragma(self, name):
+        with self.db.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_are_applied(self):
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        # NORMAL.
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('cache_size'), -1024)
+        # None оставляет значение SQLite по умолчанию.
+        self.assertEqual(self.pragma('temp_store'), 0)
+
+    def test_options_are_not_passed_to_sqlite(self):
+        params = self.db.get_connection_params()
+        self.assertNotIn('pragmas', params)
+        self.assertNotIn('transaction_mode', params)
+
+    def test_transactions_take_write_lock(self):
+        with CaptureQueriesContext(self.db) as queries, mock.patch(
+            'django.db.transaction.get_connection', return_value=self.db
+        ):
+            with transaction.atomic(using='tuning'):
+                pass
+        self.assertEqual(queries.captured_queries[0]['sql'],
+                         'BEGIN IMMEDIATE')
+
+    def test_unknown_transaction_mode(self):
+        settings_dict = dict(
+            self.db.settings_dict, OPTIONS={'transaction_mode': 'LATER'}
+        )
+        with self.assertRaises(ValueError):
+            DatabaseWrapper(settings_dict, alias='broken')
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.settings_dict = dict(
+            connection.settings_dict,
+            NAME=os.path.join(directory.name, 'db.sqlite3'),
+            OPTIONS={'pool': {'size': 1, 'max_age': 60}},
+        )
+
+    def connect(self):
+        """Соединение как у нового потока: свой DatabaseWrapper."""
+        db = DatabaseWrapper(self.settings_dict, alias='pooled')
+        self.addCleanup(db.pool.clear)
+        db.ensure_connection()
+        return db
+
+    def test_connections_are_reused(self):
+        first = self.connect()
+        raw = first.connection
+        first.close()
+        second = self.connect()
+        self.assertIs(second.connection, raw)
+        second.close()
+        self.assertIn('pooled', pool_stats())
+        self.assertEqual(
+            second.pool.stats(),
+            {'size': 1, 'idle': 1, 'in_use': 0, 'created': 1, 'reused': 1,
+             'returned': 2},
+        )
+
+    def test_pool_keeps_only_size_connections(self):
+        first, second = self.connect(), self.connect()
+        first.close()
+        second.close()
+        self.assertEqual(first.pool.stats()['idle'], 1)
+        self.assertEqual(first.pool.stats()['closed'], 1)
+
+    def test_broken_connections_are_discarded(self):
+        db = self.connect()
+        raw = db.connection
+        db.close()
+        raw.close()
+        fresh = self.connect()
+        self.assertIsNot(fresh.connection, raw)
+        self.assertEqual(fresh.pool.stats()['discarded'], 1)
+
+    def test_expired_connections_are_closed(self):
+        db = self.connect()
+        raw = db.connection
+        db.close()
+        with mock.patch('time.monotonic', return_value=time.monotonic() + 61):
+            fresh = self.connect()
+        self.assertIsNot(fresh.connection, raw)
+        self.assertEqual(fresh.pool.stats()['expired'], 1)
+
+    def test_connection_closed_in_transaction_is_not_pooled(self):
+        db = self.connect()
+        with mock.patch(
+            'django.db.transaction.get_connection', return_value=db
+        ):
+            with transaction.atomic(using='pooled'):
+                db.close()
+        self.assertEqual(db.pool.stats()['idle'], 0)
+
+    def test_in_memory_database_is_not_pooled(self):
+        settings_dict = dict(self.settings_dict, NAME=':memory:')
+        self.assertIsNone(DatabaseWrapper(settings_dict, 'memory').pool)
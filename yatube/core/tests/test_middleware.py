@@ -0,0 +1,53 @@
+import json
+import logging
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+
+
+class ServerTimingMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        Post.objects.create(author=cls.author, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1)
+    def test_sampled_request_has_server_timing(self):
+        with self.assertLogs('core.middleware', 'INFO') as logs:
+            response = self.client.get(reverse('posts:index'))
+        header = response['Server-Timing']
+        for metric in ('sql;dur=', 'tpl;dur=', 'cache;desc=', 'total;dur='):
+            self.assertIn(metric, header)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['path'], reverse('posts:index'))
+        self.assertEqual(record['status'], 200)
+        self.assertIsInstance(record['db_pool'], dict)
+        self.assertGreater(record['queries'], 0)
+        self.assertGreater(record['template_ms'], 0)
+        self.assertGreater(record['cache_misses'], 0)
+        self.assertIn(
+            f'{record["cache_hits"]} hits, {record["cache_misses"]} misses',
+            header,
+        )
+
+        response = self.client.get(reverse('posts:index'))
+        self.assertIn(' 0 misses', response['Server-Timing'])
+        self.assertNotIn('"0 hits', response['Server-Timing'])
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_not_sampled_request_is_not_measured(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_request_lines_are_opt_in(self):
+        """Строки middleware выводятся, только если их включили через
+        SERVER_TIMING_LOG_LEVEL, но обработчик для них настроен."""
+        logger = logging.getLogger('core.middleware')
+        self.assertFalse(logger.isEnabledFor(logging.INFO))
+        self.assertTrue(logger.handlers)
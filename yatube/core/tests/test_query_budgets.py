@@ -0,0 +1,114 @@
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from about import urls as about_urls
+from posts import urls as posts_urls
+from posts.models import Comment, Follow, Group, Post, User
+from users import urls as users_urls
+
+from ..testing import (
+    GET_ONLY_BUDGETS, QUERY_BUDGETS, QueryBudgetExceeded, QueryBudgetMixin,
+    query_budget,
+)
+
+
+class QueryBudgetsTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='budget',
+            description='Описание',
+        )
+        for i in range(15):
+            cls.post = Post.objects.create(
+                author=cls.author,
+                text=f'Пост {i}',
+                group=cls.group,
+            )
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text=f'Комментарий {i}'
+            )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def test_every_route_has_budget(self):
+        """Бюджет запросов задан для каждой страницы проекта."""
+        for urls in (posts_urls, users_urls, about_urls):
+            for pattern in urls.urlpatterns:
+                view_name = f'{urls.app_name}:{pattern.name}'
+                with self.subTest(view_name=view_name):
+                    self.assertIn(view_name, QUERY_BUDGETS)
+
+    def test_pages_within_budget(self):
+        """Страницы укладываются в бюджет запросов."""
+        post_id = {'post_id': self.post.pk}
+        uid = urlsafe_base64_encode(force_bytes(self.reader.pk))
+        token = default_token_generator.make_token(self.reader)
+        reader, author = self.reader_client, self.author_client
+        cases = (
+            ('posts:index', {}, reader, 'get', {}),
+            ('posts:group_list', {'slug': self.group.slug}, reader, 'get',
+             {}),
+            ('posts:profile', {'username': self.author}, reader, 'get', {}),
+            ('posts:post_detail', post_id, reader, 'get', {}),
+            ('posts:follow_index', {}, reader, 'get', {}),
+            ('posts:post_create', {}, author, 'post',
+             {'text': 'Новый пост', 'group': self.group.pk}),
+            ('posts:post_edit', post_id, author, 'post',
+             {'text': 'Изменённый пост', 'group': self.group.pk}),
+            ('posts:add_comment', post_id, reader, 'post',
+             {'text': 'Новый комментарий'}),
+            ('posts:profile_follow', {'username': self.other}, reader,
+             'get', {}),
+            ('posts:profile_unfollow', {'username': self.author}, reader,
+             'get', {}),
+            ('posts:search', {}, reader, 'get', {'q': 'Пост'}),
+            ('users:signup', {}, self.client, 'get', {}),
+            ('users:login', {}, self.client, 'get', {}),
+            ('users:password_change', {}, reader, 'get', {}),
+            ('users:password_change_done', {}, reader, 'get', {}),
+            ('users:password_reset', {}, self.client, 'get', {}),
+            ('users:password_reset_done', {}, self.client, 'get', {}),
+            ('users:password_reset_confirm',
+             {'uidb64': uid, 'token': token}, self.client, 'get', {}),
+            ('users:password_reset_complete', {}, self.client, 'get', {}),
+            ('about:author', {}, self.client, 'get', {}),
+            ('about:tech', {}, self.client, 'get', {}),
+            ('users:logout', {}, reader, 'get', {}),
+        )
+        for view_name, kwargs, client, method, data in cases:
+            with self.subTest(view_name=view_name):
+                if view_name in GET_ONLY_BUDGETS:
+                    self.assertEqual(method, 'get')
+                self.assertWithinQueryBudget(
+                    reverse(view_name, kwargs=kwargs),
+                    client=client,
+                    method=method,
+                    data=data,
+                )
+
+
+class QueryBudgetDatabasesTests(TestCase):
+    databases = {'default', 'shard_1'}
+
+    def test_budget_counts_every_database(self):
+        """Запросы к разным базам складываются в один бюджет."""
+        with self.assertRaises(QueryBudgetExceeded) as error:
+            with query_budget(reverse('about:author')):
+                User.objects.exists()
+                Post.objects.using('shard_1').exists()
+        self.assertIn('[shard_1]', str(error.exception))
@@ -0,0 +1,103 @@
+import os
+from datetime import timedelta
+from io import StringIO
+
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import User
+
+from ..models import Task
+from ..queue import claim, task
+
+calls = []
+
+
+@task
+def remember(value, twice=False):
+    calls.append(value)
+    if twice:
+        calls.append(value)
+
+
+@task(max_attempts=2, retry_delay=10)
+def broken():
+    raise ValueError('Сломано')
+
+
+@task
+def crash():
+    os._exit(1)
+
+
+class QueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def work(self, processes=1):
+        out, err = StringIO(), StringIO()
+        call_command('worker', processes=processes, once=True, stdout=out,
+                     stderr=err)
+        return out.getvalue().strip(), err.getvalue()
+
+    def test_task_runs_in_worker(self):
+        remember(0)
+        remember.delay(1, twice=True)
+        self.assertEqual(calls, [0])
+        out, _ = self.work()
+        self.assertEqual(out, 'Выполнено задач: 1, с ошибками: 0')
+        self.assertEqual(calls, [0, 1, 1])
+        self.assertFalse(Task.objects.exists())
+
+    def test_failed_task_is_retried_later(self):
+        broken.delay()
+        _, err = self.work()
+        self.assertIn('ValueError: Сломано', err)
+        queued = Task.objects.get()
+        self.assertEqual(queued.status, Task.PENDING)
+        self.assertEqual(queued.attempts, 1)
+        self.assertGreater(
+            queued.run_at, timezone.now() + timedelta(seconds=5)
+        )
+        self.assertEqual(claim(1), [])
+
+        Task.objects.update(run_at=timezone.now())
+        self.work()
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Task.FAILED)
+        self.assertEqual(queued.attempts, 2)
+        self.assertIn('Сломано', queued.last_error)
+
+    def test_expired_lease_is_claimed_again(self):
+        remember.delay(1)
+        self.assertEqual(len(claim(1, lease=60)), 1)
+        self.assertEqual(claim(1), [])
+        Task.objects.update(locked_until=timezone.now() - timedelta(1))
+        self.assertEqual(len(claim(1)), 1)
+
+    def test_crashed_pool_is_rebuilt(self):
+        crash.delay()
+        out, err = self.work(processes=2)
+        self.assertIn('Пул процессов создаётся заново', err)
+        self.assertEqual(out, 'Выполнено задач: 0, с ошибками: 1')
+        queued = Task.objects.get()
+        self.assertEqual(queued.status, Task.PENDING)
+        self.assertIn('аварийно', queued.last_error)
+
+    def test_password_reset_email_is_queued(self):
+        User.objects.create_user(
+            username='user', email='user@example.com', password='secret',
+        )
+        self.client.post(
+            reverse('users:password_reset'), {'email': 'user@example.com'}
+        )
+        self.assertEqual(mail.outbox, [])
+        queued = Task.objects.get()
+        self.assertNotIn('/reset/', queued.arguments)
+        self.work()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['user@example.com'])
+        self.assertIn('/auth/reset/', mail.outbox[0].body)
@@ -0,0 +1,127 @@
+from io import StringIO
+
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory, SimpleTestCase, TransactionTestCase, override_settings,
+)
+from django.urls import reverse
+
+from posts.models import Post, User
+from yatube.db.replicas import (
+    STICKY_COOKIE, ReplicaRouter, StickyPrimaryMiddleware, mark_synced,
+    read_from_replica, require_changes,
+)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def route(self, method='get', cookies=None, model=Post,
+              changed_at=None):
+        @read_from_replica
+        def view(request):
+            if changed_at is not None:
+                require_changes(changed_at)
+            return self.router.db_for_read(model)
+
+        def get_response(request):
+            response = HttpResponse()
+            response.db = view(request)
+            return response
+
+        request = getattr(self.factory, method)('/')
+        request.COOKIES.update(cookies or {})
+        return StickyPrimaryMiddleware(get_response)(request)
+
+    def test_read_views_use_replica(self):
+        self.assertEqual(self.route().db, 'replica')
+        self.assertIsNone(self.router.db_for_read(Post))
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+        post = Post()
+        post._state.db = 'replica'
+        self.assertEqual(
+            self.router.db_for_write(Post, instance=post), 'default'
+        )
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        cache.clear()
+        self.assertIsNone(self.route(changed_at=1).db)
+        mark_synced('replica', 100)
+        self.assertEqual(self.route(changed_at=100).db, 'replica')
+        self.assertIsNone(self.route(changed_at=101).db)
+
+    def test_reads_stick_to_primary_after_write(self):
+        response = self.route('post')
+        self.assertIsNone(response.db)
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        self.assertIsNone(self.route(cookies={STICKY_COOKIE: '1'}).db)
+
+    def test_sessions_are_read_from_primary(self):
+        self.assertEqual(self.route(model=Session).db, 'default')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        response = self.route('post')
+        self.assertIsNone(response.db)
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_migrations_skip_replicas(self):
+        self.assertIs(self.router.allow_migrate('replica', 'posts'), False)
+        self.assertIsNone(self.router.allow_migrate('default', 'posts'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaViewsTests(TransactionTestCase):
+    """Реплика — локальная копия тестовой базы, сделанная sync_replicas."""
+
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(author=self.author, text='Старый пост')
+        call_command('sync_replicas', stdout=StringIO())
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', args=[self.author]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+        )
+
+    def test_feeds_are_read_from_replica(self):
+        # update() не меняет поколений: реплика для страниц свежая.
+        Post.objects.update(text='Текст только в основной базе')
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'Старый пост')
+
+    def test_lagging_replica_is_not_cached(self):
+        """Изменения после копирования читаются из основной базы и не
+        застревают в кэше страниц и в ETag."""
+        self.post.text = 'Новый текст'
+        self.post.save()
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'Новый текст')
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag']
+                )
+                self.assertEqual(response.status_code, 304)
+
+    def test_writer_reads_own_writes(self):
+        self.client.force_login(self.author)
+        self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Комментарий'},
+        )
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        self.assertContains(response, 'Комментарий')
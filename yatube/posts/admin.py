@@ -1,10 +1,17 @@
 from django.contrib import admin
 
+from core.admin import DateDrillDownFilter, FastModelAdmin
+
+from . import search
 from .models import Group, Post, Comment, Follow
 
 
+class PubDateFilter(DateDrillDownFilter):
+    field_name = 'pub_date'
+
+
 @admin.register(Post)
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(FastModelAdmin):
     list_display = (
         'pk',
         'text',
@@ -13,10 +20,22 @@ class PostAdmin(admin.ModelAdmin):
         'group',
     )
     list_editable = ('group',)
-    search_fields = ('text',)
-    list_filter = ('pub_date',)
-    date_hierarchy = 'pub_date'
+    list_select_related = ('author', 'group')
+    raw_id_fields = ('author',)
+    search_fields = ('text', 'author__username')
+    # Готовые периоды (сегодня, неделя, месяц) не требуют запросов.
+    list_filter = ('pub_date', PubDateFilter)
     empty_value_display = '-пусто-'
+    # Сколько лучших совпадений по тексту показывать в поиске.
+    search_limit = 1000
+
+    def search_field(self, queryset, field, search_term):
+        """Текст ищется через полнотекстовый индекс."""
+        if field == 'text':
+            return queryset.filter(
+                pk__in=search.post_ids(search_term, self.search_limit)
+            )
+        return super().search_field(queryset, field, search_term)
 
 
 @admin.register(Group)
@@ -33,14 +52,29 @@ class GroupAdmin(admin.ModelAdmin):
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
-    list_display = ('pk', 'author', 'text', 'created')
-    search_fields = ('author', 'text')
+class CommentAdmin(FastModelAdmin):
+    list_display = ('pk', 'author', 'post', 'text', 'created')
+    list_select_related = ('author', 'post')
+    search_fields = ('text', 'author__username', 'post__id')
+    ordering = ('-pk',)
+    raw_id_fields = ('post', 'author')
     empty_value_display = '-пусто-'
+    search_limit = 1000
+
+    def search_field(self, queryset, field, search_term):
+        """Текст ищется через полнотекстовый индекс комментариев."""
+        if field == 'text':
+            return queryset.filter(
+                pk__in=search.comment_ids(search_term, self.search_limit)
+            )
+        return super().search_field(queryset, field, search_term)
 
 
 @admin.register(Follow)
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(FastModelAdmin):
     list_display = ('pk', 'user', 'author')
-    search_fields = ('user', 'author')
+    list_select_related = ('user', 'author')
+    search_fields = ('user__username', 'author__username')
+    ordering = ('-pk',)
+    raw_id_fields = ('user', 'author')
     empty_value_display = '-пусто-'
@@ -0,0 +1,42 @@
+"""Кэш карточек постов в лентах.
+
+Один и тот же пост показывается на главной, в группе, в профиле и в
+ленте подписок, поэтому карточка кэшируется отдельно от страницы.
+Ключ меняется при каждом сохранении поста и при изменении того, что
+выводится в карточке рядом с ним: имени автора и группы.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+CARD_TEMPLATE = 'posts/includes/posts_list.html'
+CARD_TIMEOUT = 60 * 60 * 24
+
+
+def card_key(post, in_group):
+    shown = '|'.join((
+        post.author.username,
+        post.author.get_full_name(),
+        post.group.slug if post.group else '',
+        'group' if in_group else '',
+    ))
+    version = hashlib.md5(shown.encode()).hexdigest()
+    return f'post_card:{post.pk}:{post.updated.timestamp()}:{version}'
+
+
+def render_cards(posts, group=None):
+    """HTML карточек постов: один запрос get_many к кэшу, шаблон
+    отрисовывается только для промахов."""
+    keys = {post.pk: card_key(post, group is not None) for post in posts}
+    cards = cache.get_many(keys.values())
+    missing = {}
+    for post in posts:
+        if keys[post.pk] not in cards:
+            missing[keys[post.pk]] = render_to_string(
+                CARD_TEMPLATE, {'post': post, 'group': group}
+            )
+    if missing:
+        cache.set_many(missing, CARD_TIMEOUT)
+        cards.update(missing)
+    return [cards[keys[post.pk]] for post in posts]
@@ -0,0 +1,161 @@
+from collections import Counter
+
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from . import shards
+
+
+def _count(queryset, field, outer='pk'):
+    """Подзапрос с количеством строк queryset на каждое значение field."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef(outer)})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def _fix(queryset, field, expression):
+    """Исправляет счётчик только в строках, где он разошёлся с данными."""
+    return queryset.exclude(**{field: expression}).update(
+        **{field: expression}
+    )
+
+
+def _fix_from(queryset, key, field, totals):
+    """Исправляет счётчик по посчитанным заранее значениям
+    totals: значение key -> количество."""
+    fixed = 0
+    for pk, value in queryset.values_list(key, field).iterator():
+        if value != totals.get(pk, 0):
+            fixed += queryset.filter(**{key: pk}).update(
+                **{field: totals.get(pk, 0)}
+            )
+    return fixed
+
+
+def _count_across(queryset, field, databases):
+    """Количество строк queryset на каждое значение field во всех базах."""
+    totals = Counter()
+    for alias in databases:
+        totals.update(dict(
+            queryset.using(alias).order_by().values_list(field)
+            .annotate(total=Count('pk'))
+        ))
+    return totals
+
+
+def _change(queryset, **deltas):
+    return queryset.update(**{
+        field: F(field) + delta for field, delta in deltas.items()
+    })
+
+
+def change_profile(user_id, **deltas):
+    Profile = global_apps.get_model('posts', 'Profile')
+    _change(Profile.objects.filter(user_id=user_id), **deltas)
+
+
+def profile_of(user):
+    """Профиль пользователя со счётчиками.
+
+    Пользователи из фикстур загружаются без сигнала create_profile,
+    поэтому недостающий профиль создаётся здесь и сразу пересчитывается.
+    """
+    Profile = global_apps.get_model('posts', 'Profile')
+    try:
+        return user.profile
+    except Profile.DoesNotExist:
+        pass
+    profile, created = Profile.objects.get_or_create(user=user)
+    if created:
+        reconcile_counters(users=[user.pk])
+        profile.refresh_from_db(using=profile._state.db)
+    user.profile = profile
+    return profile
+
+
+def change_group(group_id, delta):
+    if group_id is not None:
+        Group = global_apps.get_model('posts', 'Group')
+        _change(Group.objects.filter(pk=group_id), posts_count=delta)
+
+
+def change_post(post_id, delta, using=None):
+    """using — база поста, если посты делятся между базами."""
+    Post = global_apps.get_model('posts', 'Post')
+    _change(
+        Post.objects.using(using).filter(pk=post_id), comments_count=delta
+    )
+
+
+def reconcile_counters(apps=global_apps, users=None):
+    """Пересчитывает все счётчики по фактическим данным.
+
+    Каждый счётчик исправляется одним UPDATE с коррелированным
+    подзапросом, поэтому команда работает и на больших таблицах.
+    Возвращает число исправленных значений.
+    """
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Profile = apps.get_model('posts', 'Profile')
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+
+    missing = User.objects.filter(profile__isnull=True)
+    profiles = Profile.objects.all()
+    if users is not None:
+        missing = missing.filter(pk__in=users)
+        profiles = profiles.filter(user_id__in=users)
+    Profile.objects.bulk_create(
+        (Profile(user_id=pk) for pk in missing.values_list('pk', flat=True)),
+        ignore_conflicts=True,
+    )
+    fixed = 0
+    for field, queryset, key in (
+        ('followers_count', Follow.objects.all(), 'author'),
+        ('following_count', Follow.objects.all(), 'user'),
+    ):
+        fixed += _fix(profiles, field, _count(queryset, key, 'user_id'))
+    # Посты могут лежать в нескольких базах и в архиве (posts.shards),
+    # и тогда их не посчитать подзапросом из основной базы. В миграциях
+    # (apps — исторические модели) база всегда одна.
+    databases = shards.all_databases() if apps is global_apps else []
+    sharded = len(databases) > 1
+    if sharded:
+        fixed += _fix_from(
+            profiles, 'user_id', 'posts_count',
+            _count_across(Post.objects.all(), 'author', databases),
+        )
+    else:
+        fixed += _fix(
+            profiles, 'posts_count',
+            _count(Post.objects.all(), 'author', 'user_id'),
+        )
+    if users is None:
+        if sharded:
+            fixed += _fix_from(
+                Group.objects.all(), 'pk', 'posts_count',
+                _count_across(Post.objects.all(), 'group', databases),
+            )
+        else:
+            fixed += _fix(
+                Group.objects.all(), 'posts_count',
+                _count(Post.objects.all(), 'group'),
+            )
+        # Комментарии лежат в одной базе со своим постом.
+        for alias in databases if sharded else [None]:
+            fixed += _fix(
+                Post.objects.using(alias), 'comments_count',
+                _count(Comment.objects.all(), 'post'),
+            )
+    return fixed
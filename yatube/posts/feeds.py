@@ -0,0 +1,280 @@
+import heapq
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from core.queue import task
+
+from . import shards
+from .models import Follow, Post, Profile, TimelineEntry
+
+
+class MergedFeed:
+    """Несколько лент, упорядоченных по (pub_date, id), как одна лента.
+
+    Поддерживает ровно то, что нужно CursorPaginator: order_by, filter,
+    reverse, count и срезы. Срез [start:stop] берёт из каждого источника
+    не больше stop записей и сливает их k-way merge.
+    """
+
+    ordered = True
+
+    def __init__(self, *sources, descending=True):
+        self.sources = sources
+        self.descending = descending
+
+    def _clone(self, method, *args, **kwargs):
+        return type(self)(
+            *(getattr(source, method)(*args, **kwargs)
+              for source in self.sources),
+            descending=self.descending,
+        )
+
+    def order_by(self, *fields):
+        feed = self._clone('order_by', *fields)
+        feed.descending = fields[0].startswith('-')
+        return feed
+
+    def filter(self, *args, **kwargs):
+        return self._clone('filter', *args, **kwargs)
+
+    def select_related(self, *fields):
+        return self._clone('select_related', *fields)
+
+    def reverse(self):
+        feed = self._clone('reverse')
+        feed.descending = not self.descending
+        return feed
+
+    def count(self):
+        return sum(source.count() for source in self.sources)
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        stop = key.stop
+        sources = self.sources
+        if stop is not None:
+            sources = (source[:stop] for source in sources)
+        merged = heapq.merge(
+            *sources,
+            key=lambda post: (post.pub_date, post.pk),
+            reverse=self.descending,
+        )
+        return list(islice(merged, key.start, stop))
+
+
+class ChainedFeed(MergedFeed):
+    """Ленты, которые идут одна за другой: каждая следующая целиком
+    старше предыдущей, как горячие посты и архив.
+
+    Следующая лента читается, только когда предыдущие закончились.
+    """
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        skip = key.start or 0
+        left = None if key.stop is None else key.stop - skip
+        sources = self.sources if self.descending else self.sources[::-1]
+        rows = []
+        for source in sources:
+            if left is not None and left <= 0:
+                break
+            stop = None if left is None else skip + left
+            chunk = list(source[skip:stop])
+            if not chunk and skip:
+                # Лента короче пропуска: пропускаем её целиком.
+                skip = max(skip - source.count(), 0)
+                continue
+            skip = 0
+            rows += chunk
+            if left is not None:
+                left -= len(chunk)
+        return rows
+
+
+def across_shards(queryset):
+    """Выборка постов из всех баз (posts.shards) как одна лента."""
+    databases = shards.databases()
+    if len(databases) == 1:
+        return queryset
+    return MergedFeed(*(queryset.using(alias) for alias in databases))
+
+
+def with_archive(queryset, feed=None):
+    """Лента feed (по умолчанию queryset), которая продолжается
+    постами queryset из архива (posts.shards)."""
+    feed = queryset if feed is None else feed
+    if shards.archive() is None:
+        return feed
+    return ChainedFeed(feed, queryset.using(shards.archive()))
+
+
+def heavy_author_ids(user):
+    """Авторы, на которых подписан user и посты которых не раздаются.
+
+    У таких авторов слишком много подписчиков, поэтому их посты
+    подмешиваются в ленту при чтении, а не копируются в ленты при записи.
+    """
+    return list(
+        Follow.objects.filter(
+            user=user,
+            author__profile__followers_count__gt=(
+                settings.TIMELINE_FANOUT_LIMIT
+            ),
+        ).values_list('author_id', flat=True)
+    )
+
+
+def is_heavy_author(author_id):
+    return Profile.objects.filter(
+        user_id=author_id,
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).exists()
+
+
+# Ключ пагинации ленты подписок: у записей ленты и у постов
+# популярных авторов он берётся из разных таблиц, но значения совпадают.
+FOLLOW_FEED_KEY = ('feed_date', 'feed_id')
+
+
+def follow_feed(user):
+    """Лента подписок: материализованная лента плюс посты популярных
+    авторов, подтянутые при чтении.
+
+    Лента сортируется по полям TimelineEntry, чтобы запрос шёл
+    по индексу (user, pub_date, post) без сортировки в памяти.
+    """
+    if shards.is_sharded():
+        return sharded_follow_feed(user)
+    heavy = heavy_author_ids(user)
+    posts = Post.objects.all()
+    timeline = posts.filter(timeline_entries__user=user).annotate(
+        feed_date=F('timeline_entries__pub_date'),
+        feed_id=F('timeline_entries__post'),
+    )
+    if not heavy:
+        return timeline
+    return MergedFeed(
+        timeline.exclude(author_id__in=heavy),
+        posts.filter(author_id__in=heavy).annotate(
+            feed_date=F('pub_date'),
+            feed_id=F('id'),
+        ),
+    )
+
+
+def sharded_follow_feed(user):
+    """Лента подписок, когда посты делятся между базами.
+
+    Материализованная лента ссылается на посты основной базы, поэтому
+    она не ведётся, а посты читаются при открытии ленты: по запросу
+    на базу с авторами из неё, и ленты баз сливаются по дате.
+    """
+    authors = defaultdict(list)
+    for author_id in Follow.objects.filter(user=user).values_list(
+        'author_id', flat=True
+    ):
+        authors[shards.shard_for_author(author_id)].append(author_id)
+    return MergedFeed(*(
+        Post.objects.using(alias).filter(author_id__in=author_ids).annotate(
+            feed_date=F('pub_date'),
+            feed_id=F('id'),
+        )
+        for alias, author_ids in authors.items()
+    ))
+
+
+def fan_out(post):
+    """Добавляет пост в ленты подписчиков автора."""
+    if shards.is_sharded() or is_heavy_author(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in followers.iterator()
+        ),
+        ignore_conflicts=True,
+    )
+
+
+def add_author_to_timeline(user_id, author_id):
+    """Копирует последние посты автора в ленту нового подписчика."""
+    if shards.is_sharded() or is_heavy_author(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'id', 'pub_date'
+    )[:settings.TIMELINE_LENGTH]
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts
+        ),
+        ignore_conflicts=True,
+    )
+    trim_timeline(user_id)
+
+
+def trim_timeline(user_id):
+    """Оставляет в ленте только TIMELINE_LENGTH последних записей."""
+    entries = TimelineEntry.objects.filter(user_id=user_id)
+    return entries.exclude(
+        pk__in=entries.order_by('-pub_date', '-post_id')
+        .values('pk')[:settings.TIMELINE_LENGTH]
+    ).delete()[0]
+
+
+@task
+def backfill_author(author_id):
+    """Фоновая задача: копирует посты автора в ленты всех подписчиков.
+
+    Пока подписчиков у автора было больше TIMELINE_FANOUT_LIMIT, его
+    посты не раздавались, и когда он опускается до лимита, эти посты
+    иначе пропали бы из лент.
+    """
+    followers = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True)
+    for user_id in followers.iterator():
+        add_author_to_timeline(user_id, author_id)
+
+
+def remove_author_from_timeline(user_id, author_id):
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def rebuild_timeline(user):
+    """Собирает ленту пользователя заново по его подпискам.
+
+    Старая лента удаляется в одной транзакции с созданием новой: при
+    ошибке пользователь остаётся со старой лентой, а не с пустой.
+    """
+    with transaction.atomic():
+        TimelineEntry.objects.filter(user=user).delete()
+        if shards.is_sharded():
+            return
+        heavy = heavy_author_ids(user)
+        posts = Post.objects.filter(
+            author__following__user=user
+        ).exclude(author_id__in=heavy).values_list(
+            'id', 'pub_date'
+        )[:settings.TIMELINE_LENGTH]
+        TimelineEntry.objects.bulk_create(
+            (
+                TimelineEntry(user=user, post_id=post_id, pub_date=pub_date)
+                for post_id, pub_date in posts
+            ),
+            ignore_conflicts=True,
+        )
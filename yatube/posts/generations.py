@@ -0,0 +1,174 @@
+"""Поколения кэша лент.
+
+Фрагменты лент кэшируются по ключу, в который входят поколения их
+областей: все посты, группа, автор, пост, подписки пользователя.
+Сигналы моделей обновляют поколения затронутых областей, и старые
+фрагменты просто перестают запрашиваться, поэтому их можно хранить
+часами. Поколение — время последнего изменения области в наносекундах,
+поэтому из него же получаются ETag и Last-Modified страниц.
+
+Поколения страницы читаются до её данных: если реплика, с которой
+читает запрос, старше поколений, запрос переключается на основную базу.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import Http404
+from django.views.decorators.http import condition
+
+from yatube.db.replicas import require_changes
+
+from . import shards
+
+ALL_POSTS = 'posts'
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def author_scope(username):
+    return f'author:{username}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def follow_scope(user_id):
+    return f'follow:{user_id}'
+
+
+def post_scopes(post, group_slugs=()):
+    """Области, на страницах которых показывается пост."""
+    scopes = {
+        ALL_POSTS,
+        author_scope(post.author.username),
+        post_scope(post.pk),
+    }
+    current = post.group.slug if post.group_id else None
+    for slug in {current, *group_slugs}:
+        if slug is not None:
+            scopes.add(group_scope(slug))
+    return scopes
+
+
+def _post_page_key(post_id):
+    return f'post-page-scopes:{post_id}'
+
+
+def post_page_scopes(request, post_id):
+    """Области страницы поста: сам пост, его автор (счётчик постов
+    автора) и группа (её название).
+
+    Автор и группа поста хранятся в кэше, чтобы ответ 304 обходился
+    без запросов к базе.
+    """
+    key = _post_page_key(post_id)
+    related = cache.get(key)
+    if related is None:
+        try:
+            post = shards.get_post_or_404(post_id)
+        except Http404:
+            return [post_scope(post_id)]
+        related = [author_scope(post.author.username)]
+        if post.group_id:
+            related.append(group_scope(post.group.slug))
+        cache.set(key, related, None)
+    return [post_scope(post_id), *related]
+
+
+def forget_post_page(post_id, using=None):
+    """Забывает автора и группу поста после фиксации транзакции."""
+    transaction.on_commit(
+        lambda: cache.delete(_post_page_key(post_id)), using=using
+    )
+
+
+def _key(scope):
+    return f'generation:{scope}'
+
+
+def get_generations(*scopes, start=None):
+    """Текущие поколения областей в порядке scopes.
+
+    start — время, с которого начинаются отсутствующие в кэше
+    поколения, по умолчанию текущее.
+    """
+    keys = [_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    # Поколение, которого нет в кэше, начинается не раньше запроса и
+    # не может совпасть с вытесненным.
+    start = start or time.time_ns()
+    missing = {key: start for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    # Данные страницы читаются после её поколений и должны быть не
+    # старше их.
+    if found:
+        require_changes(max(found.values()))
+    return [found[key] for key in keys]
+
+
+def bump(*scopes, using=None):
+    """Делает устаревшими все фрагменты и ETag областей scopes.
+
+    Поколения меняются после фиксации транзакции базы using: иначе
+    страница, собранная до фиксации, попала бы в кэш под новым
+    поколением со старыми данными.
+    """
+    def set_generations():
+        now = time.time_ns()
+        cache.set_many({_key(scope): now for scope in scopes}, None)
+
+    transaction.on_commit(set_generations, using=using)
+
+
+def feed_cache_key(page_obj, *scopes):
+    """Ключ фрагмента страницы ленты: поколения областей, номер
+    страницы и посты на ней."""
+    generations = '.'.join(map(str, get_generations(*scopes)))
+    posts = '.'.join(str(post.pk) for post in page_obj)
+    return f'{generations}:{page_obj.number}:{posts}'
+
+
+def conditional_page(scopes):
+    """Отвечает 304 Not Modified, если поколения областей страницы не
+    изменились, не выполняя view.
+
+    scopes(request, **kwargs) возвращает области страницы. ETag
+    учитывает пользователя и его CSRF-cookie: страница
+    авторизованного пользователя содержит его форму и кнопки.
+    """
+    def generations(request, *args, **kwargs):
+        if not hasattr(request, '_page_generations'):
+            request._page_generations = get_generations(
+                *scopes(request, *args, **kwargs)
+            )
+        return request._page_generations
+
+    def etag(request, *args, **kwargs):
+        # Областей может быть много, например авторы из ленты подписок.
+        versions = hashlib.md5('.'.join(
+            map(str, generations(request, *args, **kwargs))
+        ).encode()).hexdigest()
+        if not request.user.is_authenticated:
+            return versions
+        viewer = hashlib.md5(
+            f'{request.user.pk}:'
+            f'{request.COOKIES.get(settings.CSRF_COOKIE_NAME)}'.encode()
+        ).hexdigest()[:12]
+        return f'{versions}-{viewer}'
+
+    def last_modified(request, *args, **kwargs):
+        return datetime.fromtimestamp(
+            max(generations(request, *args, **kwargs)) / 10 ** 9,
+            tz=timezone.utc,
+        )
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
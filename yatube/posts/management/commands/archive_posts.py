@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from posts import shards
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Переносит посты старше POST_ARCHIVE_AFTER_DAYS дней вместе '
+            'с комментариями в архив POST_ARCHIVE. Страница поста и '
+            'профиль автора продолжают их показывать. Прерванный '
+            'перенос продолжается повторным запуском.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=None,
+            help='Возраст постов для архива, по умолчанию '
+                 'POST_ARCHIVE_AFTER_DAYS.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько постов переносить в одной транзакции.',
+        )
+        parser.add_argument(
+            '--vacuum', action='store_true',
+            help='Сжать базы постов после переноса. VACUUM блокирует '
+                 'запись на всё время работы.',
+        )
+
+    def handle(self, *args, **options):
+        archive = shards.archive()
+        if archive is None:
+            raise CommandError('Архив не настроен: POST_ARCHIVE пуст.')
+        days = options['days']
+        if days is None:
+            days = settings.POST_ARCHIVE_AFTER_DAYS
+        cutoff = timezone.now() - timedelta(days=days)
+        batch_size = options['batch_size']
+        for source in shards.databases():
+            # Самые старые посты первыми: прерванный перенос оставляет
+            # в горячей таблице только более новые посты.
+            posts = Post._base_manager.using(source).filter(
+                pub_date__lt=cutoff
+            ).order_by('pub_date', 'pk')
+            moved = 0
+            while True:
+                batch = list(posts[:batch_size])
+                if not batch:
+                    break
+                shards.move_posts(batch, source, archive)
+                moved += len(batch)
+            if moved and options['vacuum']:
+                with connections[source].cursor() as cursor:
+                    cursor.execute('VACUUM')
+            self.stdout.write(f'{source}: в архив перенесено {moved}')
+        self.stdout.write(self.style.SUCCESS('Архивация завершена.'))
@@ -0,0 +1,186 @@
+import math
+import random
+import time
+from contextlib import ExitStack
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+
+from core.testing import (
+    capture_queries, isolated_caches, on_commit_callbacks,
+)
+from posts import shards
+from posts.models import Group, Post, User
+from posts.utils import CursorPaginator
+
+# Адрес вне INTERNAL_IPS, чтобы не подключалась debug_toolbar.
+REMOTE_ADDR = '203.0.113.1'
+
+
+def percentile(values, percent):
+    """Процентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет все страницы posts и списки постов, комментариев и '
+            'подписок в админке через тестовый клиент и выводит '
+            'p50/p95/p99 времени ответа и число запросов к базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=100,
+            help='Сколько запросов выполнить к каждой странице.',
+        )
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэш перед каждым запросом.',
+        )
+
+    def sample(self, queryset, size=200):
+        values = list(queryset.order_by('?')[:size])
+        if not values:
+            raise CommandError(
+                'Недостаточно данных, сначала выполните generate_data.'
+            )
+        return values
+
+    def scenarios(self):
+        """Страницы posts.views: имя -> функция, которая возвращает
+        (клиент, метод, адрес, данные формы)."""
+        rng = self.rng
+        posts = self.sample(Post.objects.values_list('pk', flat=True))
+        groups = self.sample(Group.objects.values_list('slug', flat=True))
+        authors = self.sample(
+            User.objects.filter(profile__posts_count__gt=0)
+            .values_list('username', flat=True)
+        )
+        reader = User.objects.order_by('-profile__following_count').first()
+        writer = User.objects.get(username=authors[0])
+        own_posts = self.sample(writer.posts.values_list('pk', flat=True))
+        texts = self.sample(Post.objects.values_list('text', flat=True))
+        terms = [
+            word for text in texts for word in text.split() if len(word) > 3
+        ] or ['пост']
+        oldest = Post.objects.order_by('pub_date', 'id').first()
+        deep_cursor = CursorPaginator.encode_cursor(oldest, 1000)
+
+        anonymous = Client(REMOTE_ADDR=REMOTE_ADDR)
+        reader_client = Client(REMOTE_ADDR=REMOTE_ADDR)
+        reader_client.force_login(reader)
+        writer_client = Client(REMOTE_ADDR=REMOTE_ADDR)
+        writer_client.force_login(writer)
+        # Создаётся внутри транзакции handle и откатывается вместе с ней.
+        admin_client = Client(REMOTE_ADDR=REMOTE_ADDR)
+        admin_client.force_login(User.objects.create_superuser(
+            username='benchmark_admin', email='', password=None,
+        ))
+
+        def post_url(name, pk=None):
+            return reverse(name, kwargs={'post_id': pk or rng.choice(posts)})
+
+        def profile_url(name):
+            return reverse(name, kwargs={'username': rng.choice(authors)})
+
+        return {
+            'index': lambda: (
+                anonymous, 'get', reverse('posts:index'), {}),
+            'index ?after=': lambda: (
+                anonymous, 'get', reverse('posts:index'),
+                {'after': deep_cursor}),
+            'group_list': lambda: (
+                anonymous, 'get',
+                reverse('posts:group_list',
+                        kwargs={'slug': rng.choice(groups)}), {}),
+            'profile': lambda: (
+                anonymous, 'get', profile_url('posts:profile'), {}),
+            'post_detail': lambda: (
+                anonymous, 'get', post_url('posts:post_detail'), {}),
+            'search': lambda: (
+                anonymous, 'get', reverse('posts:search'),
+                {'q': rng.choice(terms)}),
+            'follow_index': lambda: (
+                reader_client, 'get', reverse('posts:follow_index'), {}),
+            'post_create': lambda: (
+                writer_client, 'post', reverse('posts:post_create'),
+                {'text': 'Пост из нагрузочного теста'}),
+            'post_edit': lambda: (
+                writer_client, 'post',
+                post_url('posts:post_edit', rng.choice(own_posts)),
+                {'text': 'Пост изменён нагрузочным тестом'}),
+            'add_comment': lambda: (
+                reader_client, 'post', post_url('posts:add_comment'),
+                {'text': 'Комментарий из нагрузочного теста'}),
+            'profile_follow': lambda: (
+                reader_client, 'get', profile_url('posts:profile_follow'),
+                {}),
+            'profile_unfollow': lambda: (
+                reader_client, 'get', profile_url('posts:profile_unfollow'),
+                {}),
+            'admin posts': lambda: (
+                admin_client, 'get', reverse('admin:posts_post_changelist'),
+                {}),
+            'admin posts ?q=': lambda: (
+                admin_client, 'get', reverse('admin:posts_post_changelist'),
+                {'q': rng.choice(authors)}),
+            'admin comments': lambda: (
+                admin_client, 'get',
+                reverse('admin:posts_comment_changelist'), {}),
+            'admin follows': lambda: (
+                admin_client, 'get',
+                reverse('admin:posts_follow_changelist'), {}),
+        }
+
+    def run(self, scenario, requests, cold):
+        timings, queries = [], []
+        for _ in range(requests):
+            client, method, path, data = scenario()
+            if cold:
+                cache.clear()
+            # Колбэки transaction.on_commit выполняются после запроса,
+            # как после фиксации: иначе изменения не сбрасывали бы кэши.
+            with ExitStack() as stack:
+                for using in self.databases:
+                    stack.enter_context(on_commit_callbacks(using))
+                with capture_queries() as captured:
+                    started = time.perf_counter()
+                    response = getattr(client, method)(path, data)
+                    timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                raise CommandError(f'{path}: ответ {response.status_code}')
+            queries.append(len(captured))
+        return timings, queries
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        header = (f'{"Страница":<18}{"p50, мс":>10}{"p95, мс":>10}'
+                  f'{"p99, мс":>10}{"запросов":>10}')
+        # Изменения, которые делают страницы с формами, откатываются
+        # во всех базах постов. Кэш временный: страницы и поколения с
+        # неподтверждёнными постами не должны попасть к читателям.
+        self.databases = shards.all_databases()
+        with ExitStack() as stack:
+            stack.enter_context(isolated_caches())
+            for using in self.databases:
+                stack.enter_context(transaction.atomic(using=using))
+            scenarios = self.scenarios()
+            self.stdout.write(header)
+            for name, scenario in scenarios.items():
+                timings, queries = self.run(
+                    scenario, options['requests'], options['cold']
+                )
+                self.stdout.write(
+                    f'{name:<18}'
+                    f'{percentile(timings, 50):>10.1f}'
+                    f'{percentile(timings, 95):>10.1f}'
+                    f'{percentile(timings, 99):>10.1f}'
+                    f'{sum(queries) / len(queries):>10.1f}'
+                )
+            for using in self.databases:
+                transaction.set_rollback(True, using=using)
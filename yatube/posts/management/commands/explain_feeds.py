@@ -0,0 +1,83 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from posts.feeds import FOLLOW_FEED_KEY, follow_feed
+from posts.models import Comment, Follow, Post
+from posts.utils import CursorPaginator
+
+# Индексы, которые добавляет миграция 0018_feed_indexes.
+FEED_INDEXES = (
+    'post_pub_date_idx',
+    'post_author_pub_date_idx',
+    'post_group_pub_date_idx',
+    'comment_post_created_idx',
+    'timeline_user_pub_date_idx',
+)
+
+# Так SQLite сообщает о сортировке, для которой не нашлось индекса.
+FILESORT = 'USE TEMP B-TREE'
+
+
+class Command(BaseCommand):
+    help = ('Печатает EXPLAIN QUERY PLAN запросов всех лент без составных '
+            'индексов и с ними.')
+
+    def feed_queries(self):
+        """Запросы, которые выполняют ленты: первая страница и переход
+        по курсору."""
+        now = timezone.now()
+        posts = Post.objects.all()
+        feeds = {
+            'index': (posts, None),
+            'group_list': (posts.filter(group_id=1), None),
+            'profile': (posts.filter(author_id=1), None),
+            'follow_index': (follow_feed(1), FOLLOW_FEED_KEY),
+        }
+        for name, (feed, key) in feeds.items():
+            paginator = CursorPaginator(
+                feed, settings.NUMBER_POSTS, key=key
+            )
+            limit = settings.NUMBER_POSTS + 1
+            yield name, paginator.object_list[:limit]
+            yield f'{name} ?after=', paginator.rows_after(now, 1)[:limit]
+            yield f'{name} ?before=', paginator.rows_before(now, 1)[:limit]
+        yield 'post_detail comments', Comment.objects.filter(post_id=1)
+        yield 'profile following', Follow.objects.filter(
+            user_id=1, author_id=2
+        )
+
+    def report(self, title):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        filesorts = 0
+        for name, queryset in self.feed_queries():
+            plan = queryset.explain()
+            self.stdout.write(f'  {name}:')
+            for line in plan.splitlines():
+                self.stdout.write(f'    {line}')
+            if FILESORT in plan:
+                filesorts += 1
+        self.stdout.write(f'  Сортировок без индекса: {filesorts}\n')
+        return filesorts
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            self.stderr.write('Команда рассчитана на SQLite.')
+            return
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                for name in FEED_INDEXES:
+                    name = connection.ops.quote_name(name)
+                    cursor.execute(f'DROP INDEX IF EXISTS {name}')
+            self.report('До: без составных индексов')
+            transaction.set_rollback(True)
+        filesorts = self.report('После: с составными индексами')
+        if filesorts:
+            self.stdout.write(self.style.ERROR(
+                'Есть ленты, которые сортируются без индекса.'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                'Все ленты читаются по индексу.'
+            ))
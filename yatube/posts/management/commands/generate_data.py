@@ -0,0 +1,174 @@
+import random
+from bisect import bisect
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import explicit_dates, render_text
+from posts.counters import reconcile_counters
+from posts.feeds import rebuild_timeline
+from posts.models import Comment, Follow, Group, Post, User
+
+# Пароль всех сгенерированных пользователей, чтобы под ними можно было
+# войти при нагрузочном тестировании.
+PASSWORD = 'benchmark'
+
+
+class PowerLaw:
+    """Случайный выбор с вероятностью, убывающей как 1 / rank ** skew.
+
+    Так распределены подписчики у авторов и посты по группам: немногие
+    популярные значения получают большую часть выборки.
+    """
+
+    def __init__(self, values, skew, rng):
+        self.values = list(values)
+        self.rng = rng
+        self.cumulative = list(accumulate(
+            1 / rank ** skew for rank in range(1, len(self.values) + 1)
+        ))
+
+    def __call__(self):
+        point = self.rng.random() * self.cumulative[-1]
+        return self.values[bisect(self.cumulative, point)]
+
+
+class Command(BaseCommand):
+    help = ('Генерирует пользователей, группы, посты, комментарии и '
+            'подписки со степенным распределением популярности.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=200000)
+        parser.add_argument('--follows', type=int, default=100000)
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Показатель степенного распределения популярности.',
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней разбросаны даты публикаций.',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument(
+            '--no-timelines', action='store_true',
+            help='Не пересобирать ленты подписок после генерации.',
+        )
+
+    def batches(self, total, build):
+        """Создаёт total объектов пачками по batch_size."""
+        model = None
+        created = 0
+        while created < total:
+            size = min(self.batch_size, total - created)
+            objects = [build(created + i) for i in range(size)]
+            model = type(objects[0])
+            with transaction.atomic():
+                model.objects.bulk_create(
+                    objects, ignore_conflicts=model is Follow,
+                )
+            created += size
+            self.stdout.write(
+                f'\r  {model._meta.verbose_name_plural}: {created}/{total}',
+                ending='',
+            )
+            self.stdout.flush()
+        if model is not None:
+            self.stdout.write('')
+
+    def random_date(self):
+        return self.now - timedelta(seconds=self.rng.random() * self.span)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.span = timedelta(days=options['days']).total_seconds()
+        prefix = f'user{self.rng.randrange(10 ** 6)}_'
+        password = make_password(PASSWORD)
+        first_user = User.objects.order_by('-pk').values_list(
+            'pk', flat=True
+        ).first() or 0
+
+        if options['users'] < 2:
+            raise CommandError('Нужно хотя бы два пользователя.')
+        self.batches(options['users'], lambda i: User(
+            username=f'{prefix}{i}', password=password,
+        ))
+        user_ids = list(
+            User.objects.filter(pk__gt=first_user, username__startswith=prefix)
+            .values_list('pk', flat=True)
+        )
+        group_prefix = f'group-{self.rng.randrange(10 ** 6)}-'
+        self.batches(options['groups'], lambda i: Group(
+            title=f'Группа {group_prefix}{i}',
+            slug=f'{group_prefix}{i}',
+            description='Сгенерированная группа',
+        ))
+        group_ids = list(
+            Group.objects.filter(slug__startswith=group_prefix)
+            .values_list('pk', flat=True)
+        )
+
+        popular_author = PowerLaw(
+            self.rng.sample(user_ids, len(user_ids)), options['skew'],
+            self.rng,
+        )
+        hot_group = PowerLaw(group_ids, options['skew'], self.rng)
+        any_user = PowerLaw(user_ids, 0, self.rng)
+
+        first_post = Post.objects.order_by('-pk').values_list(
+            'pk', flat=True
+        ).first() or 0
+        with explicit_dates(Post._meta.get_field('pub_date')):
+            self.batches(options['posts'], lambda i: Post(
+                author_id=popular_author(),
+                group_id=hot_group() if group_ids else None,
+                text=f'Сгенерированный пост №{i}',
+                text_html=render_text(f'Сгенерированный пост №{i}'),
+                pub_date=self.random_date(),
+            ))
+        post_ids = list(
+            Post.objects.filter(pk__gt=first_post).values_list('pk', flat=True)
+        )
+        hot_post = PowerLaw(
+            self.rng.sample(post_ids, len(post_ids)), options['skew'],
+            self.rng,
+        )
+        comments = options['comments'] if post_ids else 0
+        with explicit_dates(Comment._meta.get_field('created')):
+            self.batches(comments, lambda i: Comment(
+                post_id=hot_post(),
+                author_id=any_user(),
+                text=f'Сгенерированный комментарий №{i}',
+                text_html=render_text(f'Сгенерированный комментарий №{i}'),
+                created=self.random_date(),
+            ))
+
+        def follow(i):
+            user_id, author_id = any_user(), popular_author()
+            while author_id == user_id:
+                author_id = popular_author()
+            return Follow(user_id=user_id, author_id=author_id)
+
+        self.batches(options['follows'], follow)
+
+        self.stdout.write('Пересчёт счётчиков...')
+        reconcile_counters()
+        if not options['no_timelines']:
+            self.stdout.write('Сборка лент подписок...')
+            for user in User.objects.filter(
+                pk__gt=first_user, username__startswith=prefix,
+                follower__isnull=False,
+            ).distinct().iterator():
+                rebuild_timeline(user)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово. Пароль пользователей {prefix}*: {PASSWORD}'
+        ))
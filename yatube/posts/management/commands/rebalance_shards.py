@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import shards
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Переносит посты и их комментарии в базы авторов из '
+            'POST_SHARDS: после добавления базы или загрузки данных в '
+            'основную базу. Посты сохраняют id. Прерванный перенос '
+            'продолжается повторным запуском.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько постов переносить в одной транзакции.',
+        )
+
+    def handle(self, *args, **options):
+        if not shards.is_sharded():
+            raise CommandError('В POST_SHARDS одна база, переносить некуда.')
+        batch_size = options['batch_size']
+        moved = 0
+        for source in shards.databases():
+            authors = list(
+                Post._base_manager.using(source).order_by()
+                .values_list('author_id', flat=True).distinct()
+            )
+            for author_id in authors:
+                target = shards.shard_for_author(author_id)
+                if target == source:
+                    continue
+                posts = Post._base_manager.using(source).filter(
+                    author_id=author_id
+                ).order_by('pk')
+                while True:
+                    batch = list(posts[:batch_size])
+                    if not batch:
+                        break
+                    shards.move_posts(batch, source, target)
+                    moved += len(batch)
+                self.stdout.write(f'{source} -> {target}: автор {author_id}')
+        self.stdout.write(self.style.SUCCESS(f'Перенесено постов: {moved}'))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from posts import search, shards
+
+
+class Command(BaseCommand):
+    help = ('Создаёт полнотекстовые индексы постов и комментариев и их '
+            'триггеры, если их нет, и перестраивает индексы по содержимому '
+            'таблиц.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            help='База постов, по умолчанию все базы постов и архив.',
+        )
+
+    def handle(self, *args, **options):
+        databases = shards.all_databases()
+        if options['database']:
+            databases = [options['database']]
+        for using in databases:
+            self.rebuild(connections[using])
+        self.stdout.write(self.style.SUCCESS('Индекс поиска перестроен.'))
+
+    def rebuild(self, connection):
+        if not search.install(connection):
+            raise CommandError(
+                f'Полнотекстовый индекс в базе {connection.alias} '
+                f'недоступен: нужен SQLite с FTS5. Поиск работает через '
+                f'LIKE.'
+            )
+        search.rebuild(connection)
+        with connection.cursor() as cursor:
+            for fts_table in search.INDEXES:
+                cursor.execute(
+                    f"INSERT INTO {fts_table}({fts_table}) "
+                    f"VALUES ('optimize')"
+                )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики сообщений, комментариев и подписок '
+            'по фактическим данным.')
+
+    def handle(self, *args, **options):
+        fixed = reconcile_counters()
+        self.stdout.write(
+            self.style.SUCCESS(f'Исправлено счётчиков: {fixed}')
+        )
@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import render_text
+from posts import shards
+from posts.models import Comment, Post
+
+
+class Command(BaseCommand):
+    help = ('Заполняет готовый HTML текста у сообщений и комментариев, '
+            'у которых его ещё нет.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересчитать HTML у всех строк, а не только у пустых.',
+        )
+        parser.add_argument(
+            '--database',
+            help='База постов, по умолчанию все базы постов и архив.',
+        )
+
+    def render(self, model, batch_size, everything, using):
+        """Обходит строки пачками по возрастанию pk, поэтому прерванный
+        запуск можно просто повторить."""
+        manager = model._base_manager.db_manager(using)
+        queryset = manager.order_by('pk')
+        if not everything:
+            queryset = queryset.filter(text_html='')
+        rendered = 0
+        last_pk = 0
+        while True:
+            rows = list(
+                queryset.filter(pk__gt=last_pk)
+                .values_list('pk', 'text')[:batch_size]
+            )
+            if not rows:
+                break
+            with transaction.atomic(using=using):
+                manager.bulk_update(
+                    [model(pk=pk, text_html=render_text(text))
+                     for pk, text in rows],
+                    ['text_html'],
+                )
+            last_pk = rows[-1][0]
+            rendered += len(rows)
+            self.stdout.write(
+                f'\r  {using}, {model._meta.verbose_name_plural}: '
+                f'{rendered}',
+                ending='',
+            )
+            self.stdout.flush()
+        self.stdout.write('')
+        return rendered
+
+    def handle(self, *args, **options):
+        databases = shards.all_databases()
+        if options['database']:
+            databases = [options['database']]
+        total = sum(
+            self.render(
+                model, options['batch_size'], options['all'], using
+            )
+            for using in databases
+            for model in (Post, Comment)
+        )
+        self.stdout.write(self.style.SUCCESS(f'Обновлено строк: {total}'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts.feeds import trim_timeline
+from posts.models import TimelineEntry
+
+
+class Command(BaseCommand):
+    help = ('Удаляет из материализованных лент подписок записи старше '
+            'TIMELINE_LENGTH последних. Раздача постов ленты только '
+            'дополняет, поэтому команду нужно запускать периодически.')
+
+    def handle(self, *args, **options):
+        users = TimelineEntry.objects.order_by().values_list(
+            'user_id', flat=True
+        ).distinct()
+        trimmed = sum(trim_timeline(user_id) for user_id in users.iterator())
+        self.stdout.write(
+            self.style.SUCCESS(f'Удалено записей лент: {trimmed}')
+        )
@@ -0,0 +1,73 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import shards
+from posts.models import Post
+from posts.thumbnails import make_thumbnail
+
+
+def warm(name):
+    """Строит миниатюру в процессе пула, ошибки возвращает текстом."""
+    try:
+        make_thumbnail(name)
+    except Exception as error:
+        return f'{name}: {error}'
+    return None
+
+
+class Command(BaseCommand):
+    help = ('Заранее строит миниатюры всех картинок постов, параллельно '
+            'на всех ядрах.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов, по умолчанию — число ядер.',
+        )
+        parser.add_argument(
+            '--database',
+            help='База постов, по умолчанию все базы постов и архив.',
+        )
+
+    def warm_all(self, names, workers):
+        """Результаты warm по порядку имён; при одном процессе
+        миниатюры строятся без пула."""
+        if workers <= 1:
+            yield from map(warm, names)
+            return
+        # Соединения с базой не должны достаться дочерним процессам.
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=django.setup,
+        ) as executor:
+            chunksize = max(len(names) // (workers * 4), 1)
+            yield from executor.map(warm, names, chunksize=chunksize)
+
+    def handle(self, *args, **options):
+        databases = shards.all_databases()
+        if options['database']:
+            databases = [options['database']]
+        names = sorted({
+            name
+            for using in databases
+            for name in Post._base_manager.using(using).exclude(image='')
+            .order_by().values_list('image', flat=True).distinct()
+        })
+        failed = 0
+        progress = enumerate(self.warm_all(names, options['workers']), 1)
+        for done, error in progress:
+            if error:
+                failed += 1
+                self.stderr.write(error)
+            self.stdout.write(
+                f'\r  Миниатюр: {done}/{len(names)}', ending=''
+            )
+            self.stdout.flush()
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {len(names) - failed}, с ошибками: {failed}'
+        ))
@@ -0,0 +1,79 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:55
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def fill_timelines(apps, schema_editor):
+    """Собирает ленты подписок по подпискам и постам на момент
+    миграции. Копия posts.feeds.rebuild_timeline: миграция не должна
+    зависеть от того, как код изменится потом."""
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    # Посты авторов с большим числом подписчиков подмешиваются в ленту
+    # при чтении и в ленты не копируются.
+    heavy = list(
+        Follow.objects.order_by().values('author')
+        .annotate(total=Count('pk'))
+        .filter(total__gt=settings.TIMELINE_FANOUT_LIMIT)
+        .values_list('author', flat=True)
+    )
+    users = list(
+        Follow.objects.order_by().values_list('user', flat=True).distinct()
+    )
+    for user_id in users:
+        posts = Post.objects.filter(
+            author__following__user_id=user_id
+        ).exclude(author_id__in=heavy).order_by(
+            '-pub_date', '-id'
+        ).values_list('id', 'pub_date').distinct()[
+            :settings.TIMELINE_LENGTH
+        ]
+        TimelineEntry.objects.bulk_create(
+            (
+                TimelineEntry(
+                    user_id=user_id, post_id=post_id, pub_date=pub_date
+                )
+                for post_id, pub_date in posts
+            ),
+            batch_size=500,
+            # Повторные подписки удаляет только миграция 0019.
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0015_auto_20230430_1725'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post', verbose_name='Сообщение')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Ленты подписок',
+                'ordering': ('-pub_date',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date'], name='timeline_user_pub_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique_timeline_entry'),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:00
+
+from django.db import migrations, models
+from django.db.models import (
+    Count, F, IntegerField, Min, OuterRef, Subquery,
+)
+from django.db.models.functions import Coalesce
+import django.db.models.expressions
+
+
+def _count_follows(Follow, field):
+    return Coalesce(
+        Subquery(
+            Follow.objects.filter(**{field: OuterRef('user_id')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def dedupe_follows(apps, schema_editor):
+    """Удаляет повторные подписки и подписки на себя одним запросом
+    на каждый случай, а затем пересчитывает счётчики подписок."""
+    Follow = apps.get_model('posts', 'Follow')
+    Profile = apps.get_model('posts', 'Profile')
+    first_ids = Follow.objects.values('user', 'author').annotate(
+        first_id=Min('id')
+    ).values('first_id')
+    duplicates, _ = Follow.objects.exclude(id__in=first_ids).delete()
+    self_follows, _ = Follow.objects.filter(user=F('author')).delete()
+    if duplicates or self_follows:
+        Profile.objects.update(
+            followers_count=_count_follows(Follow, 'author'),
+            following_count=_count_follows(Follow, 'user'),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_follows, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='follow',
+            name='follow_user_author_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.CheckConstraint(check=models.Q(_negated=True, user=django.db.models.expressions.F('author')), name='prevent_self_follow'),
+        ),
+    ]
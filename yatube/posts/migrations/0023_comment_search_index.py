@@ -0,0 +1,65 @@
+from django.db import OperationalError, migrations
+
+# Копия SQL из posts.search на момент миграции: миграция не должна
+# зависеть от того, как код изменится потом.
+INSTALL_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS posts_comment_fts USING fts5("
+    "text, content='posts_comment', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS posts_comment_fts_ai "
+    "AFTER INSERT ON posts_comment BEGIN "
+    "INSERT INTO posts_comment_fts(rowid, text) VALUES (new.id, new.text); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS posts_comment_fts_ad "
+    "AFTER DELETE ON posts_comment BEGIN "
+    "INSERT INTO posts_comment_fts(posts_comment_fts, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS posts_comment_fts_au "
+    "AFTER UPDATE OF text ON posts_comment BEGIN "
+    "INSERT INTO posts_comment_fts(posts_comment_fts, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    "INSERT INTO posts_comment_fts(rowid, text) VALUES (new.id, new.text); "
+    "END",
+    "INSERT INTO posts_comment_fts(posts_comment_fts) VALUES ('rebuild')",
+)
+UNINSTALL_SQL = (
+    'DROP TRIGGER IF EXISTS posts_comment_fts_ai',
+    'DROP TRIGGER IF EXISTS posts_comment_fts_ad',
+    'DROP TRIGGER IF EXISTS posts_comment_fts_au',
+    'DROP TABLE IF EXISTS posts_comment_fts',
+)
+
+
+def install_search_index(apps, schema_editor):
+    # Без FTS5 админка ищет комментарии через LIKE, и индекс не нужен.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        with schema_editor.connection.cursor() as cursor:
+            for sql in INSTALL_SQL:
+                cursor.execute(sql)
+    except OperationalError:
+        pass
+
+
+def uninstall_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for sql in UNINSTALL_SQL:
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_post_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            install_search_index, uninstall_search_index,
+            hints={'model_name': 'comment'},
+        ),
+    ]
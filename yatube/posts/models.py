@@ -1,10 +1,45 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from core.models import CountersModel, RenderedTextModel
+
+from . import shards
+
 User = get_user_model()
 
 
-class Group(models.Model):
+class Profile(CountersModel):
+    """Счётчики пользователя, которые поддерживаются сигналами."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='profile',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество сообщений',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписчиков',
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписок',
+    )
+
+    counter_fields = ('posts_count', 'followers_count', 'following_count')
+
+    class Meta:
+        verbose_name = 'Профиль'
+        verbose_name_plural = 'Профили'
+
+    def __str__(self):
+        return f'Профиль {self.user}'
+
+
+class Group(CountersModel):
     title = models.CharField(
         max_length=200,
         verbose_name='Название группы',
@@ -20,6 +55,13 @@ class Group(models.Model):
         verbose_name='Описание',
         help_text='Укажите описание группы',
     )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество сообщений',
+    )
+
+    counter_fields = ('posts_count',)
 
     class Meta:
         verbose_name = 'Группа'
@@ -29,7 +71,38 @@ class Group(models.Model):
         return self.title
 
 
-class Post(models.Model):
+class ShardedQuerySet(models.QuerySet):
+    """Выборка моделей, которые делятся между базами (posts.shards)."""
+
+    def create(self, **kwargs):
+        """Без явного using() базу выбирает роутер по самому объекту,
+        а не по модели: пост сохраняется в базу своего автора."""
+        obj = self.model(**kwargs)
+        self._for_write = True
+        obj.save(force_insert=True, using=self._db)
+        return obj
+
+    def _related(self, *fields):
+        # Таблиц пользователей и групп на других базах и в архиве нет,
+        # поэтому связанные объекты догружаются из основной базы.
+        if shards.is_split():
+            return self.prefetch_related(*fields)
+        return self.select_related(*fields)
+
+
+class PostQuerySet(ShardedQuerySet):
+    def with_relations(self, *fields):
+        """Автор и группа, которые выводятся в каждой карточке поста,
+        и связи из fields."""
+        return self._related('author', 'group', *fields)
+
+
+class PostManager(models.Manager.from_queryset(PostQuerySet)):
+    def get_queryset(self):
+        return super().get_queryset().with_relations()
+
+
+class Post(RenderedTextModel, CountersModel):
     text = models.TextField(
         verbose_name='Текст сообщения',
         help_text='Введите текст сообщения',
@@ -39,6 +112,10 @@ class Post(models.Model):
         verbose_name='Дата публикации',
         help_text='Дата публикации сообщения',
     )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -61,17 +138,51 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True,
     )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество комментариев',
+    )
+
+    counter_fields = ('comments_count',)
+
+    objects = PostManager()
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Сообщение'
         verbose_name_plural = 'Сообщения'
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='post_pub_date_idx',
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date_idx',
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
 
 
-class Comment(models.Model):
+class CommentQuerySet(ShardedQuerySet):
+    def with_relations(self):
+        """Автор, ссылка на которого выводится у комментария."""
+        return self._related('author')
+
+
+class CommentManager(models.Manager.from_queryset(CommentQuerySet)):
+    def get_queryset(self):
+        return super().get_queryset().with_relations()
+
+
+class Comment(RenderedTextModel):
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
@@ -96,9 +207,18 @@ class Comment(models.Model):
         help_text='Дата публикации комментария',
     )
 
+    objects = CommentManager()
+
     class Meta:
+        ordering = ('created',)
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = (
+            models.Index(
+                fields=('post', 'created'),
+                name='comment_post_created_idx',
+            ),
+        )
 
     def __str__(self):
         return self.text[:30]
@@ -120,6 +240,59 @@ class Follow(models.Model):
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='unique_follow',
+            ),
+            models.CheckConstraint(
+                check=~models.Q(user=models.F('author')),
+                name='prevent_self_follow',
+            ),
+        )
 
     def __str__(self):
         return f'{self.user} подписался на {self.author}'
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя.
+
+    Заполняется при публикации поста (fan-out on write), дата публикации
+    продублирована, чтобы лента читалась по индексу (user, pub_date).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Сообщение',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+    )
+
+    class Meta:
+        ordering = ('-pub_date',)
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_timeline_entry',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='timeline_user_pub_date_idx',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.post} в ленте {self.user}'
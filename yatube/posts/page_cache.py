@@ -0,0 +1,123 @@
+"""Кэш страниц целиком для анонимных читателей.
+
+Каждая закэшированная страница помечается суррогатными ключами: постами,
+автором, группой или главной страницей. У каждого суррогатного ключа
+своё поколение (posts.generations), и страница хранится под ключом, в
+который входят поколения её суррогатных ключей. Сброс ключа меняет его
+поколение одной записью, и все страницы с ним перестают запрашиваться.
+"""
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import generations
+
+INDEX_KEY = 'index'
+
+# Параметры запроса, от которых зависит страница. Остальные, например
+# метки рекламных кампаний, не создают новых копий в кэше.
+PAGE_PARAMS = ('after', 'before')
+
+
+def post_key(post_id):
+    return f'post:{post_id}'
+
+
+def author_key(author_id):
+    return f'author:{author_id}'
+
+
+def group_key(slug):
+    return f'group:{slug}'
+
+
+def _page_id(request):
+    params = [
+        (name, request.GET[name]) for name in PAGE_PARAMS
+        if name in request.GET
+    ]
+    page = f'{request.path}?{urlencode(params)}'
+    return hashlib.md5(page.encode()).hexdigest()
+
+
+def _scope(surrogate_key):
+    return f'surrogate:{surrogate_key}'
+
+
+def _page_key(page_id, surrogate_keys, versions=None):
+    if versions is None:
+        versions = generations.get_generations(
+            *map(_scope, surrogate_keys)
+        )
+    versions = '.'.join(map(str, versions))
+    return f'page:{page_id}:{hashlib.md5(versions.encode()).hexdigest()}'
+
+
+def _keys_key(page_id):
+    return f'page-keys:{page_id}'
+
+
+def tag_response(response, *surrogate_keys):
+    """Помечает ответ суррогатными ключами."""
+    response.surrogate_keys = set(surrogate_keys)
+    response['Surrogate-Key'] = ' '.join(sorted(response.surrogate_keys))
+    return response
+
+
+def purge(*surrogate_keys, using=None):
+    """Делает устаревшими все страницы с любым из суррогатных ключей
+    после фиксации транзакции базы using."""
+    generations.bump(*map(_scope, surrogate_keys), using=using)
+
+
+def cache_anonymous_page(view):
+    """Отдаёт анонимным GET-запросам закэшированную страницу.
+
+    Кэшируются только успешные ответы, помеченные tag_response.
+    Суррогатные ключи страницы запоминаются при её сборке, а их
+    поколения читаются до сборки: страница, собранная во время
+    изменения, попадает под уже устаревший ключ.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'GET' or request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+        page_id = _page_id(request)
+        surrogate_keys = cache.get(_keys_key(page_id), ())
+        page_key = _page_key(page_id, surrogate_keys)
+        rendered = []
+
+        def render():
+            started = time.time_ns()
+            response = view(request, *args, **kwargs)
+            rendered.append(response)
+            if (response.status_code != 200
+                    or not getattr(response, 'surrogate_keys', None)):
+                return None
+            keys = tuple(sorted(response.surrogate_keys))
+            if keys == surrogate_keys:
+                return response
+            cache.set(_keys_key(page_id), keys, settings.PAGE_CACHE_TIMEOUT)
+            # Ключи страницы изменились. Её можно сохранить под новыми
+            # ключами, только если их не сбрасывали во время сборки.
+            versions = generations.get_generations(
+                *map(_scope, keys), start=started
+            )
+            if max(versions) <= started:
+                cache.set(
+                    _page_key(page_id, keys, versions), response,
+                    settings.PAGE_CACHE_TIMEOUT,
+                )
+            return None
+
+        # Отсутствующую в кэше страницу строит один запрос, остальные
+        # одновременные запросы той же страницы ждут его результата.
+        response = cache.get_or_set(
+            page_key, render, settings.PAGE_CACHE_TIMEOUT
+        )
+        return rendered[0] if response is None else response
+    return wrapper
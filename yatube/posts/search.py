@@ -0,0 +1,265 @@
+"""Полнотекстовый поиск по постам.
+
+Индекс — внешняя таблица FTS5 posts_post_fts поверх posts_post: в ней
+хранится только инвертированный индекс, а сам текст читается из
+таблицы постов. Индекс обновляют триггеры, поэтому он не отстаёт и от
+изменений в обход ORM (update(), bulk_create, raw SQL).
+
+Результаты упорядочены по релевантности (bm25), страницы выбираются по
+ключу (rank, rowid) без OFFSET. Когда посты делятся между базами,
+индекс есть в каждой из них и в архиве, а результаты сливаются по
+рангу. Если FTS5 недоступен (другая база или SQLite без модуля),
+поиск выполняется через LIKE по тексту.
+
+Такой же индекс posts_comment_fts есть у комментариев: по нему ищет
+админка.
+"""
+import base64
+import heapq
+import re
+from itertools import islice
+
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+from . import shards
+from .models import Comment, Post
+
+FTS_TABLE = 'posts_post_fts'
+# Индекс комментариев нужен только поиску в админке.
+COMMENT_FTS_TABLE = 'posts_comment_fts'
+# Таблица индекса -> таблица, из которой читается текст.
+INDEXES = {FTS_TABLE: 'posts_post', COMMENT_FTS_TABLE: 'posts_comment'}
+# Слова длиннее этого не бывают в нормальном запросе, а больше
+# MAX_TERMS слов только замедляют поиск.
+MAX_TERM_LENGTH = 64
+MAX_TERMS = 8
+
+
+def _install_sql(fts_table, table):
+    return (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+        f"text, content='{table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ai "
+        f"AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts_table}(rowid, text) VALUES (new.id, new.text); "
+        f"END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_ad "
+        f"AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts_table}({fts_table}, rowid, text) "
+        f"VALUES ('delete', old.id, old.text); "
+        f"END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_au "
+        f"AFTER UPDATE OF text ON {table} BEGIN "
+        f"INSERT INTO {fts_table}({fts_table}, rowid, text) "
+        f"VALUES ('delete', old.id, old.text); "
+        f"INSERT INTO {fts_table}(rowid, text) VALUES (new.id, new.text); "
+        f"END",
+    )
+
+
+# Есть ли индекс в базе: (псевдоним, имя базы, индекс) -> bool.
+_available = {}
+
+
+def _state_key(connection, fts_table):
+    return (
+        connection.alias, str(connection.settings_dict['NAME']), fts_table
+    )
+
+
+def _index_exists(connection, fts_table=FTS_TABLE):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+            [fts_table],
+        )
+        return cursor.fetchone() is not None
+
+
+def install(connection):
+    """Создаёт индексы постов и комментариев с триггерами, если их
+    ещё нет.
+
+    Новый индекс заполняется из уже сохранённых строк.
+    Возвращает False, если FTS5 недоступен.
+    """
+    if connection.vendor != 'sqlite':
+        return False
+    created = [
+        fts_table for fts_table in INDEXES
+        if not _index_exists(connection, fts_table)
+    ]
+    try:
+        with connection.cursor() as cursor:
+            for fts_table, table in INDEXES.items():
+                for sql in _install_sql(fts_table, table):
+                    cursor.execute(sql)
+    except OperationalError:
+        for fts_table in INDEXES:
+            _available[_state_key(connection, fts_table)] = False
+        return False
+    for fts_table in created:
+        rebuild(connection, fts_table)
+    for fts_table in INDEXES:
+        _available[_state_key(connection, fts_table)] = True
+    return True
+
+
+def repair(connection):
+    """Возвращает триггеры существующим индексам.
+
+    Пересоздание таблицы в SQLite (ALTER через копию) удаляет её
+    триггеры, поэтому вызывается после каждой миграции. Индексы
+    создают и удаляют миграции 0022 и 0023, здесь недостающие индексы
+    не создаются.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for fts_table, table in INDEXES.items():
+            exists = _index_exists(connection, fts_table)
+            if exists:
+                for sql in _install_sql(fts_table, table):
+                    cursor.execute(sql)
+            _available[_state_key(connection, fts_table)] = exists
+
+
+def rebuild(connection, fts_table=None):
+    """Перестраивает индекс fts_table, по умолчанию все индексы, по
+    текущему содержимому таблиц."""
+    with connection.cursor() as cursor:
+        for fts_table in [fts_table] if fts_table else INDEXES:
+            cursor.execute(
+                f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')"
+            )
+
+
+def is_available(connection, fts_table=FTS_TABLE):
+    key = _state_key(connection, fts_table)
+    if key not in _available:
+        _available[key] = (
+            connection.vendor == 'sqlite'
+            and _index_exists(connection, fts_table)
+        )
+    return _available[key]
+
+
+def parse_query(query):
+    """Слова запроса без операторов FTS5 и знаков препинания."""
+    terms = re.findall(r'\w+', query or '')
+    return [term[:MAX_TERM_LENGTH] for term in terms[:MAX_TERMS]]
+
+
+def match_expression(terms):
+    """Все слова обязательны; последнее ищется как префикс, чтобы
+    недописанное слово тоже находилось."""
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def encode_cursor(rank, pk):
+    value = f'{rank!r}|{pk}'
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Возвращает (rank, id) или None."""
+    try:
+        value = base64.urlsafe_b64decode(cursor.encode()).decode()
+        rank, pk = value.split('|')
+        return float(rank), int(pk)
+    except (AttributeError, TypeError, ValueError, UnicodeError):
+        return None
+
+
+def search_posts(query, cursor=None, limit=10, using=None):
+    """Посты по запросу, от более релевантных к менее.
+
+    Без using ищет во всех базах постов (posts.shards), включая
+    архив, и сливает результаты по рангу. Возвращает (посты, курсор следующей страницы
+    или '').
+    """
+    position = decode_cursor(cursor) if cursor else None
+    databases = [using] if using else shards.all_databases()
+    # В запасном поиске через LIKE новые посты идут первыми.
+    descending = not is_available(connections[databases[0]])
+    rows = list(islice(heapq.merge(
+        *(
+            [(rank, pk, alias) for rank, pk in _ranked(
+                query, position, limit + 1, alias
+            )]
+            for alias in databases
+        ),
+        key=lambda row: (row[0], -row[1] if descending else row[1]),
+    ), limit + 1))
+    next_cursor = ''
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(*rows[-1][:2])
+    posts = {}
+    for alias in databases:
+        posts.update(Post.objects.using(alias).in_bulk(
+            [pk for _, pk, db in rows if db == alias]
+        ))
+    return [posts[pk] for _, pk, _ in rows if pk in posts], next_cursor
+
+
+def post_ids(query, limit, using=DEFAULT_DB_ALIAS):
+    """id первых limit постов по запросу, от более релевантных."""
+    return [pk for _, pk in _ranked(query, None, limit, using)]
+
+
+def comment_ids(query, limit, using=DEFAULT_DB_ALIAS):
+    """id первых limit комментариев по запросу, от более релевантных."""
+    terms = parse_query(query)
+    if not terms:
+        return []
+    connection = connections[using]
+    if is_available(connection, COMMENT_FTS_TABLE):
+        return [pk for _, pk in _match(
+            connection, terms, None, limit, COMMENT_FTS_TABLE
+        )]
+    comments = Comment.objects.using(using).order_by('-id')
+    for term in terms:
+        comments = comments.filter(text__icontains=term)
+    return list(comments.values_list('id', flat=True)[:limit])
+
+
+def _ranked(query, position, limit, using):
+    terms = parse_query(query)
+    if not terms:
+        return []
+    connection = connections[using]
+    if is_available(connection):
+        return _match(connection, terms, position, limit)
+    return _like(terms, position, limit, using)
+
+
+def _match(connection, terms, position, limit, fts_table=FTS_TABLE):
+    sql = (
+        f'SELECT rank, rowid FROM {fts_table} '
+        f'WHERE {fts_table} MATCH %s'
+    )
+    params = [match_expression(terms)]
+    if position is not None:
+        rank, pk = position
+        sql += ' AND (rank > %s OR (rank = %s AND rowid > %s))'
+        params += [rank, rank, pk]
+    sql += ' ORDER BY rank, rowid LIMIT %s'
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _like(terms, position, limit, using):
+    """Запасной вариант без индекса: все слова через LIKE, новые
+    посты первыми. Ранг у всех результатов нулевой."""
+    posts = Post.objects.using(using).order_by('-id')
+    for term in terms:
+        posts = posts.filter(text__icontains=term)
+    if position is not None:
+        posts = posts.filter(id__lt=position[1])
+    return [(0.0, pk) for pk in posts.values_list('id', flat=True)[:limit]]
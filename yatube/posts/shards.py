@@ -0,0 +1,276 @@
+"""Деление постов и комментариев между базами по автору.
+
+Базы перечислены в settings.POST_SHARDS, первая — основная. Посты
+автора лежат в базе POST_SHARDS[author_id % N], комментарии — в базе
+своего поста, поэтому профиль и страница поста читаются из одной базы,
+а общие ленты собираются из всех баз слиянием по дате
+(posts.feeds.across_shards). Пользователи, группы, подписки и ленты
+подписок остаются в основной базе.
+
+id постов и комментариев уникальны во всех базах: в базе с номером n
+они начинаются с n * ID_RANGE (reserve_ids). По id сразу понятно, в
+какой базе искать пост, а посты, перенесённые rebalance_shards со
+старыми id, находятся в остальных базах.
+
+Посты старше settings.POST_ARCHIVE_AFTER_DAYS команда archive_posts
+переносит из всех баз в архив settings.POST_ARCHIVE. Общие ленты
+архив не читают, страница поста, профиль и группа продолжаются
+архивом (posts.feeds.with_archive), а поиск ищет и в нём.
+"""
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.http import Http404
+
+from core.models import explicit_dates
+from yatube.db.replicas import current_replica, primary_of
+
+from . import generations, page_cache
+
+ID_RANGE = 10 ** 12
+SHARDED_MODELS = {'posts.post', 'posts.comment'}
+# Сколько id передаётся в одном условии IN: SQLite до версии 3.32
+# принимает не больше 999 параметров в запросе.
+IDS_PER_QUERY = 500
+
+
+def databases():
+    return settings.POST_SHARDS
+
+
+def is_sharded():
+    return len(settings.POST_SHARDS) > 1
+
+
+def archive():
+    """База архива старых постов или None."""
+    return settings.POST_ARCHIVE
+
+
+def all_databases():
+    """Все базы, где лежат посты, включая архив."""
+    return [*settings.POST_SHARDS, *filter(None, [archive()])]
+
+
+def is_split():
+    """Лежат ли посты не только в основной базе."""
+    return len(all_databases()) > 1
+
+
+def shard_for_author(author_id):
+    shards = settings.POST_SHARDS
+    return shards[author_id % len(shards)]
+
+
+def shards_for_post(post_id):
+    """Базы, где может лежать пост: первой — та, что выдала его id."""
+    shards = list(settings.POST_SHARDS)
+    home = post_id // ID_RANGE
+    if 0 < home < len(shards):
+        shards.insert(0, shards.pop(home))
+    return shards
+
+
+def get_post_or_404(post_id, queryset=None):
+    """Пост по id из его базы, а если его там нет — из архива.
+
+    queryset — выборка постов без базы.
+    """
+    if queryset is None:
+        queryset = apps.get_model('posts', 'Post').objects.all()
+    candidates = [queryset]
+    if is_sharded():
+        candidates = [
+            queryset.using(alias) for alias in shards_for_post(post_id)
+        ]
+    if archive() is not None:
+        candidates.append(queryset.using(archive()))
+    for candidate in candidates:
+        post = candidate.filter(pk=post_id).first()
+        if post is not None:
+            return post
+    raise Http404(f'Сообщение {post_id} не найдено.')
+
+
+def move_posts(posts, source, target):
+    """Переносит пачку постов с комментариями из базы source в target.
+
+    Посты сохраняют id и даты. Копия вставляется с ignore_conflicts,
+    поэтому пачка, которую прервали между копированием и удалением,
+    просто переносится заново. Сигналы не отправляются: счётчики от
+    переноса не меняются, а кэши лент и страниц с этими постами
+    сбрасываются здесь же (expire_moved_posts).
+    """
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    ids = [post.pk for post in posts]
+    comments = [
+        comment
+        for chunk in chunked(ids)
+        for comment in Comment._base_manager.using(source).filter(
+            post_id__in=chunk
+        )
+    ]
+    with transaction.atomic(using=target), explicit_dates(
+        Post._meta.get_field('pub_date'),
+        Post._meta.get_field('updated'),
+        Comment._meta.get_field('created'),
+    ):
+        Post._base_manager.using(target).bulk_create(
+            posts, ignore_conflicts=True
+        )
+        Comment._base_manager.using(target).bulk_create(
+            comments, ignore_conflicts=True
+        )
+    # Материализованные ленты ссылаются только на посты основной базы.
+    for chunk in chunked(ids):
+        TimelineEntry.objects.filter(post_id__in=chunk).delete()
+    with transaction.atomic(using=source):
+        with connections[source].cursor() as cursor:
+            for chunk in chunked(ids):
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(
+                    f'DELETE FROM {Comment._meta.db_table} '
+                    f'WHERE post_id IN ({placeholders})', chunk,
+                )
+                cursor.execute(
+                    f'DELETE FROM {Post._meta.db_table} '
+                    f'WHERE id IN ({placeholders})', chunk,
+                )
+    expire_moved_posts(posts, using=source)
+
+
+def chunked(ids):
+    """Делит список id на части по IDS_PER_QUERY."""
+    for start in range(0, len(ids), IDS_PER_QUERY):
+        yield ids[start:start + IDS_PER_QUERY]
+
+
+def expire_moved_posts(posts, using=None):
+    """Сбрасывает поколения лент и страницы, на которых показываются
+    посты, после фиксации транзакции базы using."""
+    Group = apps.get_model('posts', 'Group')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    usernames, slugs = {}, {}
+    for chunk in chunked(list({post.author_id for post in posts})):
+        usernames.update(User.objects.filter(
+            pk__in=chunk
+        ).values_list('pk', 'username'))
+    for chunk in chunked(list(
+        {post.group_id for post in posts if post.group_id}
+    )):
+        slugs.update(Group.objects.filter(
+            pk__in=chunk
+        ).values_list('pk', 'slug'))
+    scopes = {generations.ALL_POSTS}
+    surrogate_keys = {page_cache.INDEX_KEY}
+    for post in posts:
+        scopes.add(generations.post_scope(post.pk))
+        scopes.add(generations.author_scope(usernames[post.author_id]))
+        surrogate_keys.add(page_cache.post_key(post.pk))
+        surrogate_keys.add(page_cache.author_key(post.author_id))
+        if post.group_id in slugs:
+            scopes.add(generations.group_scope(slugs[post.group_id]))
+            surrogate_keys.add(page_cache.group_key(slugs[post.group_id]))
+    generations.bump(*scopes, using=using)
+    page_cache.purge(*surrogate_keys, using=using)
+
+
+def reserve_ids(connection):
+    """Переносит начало id постов и комментариев базы в её диапазон.
+
+    SQLite выдаёт следующий id после наибольшего из sqlite_sequence,
+    поэтому достаточно поднять там значение для таблиц.
+    """
+    shards = settings.POST_SHARDS
+    if connection.vendor != 'sqlite' or connection.alias not in shards:
+        return
+    start = shards.index(connection.alias) * ID_RANGE
+    if not start:
+        return
+    with connection.cursor() as cursor:
+        for model_name in ('Post', 'Comment'):
+            table = apps.get_model('posts', model_name)._meta.db_table
+            cursor.execute(
+                'SELECT seq FROM sqlite_sequence WHERE name = %s', [table]
+            )
+            row = cursor.fetchone()
+            if row is None:
+                cursor.execute(
+                    'INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)',
+                    [table, start],
+                )
+            elif row[0] < start:
+                cursor.execute(
+                    'UPDATE sqlite_sequence SET seq = %s WHERE name = %s',
+                    [start, table],
+                )
+
+
+class ShardRouter:
+    """Направляет посты и комментарии в базу их автора, а связанные
+    объекты — в базу поста, в том числе в архив.
+
+    Выборка без подсказки (Post.objects.filter(...)) идёт в основную
+    базу: ленты из всех баз явно собирает posts.feeds. Пока база одна,
+    роутер ничего не решает и оставляет выбор ReplicaRouter.
+    """
+
+    def _shard(self, model, instance):
+        label = instance._meta.label_lower
+        if label in SHARDED_MODELS and not instance._state.adding:
+            return instance._state.db
+        if label == 'posts.post':
+            if instance.author_id is None:
+                return None
+            return shard_for_author(instance.author_id)
+        if label == 'posts.comment':
+            field = instance._meta.get_field('post')
+            if field.is_cached(instance):
+                return self._shard(model, instance.post)
+            return None
+        # Посты автора: author.posts.all().
+        if (is_sharded() and model._meta.label_lower == 'posts.post'
+                and label == settings.AUTH_USER_MODEL.lower()):
+            return shard_for_author(instance.pk)
+        return None
+
+    def _route(self, model, hints, primary):
+        if not is_split():
+            return None
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+        if model._meta.label_lower in SHARDED_MODELS:
+            return self._shard(model, instance)
+        if instance._meta.label_lower in SHARDED_MODELS:
+            # Автор и группа поста с любой базы — в основной.
+            return primary
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._route(
+            model, hints, current_replica() or DEFAULT_DB_ALIAS
+        )
+
+    def db_for_write(self, model, **hints):
+        database = self._route(model, hints, DEFAULT_DB_ALIAS)
+        # Пост, прочитанный с реплики, сохраняется в основную базу.
+        return database and primary_of(database)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        labels = {obj1._meta.label_lower, obj2._meta.label_lower}
+        if is_split() and labels & SHARDED_MODELS:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # На дополнительных базах и в архиве нужны только таблицы
+        # постов. Таблицы остальных моделей приложения создаются
+        # пустыми, чтобы каскадное удаление поста не ломалось, а
+        # RunPython без подсказки model_name работает только с основной
+        # базой.
+        if db != DEFAULT_DB_ALIAS and db in all_databases():
+            return app_label == 'posts' and model_name is not None
+        return None
@@ -0,0 +1,203 @@
+import threading
+
+from django.conf import settings
+from django.db import connections
+from django.db.models.signals import (
+    post_delete, post_migrate, post_save, pre_delete, pre_save,
+)
+from django.dispatch import receiver
+
+from . import counters, feeds, generations, page_cache, search, shards
+from .models import Comment, Follow, Group, Post, Profile, User
+
+# Посты, удаление которых идёт в текущем потоке: (база, id).
+_deleting = threading.local()
+
+
+def _deleting_posts():
+    if not hasattr(_deleting, 'posts'):
+        _deleting.posts = set()
+    return _deleting.posts
+
+
+@receiver(post_save, sender=User)
+def create_profile(sender, instance, created, raw=False, **kwargs):
+    # При загрузке фикстур профиль может прийти в той же фикстуре,
+    # поэтому недостающий создаёт counters.profile_of при обращении.
+    if created and not raw:
+        Profile.objects.get_or_create(user=instance)
+
+
+@receiver(pre_delete, sender=User)
+def delete_sharded_content(sender, instance, using, **kwargs):
+    # Внешние ключи не связывают базы, и каскадное удаление доходит
+    # только до постов и комментариев в базе пользователя, но не в
+    # других базах постов и не в архиве.
+    for alias in shards.all_databases():
+        if alias == using:
+            continue
+        Post.objects.using(alias).filter(author=instance).delete()
+        Comment.objects.using(alias).filter(author=instance).delete()
+
+
+@receiver(pre_save, sender=Post)
+def remember_group(sender, instance, using, **kwargs):
+    instance._old_group_id = instance._old_group_slug = None
+    if instance.pk is None:
+        return
+    # Пост может лежать не в основной базе, а группы — только там.
+    instance._old_group_id = (
+        Post.objects.using(using).filter(pk=instance.pk)
+        .values_list('group_id', flat=True).first()
+    )
+    if instance._old_group_id not in (None, instance.group_id):
+        instance._old_group_slug = (
+            Group.objects.filter(pk=instance._old_group_id)
+            .values_list('slug', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Post)
+def count_post(sender, instance, created, **kwargs):
+    if created:
+        counters.change_profile(instance.author_id, posts_count=1)
+        counters.change_group(instance.group_id, 1)
+    elif instance._old_group_id != instance.group_id:
+        counters.change_group(instance._old_group_id, -1)
+        counters.change_group(instance.group_id, 1)
+
+
+@receiver(post_delete, sender=Post)
+def uncount_post(sender, instance, **kwargs):
+    counters.change_profile(instance.author_id, posts_count=-1)
+    counters.change_group(instance.group_id, -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, using, **kwargs):
+    if created:
+        counters.change_post(instance.post_id, 1, using)
+
+
+@receiver(pre_delete, sender=Post)
+def remember_deleting_post(sender, instance, using, **kwargs):
+    _deleting_posts().add((using, instance.pk))
+
+
+@receiver(post_delete, sender=Post)
+def forget_deleting_post(sender, instance, using, **kwargs):
+    _deleting_posts().discard((using, instance.pk))
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, using, **kwargs):
+    # Комментарии удаляемого поста удаляются каскадом раньше него, и
+    # менять его счётчик на каждый комментарий незачем.
+    if (using, instance.post_id) not in _deleting_posts():
+        counters.change_post(instance.post_id, -1, using)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.change_profile(instance.author_id, followers_count=1)
+        counters.change_profile(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    counters.change_profile(instance.author_id, followers_count=-1)
+    counters.change_profile(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        feeds.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def add_followed_posts(sender, instance, created, **kwargs):
+    if created:
+        feeds.add_author_to_timeline(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def remove_unfollowed_posts(sender, instance, **kwargs):
+    feeds.remove_author_from_timeline(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def backfill_light_author(sender, instance, **kwargs):
+    # Счётчик уже уменьшен в uncount_follow: ровно на лимите автор
+    # только что перестал быть популярным.
+    if Profile.objects.filter(
+        user_id=instance.author_id,
+        followers_count=settings.TIMELINE_FANOUT_LIMIT,
+    ).exists():
+        feeds.backfill_author.delay(instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def expire_post_feeds(sender, instance, using, **kwargs):
+    old_group_slug = getattr(instance, '_old_group_slug', None)
+    generations.bump(
+        *generations.post_scopes(instance, [old_group_slug]), using=using
+    )
+    generations.forget_post_page(instance.pk, using=using)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def expire_comment_feeds(sender, instance, using, **kwargs):
+    # Комментарии выводятся только на странице поста.
+    generations.bump(
+        generations.post_scope(instance.post_id), using=using
+    )
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def expire_follow_feed(sender, instance, using, **kwargs):
+    generations.bump(generations.follow_scope(instance.user_id), using=using)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def purge_post_pages(sender, instance, using, **kwargs):
+    surrogate_keys = [
+        page_cache.INDEX_KEY,
+        page_cache.post_key(instance.pk),
+        page_cache.author_key(instance.author_id),
+    ]
+    for slug in {
+        getattr(instance, '_old_group_slug', None),
+        instance.group.slug if instance.group else None,
+    } - {None}:
+        surrogate_keys.append(page_cache.group_key(slug))
+    page_cache.purge(*surrogate_keys, using=using)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def purge_comment_pages(sender, instance, using, **kwargs):
+    page_cache.purge(page_cache.post_key(instance.post_id), using=using)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def purge_group_pages(sender, instance, using, **kwargs):
+    page_cache.purge(page_cache.group_key(instance.slug), using=using)
+    # Название группы выводится и на страницах её постов.
+    generations.bump(
+        generations.ALL_POSTS, generations.group_scope(instance.slug),
+        using=using,
+    )
+
+
+@receiver(post_migrate)
+def install_search_index(sender, using, **kwargs):
+    if sender.label == 'posts':
+        search.repair(connections[using])
+        shards.reserve_ids(connections[using])
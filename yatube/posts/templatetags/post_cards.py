@@ -0,0 +1,15 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from ..cards import render_cards
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    """Готовый HTML карточек постов страницы."""
+    return [
+        mark_safe(card)
+        for card in render_cards(list(posts), context.get('group'))
+    ]
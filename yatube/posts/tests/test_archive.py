@@ -0,0 +1,171 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core.testing import on_commit_callbacks
+
+from .. import search
+from ..counters import reconcile_counters
+from ..models import Comment, Follow, Group, Post, TimelineEntry, User
+
+
+@override_settings(POST_ARCHIVE='archive', POST_ARCHIVE_AFTER_DAYS=30,
+                   NUMBER_POSTS=2)
+class ArchiveTests(TestCase):
+    databases = {'default', 'archive'}
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        self.posts = []
+        for age in (90, 60, 1):
+            post = Post.objects.create(
+                author=self.author, text=f'Пост {age}', group=self.group
+            )
+            post.pub_date = timezone.now() - timedelta(days=age)
+            Post.objects.filter(pk=post.pk).update(pub_date=post.pub_date)
+            self.posts.insert(0, post)
+        self.old = self.posts[2]
+        Comment.objects.create(
+            post=self.old, author=self.reader, text='Старый комментарий'
+        )
+        call_command('archive_posts', stdout=StringIO())
+
+    def test_old_posts_move_to_archive(self):
+        self.assertEqual(
+            list(Post.objects.values_list('pk', flat=True)),
+            [self.posts[0].pk],
+        )
+        archived = Post.objects.using('archive').order_by('-pub_date')
+        self.assertEqual(list(archived), self.posts[1:])
+        self.assertEqual(archived.get(pk=self.old.pk).pub_date,
+                         self.old.pub_date)
+        self.assertEqual(Comment.objects.using('archive').count(), 1)
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(TimelineEntry.objects.exclude(
+            post=self.posts[0]
+        ).exists())
+        self.assertEqual(reconcile_counters(), 0)
+
+    def test_archiving_expires_cached_pages(self):
+        post = Post.objects.create(
+            author=self.author, text='Пост 45', group=self.group
+        )
+        Post.objects.filter(pk=post.pk).update(
+            pub_date=timezone.now() - timedelta(days=45)
+        )
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:group_list', args=[self.group.slug]),
+        ]
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        with on_commit_callbacks():
+            call_command('archive_posts', stdout=StringIO())
+        for url, etag in zip(urls, etags):
+            with self.subTest(url=url):
+                self.assertNotEqual(self.client.get(url)['ETag'], etag)
+
+    def test_command_is_resumable(self):
+        call_command('archive_posts', stdout=StringIO())
+        self.assertEqual(Post.objects.using('archive').count(), 2)
+
+    def test_post_detail_falls_back_to_archive(self):
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.old.pk])
+        )
+        self.assertContains(response, 'Пост 90')
+        self.assertContains(response, 'Старый комментарий')
+
+    def test_comment_on_archived_post(self):
+        self.client.force_login(self.reader)
+        self.client.post(
+            reverse('posts:add_comment', args=[self.old.pk]),
+            {'text': 'Новый комментарий'},
+        )
+        post = Post.objects.using('archive').get(pk=self.old.pk)
+        self.assertEqual(post.comments.count(), 2)
+        self.assertEqual(post.comments_count, 2)
+
+    def test_profile_continues_with_archive(self):
+        url = reverse('posts:profile', args=[self.author.username])
+        with CaptureQueriesContext(connections['archive']) as queries:
+            response = self.client.get(url)
+        self.assertEqual(list(response.context['page_obj']), self.posts[:2])
+        self.assertEqual(len(queries.captured_queries), 1)
+        response = self.client.get(
+            url, {'after': response.context['page_obj'].next_cursor}
+        )
+        self.assertEqual(list(response.context['page_obj']), self.posts[2:])
+
+    def test_group_continues_with_archive(self):
+        url = reverse('posts:group_list', args=[self.group.slug])
+        response = self.client.get(url)
+        self.assertEqual(list(response.context['page_obj']), self.posts[:2])
+        response = self.client.get(
+            url, {'after': response.context['page_obj'].next_cursor}
+        )
+        self.assertEqual(list(response.context['page_obj']), self.posts[2:])
+
+    def test_hot_page_does_not_read_archive(self):
+        # О следующей странице говорит лишняя запись, поэтому горячих
+        # постов должно хватить и на неё.
+        for text in ('Ещё пост', 'И ещё пост'):
+            Post.objects.create(author=self.author, text=text)
+        with CaptureQueriesContext(connections['archive']) as queries:
+            self.client.get(
+                reverse('posts:profile', args=[self.author.username])
+            )
+        self.assertFalse(queries.captured_queries)
+
+    def test_deleted_user_content_is_removed_from_archive(self):
+        self.reader.delete()
+        self.assertFalse(Comment.objects.using('archive').exists())
+        self.author.delete()
+        self.assertFalse(Post.objects.using('archive').exists())
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.old.pk])
+        )
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(
+            reverse('posts:group_list', args=[self.group.slug])
+        )
+        self.assertEqual(list(response.context['page_obj']), [])
+        self.assertEqual(reconcile_counters(), 0)
+
+    def test_index_shows_only_hot_posts(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(list(response.context['page_obj']), self.posts[:1])
+
+    def test_search_covers_archive(self):
+        response = self.client.get(reverse('posts:search'), {'q': '90'})
+        self.assertEqual(response.context['posts'], [self.old])
+
+    def test_maintenance_commands_cover_archive(self):
+        Post._base_manager.using('archive').update(text_html='')
+        call_command('render_text_html', stdout=StringIO())
+        self.assertEqual(
+            Post.objects.using('archive').get(pk=self.old.pk).text_html,
+            'Пост 90',
+        )
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertIn(
+            self.old.pk, search.post_ids('пост', 10, using='archive')
+        )
+
+    @override_settings(POST_ARCHIVE=None)
+    def test_archive_is_required(self):
+        with self.assertRaises(CommandError):
+            call_command('archive_posts', stdout=StringIO())
@@ -1,24 +1,41 @@
 from http import HTTPStatus
+from io import StringIO
+from unittest import mock
 
 from posts.forms import PostForm
 
 from django.conf import settings
-from django.test import Client, TestCase
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
 
+from core.models import Task
+from posts import thumbnails
 from posts.models import Group, Post, User
+from sorl.thumbnail import default as sorl_default
 
 import shutil
 import tempfile
 
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
 
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostFormsTests(TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
-        settings.MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
         cls.author = User.objects.create_user(username='Test_name')
         cls.group = Group.objects.create(
             title='test_name_group',
@@ -35,7 +52,7 @@ class PostFormsTests(TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
         super().tearDownClass()
 
     def setUp(self):
@@ -80,6 +97,45 @@ class PostFormsTests(TestCase):
             ).exists()
         )
 
+    def test_thumbnail_is_made_after_upload(self):
+        """Миниатюра загруженной картинки строится фоновой задачей."""
+        uploaded = SimpleUploadedFile(
+            name='thumb.gif', content=SMALL_GIF, content_type='image/gif'
+        )
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'С картинкой', 'image': uploaded},
+        )
+        post = Post.objects.get(text='С картинкой')
+        queued = Task.objects.get()
+        self.assertEqual(queued.name, thumbnails.build_thumbnail.name)
+        self.assertIn(post.image.name, queued.arguments)
+        call_command('worker', processes=1, once=True, stdout=StringIO())
+        self.assertFalse(Task.objects.exists())
+        with mock.patch.object(
+            sorl_default.backend, '_create_thumbnail'
+        ) as create:
+            thumbnails.make_thumbnail(post.image)
+        create.assert_not_called()
+
+    def test_warm_thumbnails(self):
+        """Команда строит миниатюры, которые потом берёт шаблон."""
+        post = Post.objects.create(
+            author=self.author,
+            text='С картинкой',
+            image=SimpleUploadedFile(
+                name='warm.gif', content=SMALL_GIF, content_type='image/gif'
+            ),
+        )
+        out = StringIO()
+        call_command('warm_thumbnails', workers=1, stdout=out)
+        self.assertIn('Готово: 1, с ошибками: 0', out.getvalue())
+        with mock.patch.object(
+            sorl_default.backend, '_create_thumbnail'
+        ) as create:
+            thumbnails.make_thumbnail(post.image)
+        create.assert_not_called()
+
     def test_authorized_create_post(self):
         """Валидная форма создает запись в Post."""
         posts_count = Post.objects.count()
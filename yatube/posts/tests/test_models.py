@@ -1,6 +1,13 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection, models
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-from ..models import Group, Post, User
+from .. import signals
+from ..models import Comment, Follow, Group, Post, Profile, User
 
 
 class PostModelsTests(TestCase):
@@ -87,3 +94,161 @@ class PostModelsTests(TestCase):
                 self.assertEqual(
                     post._meta.get_field(field).help_text, expected_value
                 )
+
+
+class CountersTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Группа',
+            slug='counters',
+            description='Описание',
+        )
+
+    def assert_counters(self, posts, group_posts, followers, comments):
+        profile = Profile.objects.get(user=self.author)
+        self.assertEqual(profile.posts_count, posts)
+        self.assertEqual(profile.followers_count, followers)
+        self.assertEqual(
+            Profile.objects.get(user=self.reader).following_count, followers
+        )
+        self.assertEqual(
+            Group.objects.get(pk=self.group.pk).posts_count, group_posts
+        )
+        if comments is not None:
+            self.assertEqual(
+                Post.objects.get(pk=self.post.pk).comments_count, comments
+            )
+
+    def test_counters_follow_changes(self):
+        """Счётчики меняются при создании и удалении объектов."""
+        self.post = Post.objects.create(
+            author=self.author, text='Пост', group=self.group
+        )
+        comment = Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий'
+        )
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assert_counters(1, 1, 1, 1)
+        self.post.group = None
+        self.post.save()
+        self.assert_counters(1, 0, 1, 1)
+        comment.delete()
+        follow.delete()
+        self.assert_counters(1, 0, 0, 0)
+        self.post.delete()
+        self.assert_counters(0, 0, 0, None)
+
+    def test_reconcile_counters_command(self):
+        """Команда reconcile_counters исправляет расхождения."""
+        self.post = Post.objects.create(
+            author=self.author, text='Пост', group=self.group
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+        Profile.objects.update(
+            posts_count=10, followers_count=10, following_count=10
+        )
+        Group.objects.update(posts_count=10)
+        Profile.objects.filter(user=self.reader).delete()
+        call_command('reconcile_counters', stdout=StringIO())
+        self.assert_counters(1, 1, 1, 0)
+
+    def test_profile_for_fixture_user(self):
+        """Пользователь из фикстуры получает профиль при первом показе."""
+        user = User(username='fixture')
+        user.save_base(raw=True)
+        Post.objects.create(author=user, text='Пост из фикстуры')
+        self.assertFalse(Profile.objects.filter(user=user).exists())
+        for url in (
+            reverse('posts:profile', args=[user.username]),
+            reverse('posts:post_detail', args=[Post.objects.get().pk]),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(Profile.objects.get(user=user).posts_count, 1)
+
+    def test_post_delete_skips_comment_counter(self):
+        """Удаление поста не меняет его счётчик на каждый комментарий."""
+        self.post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.bulk_create(
+            Comment(post=self.post, author=self.reader, text=str(i))
+            for i in range(5)
+        )
+        with CaptureQueriesContext(connection) as queries:
+            self.post.delete()
+        self.assertFalse(any(
+            'comments_count' in query['sql'] for query in queries
+        ))
+        self.assertEqual(Comment.objects.count(), 0)
+        self.assertFalse(signals._deleting_posts())
+        # Счётчик постов, переживших удаление, по-прежнему уменьшается.
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Текст')
+        post.comments.get().delete()
+        self.assertEqual(Post.objects.get(pk=post.pk).comments_count, 0)
+
+
+class GenerateDataTests(TestCase):
+    def test_generate_data_and_benchmark(self):
+        """Сгенерированные данные согласованы и пригодны для бенчмарка."""
+        call_command(
+            'generate_data', users=20, groups=3, posts=60, comments=40,
+            follows=30, seed=1, stdout=StringIO(),
+        )
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 40)
+        self.assertFalse(Follow.objects.filter(
+            user=models.F('author')
+        ).exists())
+        self.assertEqual(call_command_output('reconcile_counters'),
+                         'Исправлено счётчиков: 0')
+        out = call_command_output('benchmark_views', requests=2, seed=1)
+        for view in ('index', 'group_list', 'profile', 'post_detail',
+                     'search', 'follow_index', 'post_create', 'add_comment'):
+            with self.subTest(view=view):
+                self.assertIn(view, out)
+        self.assertEqual(Post.objects.count(), 60)
+
+
+class TextHtmlTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+
+    def test_text_html_is_rendered_on_save(self):
+        post = Post.objects.create(
+            author=self.user, text='<b>Первая</b>\nвторая',
+        )
+        self.assertEqual(
+            post.text_html, '&lt;b&gt;Первая&lt;/b&gt;<br>вторая'
+        )
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='a & b',
+        )
+        self.assertEqual(comment.text_html, 'a &amp; b')
+        post.text = 'Новый\nтекст'
+        post.save(update_fields=['text'])
+        post.refresh_from_db()
+        self.assertEqual(post.text_html, 'Новый<br>текст')
+
+    def test_render_text_html_backfills_rows(self):
+        post = Post.objects.create(author=self.user, text='Пост\nтекст')
+        Comment.objects.create(post=post, author=self.user, text='Коммент')
+        Post.objects.update(text_html='')
+        Comment.objects.update(text_html='')
+        out = call_command_output('render_text_html', batch_size=1)
+        self.assertTrue(out.endswith('Обновлено строк: 2'))
+        post.refresh_from_db()
+        self.assertEqual(post.text_html, 'Пост<br>текст')
+        self.assertEqual(
+            Comment.objects.get().text_html, 'Коммент'
+        )
+        out = call_command_output('render_text_html')
+        self.assertTrue(out.endswith('Обновлено строк: 0'))
+
+
+def call_command_output(*args, **kwargs):
+    out = StringIO()
+    call_command(*args, stdout=out, **kwargs)
+    return out.getvalue().strip()
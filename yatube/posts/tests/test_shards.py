@@ -0,0 +1,146 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..counters import reconcile_counters
+from ..models import Comment, Follow, Group, Post, User
+from ..shards import ID_RANGE, reserve_ids
+
+
+@override_settings(POST_SHARDS=['default', 'shard_1'])
+class ShardTests(TestCase):
+    """Посты авторов с нечётным id лежат в shard_1, с чётным — в default."""
+
+    databases = {'default', 'shard_1'}
+
+    def setUp(self):
+        cache.clear()
+        reserve_ids(connections['shard_1'])
+        users = [User.objects.create_user(username=f'user{i}')
+                 for i in range(2)]
+        users.sort(key=lambda user: user.pk % 2)
+        self.even, self.odd = users
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание'
+        )
+        self.posts = [
+            Post.objects.create(
+                author=author, text=f'Пост {i}', group=self.group
+            )
+            for i, author in enumerate((self.even, self.odd, self.even))
+        ]
+
+    def test_posts_are_stored_in_author_shard(self):
+        post = self.posts[1]
+        self.assertEqual(post._state.db, 'shard_1')
+        self.assertGreaterEqual(post.pk, ID_RANGE)
+        self.assertFalse(Post.objects.using('default').filter(
+            author=self.odd
+        ).exists())
+        self.assertEqual(self.posts[0]._state.db, 'default')
+
+    def test_comments_follow_their_post(self):
+        self.client.force_login(self.even)
+        self.client.post(
+            reverse('posts:add_comment', args=[self.posts[1].pk]),
+            {'text': 'Комментарий'},
+        )
+        comment = Comment.objects.using('shard_1').get()
+        self.assertEqual(comment.author, self.even)
+        self.posts[1].refresh_from_db()
+        self.assertEqual(self.posts[1].comments_count, 1)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.posts[1].pk])
+        )
+        self.assertContains(response, 'Комментарий')
+
+    def test_profile_reads_one_shard(self):
+        with CaptureQueriesContext(connections['default']) as default, \
+                CaptureQueriesContext(connections['shard_1']) as shard:
+            response = self.client.get(
+                reverse('posts:profile', args=[self.odd.username])
+            )
+        self.assertContains(response, 'Пост 1')
+        self.assertNotContains(response, 'Пост 0')
+        self.assertTrue(shard.captured_queries)
+        self.assertFalse(any(
+            'posts_post' in query['sql']
+            for query in default.captured_queries
+        ))
+
+    def test_feeds_merge_shards_by_date(self):
+        for author in (self.even, self.odd):
+            Follow.objects.create(user=self.reader, author=author)
+        self.client.force_login(self.reader)
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+            reverse('posts:follow_index'),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(
+                    list(response.context['page_obj']), self.posts[::-1]
+                )
+
+    def test_search_covers_all_shards(self):
+        response = self.client.get(reverse('posts:search'), {'q': 'пост'})
+        self.assertEqual(
+            sorted(post.pk for post in response.context['posts']),
+            sorted(post.pk for post in self.posts),
+        )
+
+    def test_counters_are_reconciled_across_shards(self):
+        self.assertEqual(reconcile_counters(), 0)
+
+    def test_deleted_user_content_is_removed_from_all_shards(self):
+        Comment.objects.create(
+            post=self.posts[1], author=self.even, text='Комментарий'
+        )
+        self.even.delete()
+        self.assertFalse(Comment.objects.using('shard_1').exists())
+        self.odd.delete()
+        self.assertFalse(Post.objects.using('shard_1').exists())
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(list(response.context['page_obj']), [])
+        self.assertEqual(reconcile_counters(), 0)
+
+    def test_rebalance_moves_posts_to_author_shard(self):
+        post = Post.objects.using('default').create(
+            author=self.odd, text='Старый пост'
+        )
+        Comment.objects.using('default').create(
+            post=post, author=self.even, text='Старый комментарий'
+        )
+        call_command('rebalance_shards', stdout=StringIO())
+        moved = Post.objects.using('shard_1').get(pk=post.pk)
+        self.assertEqual(moved.pub_date, post.pub_date)
+        self.assertFalse(Post.objects.using('default').filter(
+            pk=post.pk
+        ).exists())
+        self.assertEqual(moved.comments.get().text, 'Старый комментарий')
+        response = self.client.get(
+            reverse('posts:post_detail', args=[post.pk])
+        )
+        self.assertContains(response, 'Старый пост')
+
+    def test_maintenance_commands_cover_all_shards(self):
+        Post._base_manager.using('shard_1').update(text_html='')
+        call_command('render_text_html', stdout=StringIO())
+        self.assertEqual(
+            Post.objects.using('shard_1').get().text_html, 'Пост 1'
+        )
+        call_command('rebuild_search_index', stdout=StringIO())
+        response = self.client.get(reverse('posts:search'), {'q': 'пост'})
+        self.assertIn(self.posts[1], response.context['posts'])
@@ -1,22 +1,39 @@
 from django import forms
+from django.apps import apps
 from django.conf import settings
-from django.test import Client, TestCase
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.core.cache import cache
+from django.template.loader import render_to_string
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
 
+from core.testing import on_commit_callbacks
+
+from .. import feeds, search
+from ..cards import render_cards
 from ..forms import PostForm
-from ..models import Group, Post, User, Follow
+from ..generations import ALL_POSTS, get_generations
+from ..models import Comment, Group, Post, Profile, User, Follow
+from ..utils import CursorPaginator
 
+import importlib
 import shutil
 import tempfile
+from io import StringIO
+from itertools import product
+from unittest import mock
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostViewsTests(TestCase):
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
-        settings.MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
         small_gif = (
             b'\x47\x49\x46\x38\x39\x61\x02\x00'
             b'\x01\x00\x80\x00\x00\x00\x00\x00'
@@ -77,7 +94,7 @@ class PostViewsTests(TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
         super().tearDownClass()
 
     def setUp(self):
@@ -146,6 +163,23 @@ class PostViewsTests(TestCase):
         post_image = Post.objects.first().image
         self.assertEqual(post_image, 'posts/small.gif')
 
+    def test_counters_replace_aggregate_queries(self):
+        """Профиль и пост выводят счётчики без агрегирующих запросов."""
+        urls = {
+            reverse('posts:profile', kwargs={'username': self.author}):
+                'Всего постов: 1',
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}):
+                'Всего постов автора: <span >1</span>',
+        }
+        for url, expected in urls.items():
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertContains(response, expected)
+                self.assertFalse(any(
+                    'COUNT(' in query['sql'] for query in queries
+                ))
+
     def test_post_create_page_show_correct_context(self):
         """Шаблон post_create сформирован с правильным контекстом."""
         response = self.authorized_client.get(reverse('posts:post_create'))
@@ -192,13 +226,61 @@ class PostViewsTests(TestCase):
         """Кэширования главной страницы."""
         first = self.authorized_client.get(reverse('posts:index'))
         post = Post.objects.get()
-        post.text = 'Измененный текст'
-        post.save()
+        # update() не отправляет сигналов: страница берётся из кэша.
+        Post.objects.filter(pk=post.pk).update(text='Текст мимо кэша')
         second = self.authorized_client.get(reverse('posts:index'))
         self.assertEqual(first.content, second.content)
-        cache.clear()
+        post.text = 'Измененный текст'
+        with on_commit_callbacks():
+            post.save()
         third = self.authorized_client.get(reverse('posts:index'))
         self.assertNotEqual(first.content, third.content)
+        self.assertContains(third, 'Измененный текст')
+
+    def test_feed_caches_expire_by_scope(self):
+        """Изменение поста сбрасывает кэш только его лент."""
+        other_group = Group.objects.create(
+            title='Другая группа', slug='other-group', description='',
+        )
+        other_post = Post.objects.create(
+            author=User.objects.create(username='other_author'),
+            group=other_group,
+            text='Пост другой группы',
+        )
+        pages = {
+            'index': reverse('posts:index'),
+            'group': reverse('posts:group_list', args=[self.group.slug]),
+            'other_group': reverse(
+                'posts:group_list', args=[other_group.slug]
+            ),
+            'profile': reverse('posts:profile', args=[self.author.username]),
+        }
+        before = {
+            name: self.authorized_client.get(url).context['cache_key']
+            for name, url in pages.items()
+        }
+        post = Post.objects.exclude(pk=other_post.pk).get()
+        post.text = 'Измененный текст'
+        with on_commit_callbacks():
+            post.save()
+        after = {
+            name: self.authorized_client.get(url).context['cache_key']
+            for name, url in pages.items()
+        }
+        self.assertEqual(before['other_group'], after['other_group'])
+        for name in ('index', 'group', 'profile'):
+            self.assertNotEqual(before[name], after[name])
+
+        # Комментарий виден только на странице поста, и ленты остаются
+        # в кэше.
+        with on_commit_callbacks():
+            Comment.objects.create(post=post, author=self.author, text='Комм')
+        for name, url in pages.items():
+            with self.subTest(page=name):
+                self.assertEqual(
+                    after[name],
+                    self.authorized_client.get(url).context['cache_key'],
+                )
 
 
 class PaginatorViewsTest(TestCase):
@@ -221,9 +303,82 @@ class PaginatorViewsTest(TestCase):
                 author=cls.author,
                 group=cls.group
             )
+        cls.follower = User.objects.create(username='follower')
+        Follow.objects.create(user=cls.follower, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
 
     def test_paginator_on_pages(self):
         """Проверка пагинации на страницах."""
+        url_pages = [
+            (reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+             self.client),
+            (reverse('posts:profile',
+                     kwargs={'username': self.author.username}),
+             self.client),
+            (reverse('posts:follow_index'), self.follower_client),
+        ]
+        for reverse_page, client in url_pages:
+            with self.subTest(reverse_page=reverse_page):
+                first_page = client.get(reverse_page).context['page_obj']
+                self.assertEqual(len(first_page), self.posts_on_first_page)
+                self.assertEqual(len(client.get(
+                    reverse_page, {'after': first_page.next_cursor}
+                ).context['page_obj']), self.posts_on_second_page)
+
+    def test_page_window(self):
+        """Навигация показывает окно страниц вокруг текущей."""
+        paginator = CursorPaginator(Post.objects.all(), 1)
+        self.assertEqual(
+            paginator.get_page_window(7),
+            [1, None, 5, 6, 7, 8, 9, None, 13],
+        )
+        self.assertEqual(paginator.get_page_window(1), [1, 2, 3, None, 13])
+
+    def test_feeds_are_keyset_only(self):
+        """Ленты не считают посты и не листаются по номеру страницы."""
+        url_pages = [
+            (reverse('posts:index'), self.client),
+            (reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+             self.client),
+            (reverse('posts:profile',
+                     kwargs={'username': self.author.username}),
+             self.client),
+            (reverse('posts:follow_index'), self.follower_client),
+        ]
+        for (reverse_page, client), params in product(
+            url_pages, ({}, {'page': 2})
+        ):
+            with self.subTest(reverse_page=reverse_page, params=params):
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(reverse_page, params)
+                page_obj = response.context['page_obj']
+                self.assertEqual(len(page_obj), self.posts_on_first_page)
+                self.assertEqual(page_obj.number, 1)
+                self.assertTrue(page_obj.has_next())
+                self.assertFalse(any(
+                    'COUNT(' in query['sql'] or 'OFFSET' in query['sql']
+                    for query in queries
+                ))
+                self.assertNotContains(response, '?page=')
+                self.assertContains(
+                    response, f'?after={page_obj.next_cursor}'
+                )
+
+    def test_feeds_use_indexes(self):
+        """Ни одна лента не сортирует записи без индекса."""
+        out = StringIO()
+        call_command('explain_feeds', stdout=out)
+        after = out.getvalue().split('После')[1]
+        self.assertIn('Сортировок без индекса: 0', after)
+        self.assertNotIn('USE TEMP B-TREE', after)
+
+    def test_cursor_pagination_on_pages(self):
+        """Переход по курсору отдаёт следующую страницу без COUNT(*)."""
         url_pages = [
             reverse('posts:index'),
             reverse('posts:group_list', kwargs={'slug': self.group.slug}),
@@ -232,14 +387,33 @@ class PaginatorViewsTest(TestCase):
         ]
         for reverse_page in url_pages:
             with self.subTest(reverse_page=reverse_page):
-                self.assertEqual(len(self.client.get(
-                    reverse_page).context.get('page_obj')),
-                    self.posts_on_first_page
+                cache.clear()
+                first_page = self.client.get(reverse_page).context['page_obj']
+                with CaptureQueriesContext(connection) as queries:
+                    second_page = self.client.get(
+                        reverse_page,
+                        {'after': first_page.next_cursor},
+                    ).context['page_obj']
+                self.assertEqual(len(second_page), self.posts_on_second_page)
+                self.assertEqual(second_page.number, 2)
+                self.assertFalse(second_page.has_next())
+                self.assertTrue(second_page.has_previous())
+                self.assertFalse(
+                    set(first_page.object_list)
+                    & set(second_page.object_list)
                 )
-                self.assertEqual(len(self.client.get(
-                    reverse_page + '?page=2').context.get('page_obj')),
-                    self.posts_on_second_page
+                self.assertFalse(any(
+                    'COUNT(' in query['sql'] for query in queries
+                ))
+                previous_page = self.client.get(
+                    reverse_page,
+                    {'before': second_page.previous_cursor},
+                ).context['page_obj']
+                self.assertEqual(
+                    list(previous_page.object_list),
+                    list(first_page.object_list),
                 )
+                self.assertFalse(previous_page.has_previous())
 
 
 class FollowTests(TestCase):
@@ -264,6 +438,28 @@ class FollowTests(TestCase):
         )
         self.assertEqual(Follow.objects.all().count(), 1)
 
+    def test_follow_is_idempotent(self):
+        """Повторная подписка и подписка на себя не создают записей."""
+        url = reverse(
+            'posts:profile_follow',
+            kwargs={'username': self.user_following.username}
+        )
+        self.client_auth_follower.get(url)
+        self.client_auth_follower.get(url)
+        self.client_auth_following.get(url)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(
+            Profile.objects.get(user=self.user_following).followers_count, 1
+        )
+        for user, author in (
+            (self.user_follower, self.user_following),
+            (self.user_following, self.user_following),
+        ):
+            with self.subTest(user=user, author=author):
+                with self.assertRaises(IntegrityError):
+                    with transaction.atomic():
+                        Follow.objects.create(user=user, author=author)
+
     def test_unfollow(self):
         self.client_auth_follower.get(
             reverse(
@@ -295,6 +491,126 @@ class FollowTests(TestCase):
             'Тестовая запись для тестирования ленты',
         )
 
+    def test_timeline_fan_out(self):
+        """Новый пост раздаётся в ленты, отписка убирает посты автора."""
+        Follow.objects.create(
+            user=self.user_follower,
+            author=self.user_following
+        )
+        new_post = Post.objects.create(
+            author=self.user_following,
+            text='Новая запись'
+        )
+        self.assertEqual(
+            set(self.user_follower.timeline.values_list('post', flat=True)),
+            {self.post.pk, new_post.pk},
+        )
+        Follow.objects.filter(user=self.user_follower).delete()
+        self.assertFalse(self.user_follower.timeline.exists())
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_heavy_author_posts_pulled_on_read(self):
+        """Посты популярного автора подмешиваются в ленту при чтении."""
+        other_author = User.objects.create(username='other')
+        Follow.objects.create(user=self.user_follower, author=other_author)
+        Follow.objects.create(
+            user=self.user_follower,
+            author=self.user_following
+        )
+        other_post = Post.objects.create(author=other_author, text='Другая')
+        self.assertFalse(self.user_follower.timeline.exists())
+        response = self.client_auth_follower.get(
+            reverse('posts:follow_index')
+        )
+        self.assertEqual(
+            list(response.context['page_obj']),
+            [other_post, self.post],
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_author_below_fanout_limit_is_backfilled(self):
+        """Посты, опубликованные, пока автор был популярным, попадают
+        в ленты, когда подписчиков становится не больше лимита."""
+        Follow.objects.create(
+            user=self.user_follower, author=self.user_following
+        )
+        reader = User.objects.create(username='reader')
+        Follow.objects.create(user=reader, author=self.user_following)
+        heavy_post = Post.objects.create(
+            author=self.user_following, text='Пост популярного автора'
+        )
+        self.assertFalse(
+            self.user_follower.timeline.filter(post=heavy_post).exists()
+        )
+        with mock.patch('posts.feeds.backfill_author.delay',
+                        side_effect=feeds.backfill_author) as delay:
+            Follow.objects.filter(user=reader).delete()
+        delay.assert_called_once_with(self.user_following.pk)
+        self.assertTrue(
+            self.user_follower.timeline.filter(post=heavy_post).exists()
+        )
+
+    @override_settings(TIMELINE_LENGTH=1)
+    def test_trim_timelines_command(self):
+        """Команда trim_timelines обрезает ленты до TIMELINE_LENGTH."""
+        Follow.objects.create(
+            user=self.user_follower, author=self.user_following
+        )
+        new_post = Post.objects.create(
+            author=self.user_following, text='Новая запись'
+        )
+        self.assertEqual(self.user_follower.timeline.count(), 2)
+        call_command('trim_timelines', stdout=StringIO())
+        self.assertEqual(
+            list(self.user_follower.timeline.values_list('post', flat=True)),
+            [new_post.pk],
+        )
+
+    def test_rebuild_timelines_command(self):
+        """Команда rebuild_timelines восстанавливает ленту."""
+        Follow.objects.create(
+            user=self.user_follower,
+            author=self.user_following
+        )
+        self.user_follower.timeline.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(
+            list(self.user_follower.timeline.values_list('post', flat=True)),
+            [self.post.pk],
+        )
+
+    def test_rebuild_timeline_keeps_old_timeline_on_error(self):
+        """Ошибка при пересборке не оставляет ленту пустой."""
+        Follow.objects.create(
+            user=self.user_follower,
+            author=self.user_following
+        )
+        with mock.patch.object(
+            feeds.TimelineEntry.objects, 'bulk_create',
+            side_effect=IntegrityError,
+        ), self.assertRaises(IntegrityError):
+            feeds.rebuild_timeline(self.user_follower)
+        self.assertEqual(
+            list(self.user_follower.timeline.values_list('post', flat=True)),
+            [self.post.pk],
+        )
+
+    def test_timeline_migration_fills_timelines(self):
+        """Миграция 0016 собирает ленты по существующим подпискам."""
+        Follow.objects.create(
+            user=self.user_follower,
+            author=self.user_following
+        )
+        self.user_follower.timeline.all().delete()
+        migration = importlib.import_module(
+            'posts.migrations.0016_timelineentry'
+        )
+        migration.fill_timelines(apps, None)
+        self.assertEqual(
+            list(self.user_follower.timeline.values_list('post', flat=True)),
+            [self.post.pk],
+        )
+
     def test_add_comment(self):
         """Проверка добавления комментария."""
         self.client_auth_following.post(
@@ -315,3 +631,392 @@ class FollowTests(TestCase):
             self.client_auth_following.get(f'/posts/{self.post.pk}/'),
             'комментарий от гостя',
         )
+
+
+class QueryCountTests(TestCase):
+    """Число запросов на странице не зависит от числа записей на ней."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Группа',
+            slug='queries',
+            description='Описание',
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.post = self.create_posts(1)
+        self.client.force_login(self.reader)
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:follow_index'),
+        )
+
+    def create_posts(self, number):
+        for i in range(number):
+            post = Post.objects.create(
+                author=self.author,
+                text=f'Пост {i}',
+                group=self.group,
+            )
+        return post
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        return len(queries)
+
+    def test_queries_do_not_grow_with_page_size(self):
+        few = {url: self.count_queries(url) for url in self.urls}
+        self.create_posts(settings.NUMBER_POSTS)
+        for i in range(settings.NUMBER_POSTS):
+            Comment.objects.create(
+                post=self.post,
+                author=User.objects.create_user(username=f'commenter{i}'),
+                text=f'Комментарий {i}',
+            )
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), few[url])
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='',
+        )
+        self.other_group = Group.objects.create(
+            title='Другая группа', slug='other', description='',
+        )
+        self.post = Post.objects.create(
+            author=self.author, text='Пост', group=self.group,
+        )
+        self.other_post = Post.objects.create(
+            author=User.objects.create_user(username='other'),
+            text='Другой пост', group=self.other_group,
+        )
+        self.urls = {
+            'index': reverse('posts:index'),
+            'group': reverse('posts:group_list', args=[self.group.slug]),
+            'profile': reverse('posts:profile', args=[self.author]),
+            'post': reverse('posts:post_detail', args=[self.post.pk]),
+            'other_group': reverse(
+                'posts:group_list', args=[self.other_group.slug]
+            ),
+            'other_post': reverse(
+                'posts:post_detail', args=[self.other_post.pk]
+            ),
+        }
+        for url in self.urls.values():
+            self.client.get(url)
+
+    def assertCached(self, url):
+        with self.assertNumQueries(0):
+            return self.client.get(url)
+
+    def test_anonymous_pages_are_cached(self):
+        for url in self.urls.values():
+            with self.subTest(url=url):
+                response = self.assertCached(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.has_header('Surrogate-Key'))
+
+    def test_authorized_pages_are_not_cached(self):
+        self.client.force_login(self.author)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.urls['index'])
+        self.assertGreater(len(queries), 0)
+
+    def test_post_change_purges_only_its_pages(self):
+        self.post.text = 'Измененный текст'
+        with on_commit_callbacks():
+            self.post.save()
+        for name in ('index', 'group', 'profile', 'post'):
+            with self.subTest(page=name):
+                self.assertContains(
+                    self.client.get(self.urls[name]), 'Измененный текст'
+                )
+        for name in ('other_group', 'other_post'):
+            with self.subTest(page=name):
+                self.assertCached(self.urls[name])
+
+    def test_comment_purges_post_page(self):
+        with on_commit_callbacks():
+            Comment.objects.create(
+                post=self.post, author=self.author, text='Новый комментарий',
+            )
+        self.assertContains(
+            self.client.get(self.urls['post']), 'Новый комментарий'
+        )
+        self.assertCached(self.urls['other_post'])
+        self.assertCached(self.urls['other_group'])
+
+    def test_unknown_params_share_cached_page(self):
+        self.assertCached(self.urls['index'] + '?utm_source=mail')
+
+    def test_page_is_purged_after_commit(self):
+        self.post.text = 'Измененный текст'
+        with on_commit_callbacks():
+            self.post.save()
+            self.assertNotContains(
+                self.assertCached(self.urls['post']), 'Измененный текст'
+            )
+        self.assertContains(
+            self.client.get(self.urls['post']), 'Измененный текст'
+        )
+
+
+class PostCardsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.group = Group.objects.create(
+            title='Группа', slug='cards', description='',
+        )
+        for i in range(3):
+            Post.objects.create(
+                author=self.author, text=f'Пост {i}', group=self.group,
+            )
+
+    def render(self, group=None):
+        with mock.patch(
+            'posts.cards.render_to_string', wraps=render_to_string
+        ) as rendered:
+            cards = render_cards(list(Post.objects.all()), group)
+        return cards, rendered.call_count
+
+    def test_cards_are_rendered_once(self):
+        cards, rendered = self.render()
+        self.assertEqual(rendered, 3)
+        self.assertEqual(self.render(), (cards, 0))
+        # В группе карточка выводится без ссылки на группу.
+        group_cards, rendered = self.render(self.group)
+        self.assertEqual(rendered, 3)
+        self.assertNotIn('все записи группы', group_cards[0])
+
+    def test_saved_post_card_is_rendered_again(self):
+        self.render()
+        post = Post.objects.first()
+        post.text = 'Измененный текст'
+        post.save()
+        cards, rendered = self.render()
+        self.assertEqual(rendered, 1)
+        self.assertIn('Измененный текст', cards[0])
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='',
+        )
+        self.other_group = Group.objects.create(
+            title='Другая группа', slug='other', description='',
+        )
+        self.post = Post.objects.create(
+            author=self.author, text='Пост', group=self.group,
+        )
+        self.urls = {
+            'index': reverse('posts:index'),
+            'group': reverse('posts:group_list', args=[self.group.slug]),
+            'other_group': reverse(
+                'posts:group_list', args=[self.other_group.slug]
+            ),
+            'profile': reverse('posts:profile', args=[self.author]),
+            'post': reverse('posts:post_detail', args=[self.post.pk]),
+        }
+
+    def etags(self):
+        return {
+            name: self.client.get(url)['ETag']
+            for name, url in self.urls.items()
+        }
+
+    def test_not_modified_without_queries(self):
+        for url in self.urls.values():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertTrue(response.has_header('Last-Modified'))
+                with self.assertNumQueries(0):
+                    response = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag']
+                    )
+                self.assertEqual(response.status_code, 304)
+
+    def test_changes_update_etags(self):
+        before = self.etags()
+        self.post.text = 'Измененный текст'
+        with on_commit_callbacks():
+            self.post.save()
+        after = self.etags()
+        self.assertEqual(before['other_group'], after['other_group'])
+        for name in ('index', 'group', 'profile', 'post'):
+            with self.subTest(page=name):
+                self.assertNotEqual(before[name], after[name])
+
+        with on_commit_callbacks():
+            Comment.objects.create(
+                post=self.post, author=self.author, text='К'
+            )
+        with_comment = self.etags()
+        self.assertNotEqual(after['post'], with_comment['post'])
+        for name in ('index', 'group', 'profile'):
+            with self.subTest(page=name):
+                self.assertEqual(after[name], with_comment[name])
+
+    def test_post_etag_ignores_other_authors(self):
+        """ETag страницы поста меняется с постами его автора, но не
+        с чужими постами."""
+        etag = self.client.get(self.urls['post'])['ETag']
+        with on_commit_callbacks():
+            Post.objects.create(
+                author=User.objects.create_user(username='other'),
+                text='Чужой пост',
+            )
+        self.assertEqual(self.client.get(self.urls['post'])['ETag'], etag)
+        with on_commit_callbacks():
+            Post.objects.create(author=self.author, text='Новый пост')
+        self.assertNotEqual(
+            self.client.get(self.urls['post'])['ETag'], etag
+        )
+
+    def test_generations_change_after_commit(self):
+        """Поколения меняются только после фиксации транзакции."""
+        before = get_generations(ALL_POSTS)
+        with on_commit_callbacks():
+            self.post.save()
+            self.assertEqual(get_generations(ALL_POSTS), before)
+        self.assertNotEqual(get_generations(ALL_POSTS), before)
+
+    def test_follow_feed_not_modified(self):
+        self.client.force_login(self.author)
+        url = reverse('posts:follow_index')
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        with on_commit_callbacks():
+            Follow.objects.create(
+                user=self.author,
+                author=User.objects.create_user(username='other'),
+            )
+        self.assertNotEqual(self.client.get(url)['ETag'], etag)
+
+    def test_follow_feed_etag_follows_authors(self):
+        """ETag ленты подписок меняется с постами авторов из подписок,
+        но не с постами остальных."""
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=self.author)
+        self.client.force_login(reader)
+        url = reverse('posts:follow_index')
+        etag = self.client.get(url)['ETag']
+        with on_commit_callbacks():
+            Post.objects.create(
+                author=User.objects.create_user(username='other'),
+                text='Чужой пост',
+            )
+        self.assertEqual(self.client.get(url)['ETag'], etag)
+        with on_commit_callbacks():
+            Post.objects.create(author=self.author, text='Новый пост')
+        response = self.client.get(url)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'Новый пост')
+
+    def test_etag_depends_on_user(self):
+        anonymous = self.client.get(self.urls['profile'])['ETag']
+        self.client.force_login(self.author)
+        self.assertNotEqual(
+            anonymous, self.client.get(self.urls['profile'])['ETag']
+        )
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.often = Post.objects.create(
+            author=self.author, text='Кошка, кошка и ещё раз кошка',
+        )
+        self.once = Post.objects.create(
+            author=self.author,
+            text='Длинный пост про собак, в котором одна кошка',
+        )
+        self.other = Post.objects.create(
+            author=self.author, text='Пост про собак',
+        )
+
+    def search(self, query, after=None):
+        data = {'q': query}
+        if after:
+            data['after'] = after
+        response = self.client.get(reverse('posts:search'), data)
+        return response.context['posts'], response.context['next_cursor']
+
+    def test_results_are_ranked(self):
+        posts, next_cursor = self.search('КОШКА')
+        self.assertEqual(posts, [self.often, self.once])
+        self.assertEqual(next_cursor, '')
+
+    def test_query_operators_are_ignored(self):
+        self.assertEqual(self.search('"собак" (')[0],
+                         [self.other, self.once])
+        # Операторы FTS5 ищутся как обычные слова.
+        self.assertEqual(self.search('собак OR кошка')[0], [])
+        self.assertEqual(self.search('*:')[0], [])
+
+    def test_last_word_is_prefix(self):
+        self.assertEqual(self.search('про соб')[0], [self.other, self.once])
+
+    def test_keyset_pages(self):
+        for i in range(settings.NUMBER_POSTS + 3):
+            Post.objects.create(author=self.author, text=f'Пост номер {i}')
+        first, next_cursor = self.search('пост')
+        self.assertEqual(len(first), settings.NUMBER_POSTS)
+        second, last_cursor = self.search('пост', next_cursor)
+        self.assertEqual(len(second), 5)
+        self.assertEqual(last_cursor, '')
+        self.assertFalse({post.pk for post in first}
+                         & {post.pk for post in second})
+
+    def test_index_follows_changes(self):
+        self.often.text = 'Теперь про собак'
+        self.often.save()
+        Post.objects.filter(pk=self.other.pk).update(text='Про котов')
+        self.once.delete()
+        self.assertEqual(self.search('кошка')[0], [])
+        self.assertEqual(self.search('собак')[0], [self.often])
+        self.assertEqual(self.search('котов')[0], [self.other])
+
+    def test_rebuild_command(self):
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('кошка')[0], [self.often, self.once])
+
+    def test_migrations_manage_own_indexes(self):
+        """Откат миграции индекса комментариев не трогает индекс постов."""
+        post_index = importlib.import_module(
+            'posts.migrations.0022_post_search_index'
+        )
+        comment_index = importlib.import_module(
+            'posts.migrations.0023_comment_search_index'
+        )
+        editor = mock.Mock(connection=connection)
+        comment_index.uninstall_search_index(apps, editor)
+        self.assertFalse(search._index_exists(
+            connection, search.COMMENT_FTS_TABLE
+        ))
+        self.assertTrue(search._index_exists(connection, search.FTS_TABLE))
+        post_index.uninstall_search_index(apps, editor)
+        post_index.install_search_index(apps, editor)
+        self.assertFalse(search._index_exists(
+            connection, search.COMMENT_FTS_TABLE
+        ))
+        self.assertTrue(search._index_exists(connection, search.FTS_TABLE))
+        comment_index.install_search_index(apps, editor)
+        self.assertEqual(self.search('кошка')[0], [self.often, self.once])
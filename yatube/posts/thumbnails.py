@@ -0,0 +1,32 @@
+"""Миниатюры картинок постов.
+
+Шаблоны строят миниатюру тегом {% thumbnail %} при первом показе, и
+этот запрос платит за декодирование и масштабирование картинки. Здесь
+миниатюра строится заранее: после сохранения поста фоновой задачей
+и командой warm_thumbnails для уже загруженных картинок.
+"""
+from sorl.thumbnail import get_thumbnail
+
+from core.queue import task
+
+# Должно совпадать с тегом {% thumbnail %} в шаблонах постов.
+GEOMETRY = '960x339'
+OPTIONS = {'crop': 'center', 'upscale': True}
+
+
+def make_thumbnail(image):
+    """Строит миниатюру картинки (имени файла или поля) и кладёт её
+    в хранилище миниатюр sorl."""
+    return get_thumbnail(image, GEOMETRY, **OPTIONS)
+
+
+@task
+def build_thumbnail(name):
+    """Фоновая задача: миниатюра загруженной картинки."""
+    make_thumbnail(name)
+
+
+def make_thumbnail_later(image):
+    """Ставит построение миниатюры картинки в фоновую очередь."""
+    if image:
+        build_thumbnail.delay(image.name)
@@ -52,5 +52,10 @@ urlpatterns = [
         views.profile_unfollow,
         name='profile_unfollow'
     ),
+    path(
+        'search/',
+        views.search,
+        name='search'
+    ),
     path('', views.index, name='index'),
 ]
@@ -1,9 +1,165 @@
-from django.core.paginator import Paginator
+import base64
+
 from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по паре (pub_date, id) или другому ключу key.
+
+    Страницы по номеру (?page=N) работают как в обычном Paginator,
+    а переходы вперёд и назад (?after=... и ?before=...) выполняются
+    одним запросом с условием по ключу сортировки, без COUNT(*) и OFFSET.
+    Ленты с numbered=False листаются только курсорами: первая страница
+    тоже читается без COUNT(*) (get_first_page).
+    """
+
+    key = ('pub_date', 'id')
+    is_keyset = False
+    # Сколько номеров страниц показывать по обе стороны от текущей.
+    window = 2
+
+    def __init__(self, object_list, per_page, count=None, key=None,
+                 numbered=True, **kwargs):
+        if key is not None:
+            # Ключ сортировки может быть аннотацией с теми же значениями,
+            # например датой из ленты подписок, чтобы запрос шёл по её
+            # индексу.
+            self.key = key
+        date_field, id_field = self.key
+        super().__init__(
+            object_list.order_by(f'-{date_field}', f'-{id_field}'),
+            per_page,
+            **kwargs
+        )
+        self.numbered = numbered
+        if count is not None:
+            # Известное заранее число записей (например, счётчик из
+            # профиля автора) избавляет от запроса COUNT(*).
+            self.__dict__['count'] = count
+
+    def _get_page(self, *args, **kwargs):
+        """Дополняет страницу курсорами соседних страниц."""
+        page = super()._get_page(*args, **kwargs)
+        page.object_list = list(page.object_list)
+        page.next_cursor = page.previous_cursor = ''
+        if page.object_list:
+            page.next_cursor = self.encode_cursor(
+                page.object_list[-1], page.number + 1
+            )
+            page.previous_cursor = self.encode_cursor(
+                page.object_list[0], max(page.number - 1, 1)
+            )
+        if not self.is_keyset:
+            page.page_window = self.get_page_window(page.number)
+        return page
+
+    def get_page_window(self, number):
+        """Номера страниц для навигации: первая, последняя и несколько
+        вокруг текущей. Пропуски обозначены None.
+
+        Размер списка не зависит от числа страниц в ленте.
+        """
+        last = self.num_pages
+        pages = sorted(
+            {1, last}
+            | set(range(max(number - self.window, 1),
+                        min(number + self.window, last) + 1))
+        )
+        window = []
+        for page in pages:
+            if window and page - window[-1] > 1:
+                window.append(None)
+            window.append(page)
+        return window
+
+    @staticmethod
+    def encode_cursor(post, number):
+        value = f'{post.pub_date.isoformat()}|{post.pk}|{number}'
+        return base64.urlsafe_b64encode(value.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Возвращает (pub_date, id, номер страницы) или None."""
+        try:
+            value = base64.urlsafe_b64decode(cursor.encode()).decode()
+            pub_date, pk, number = value.split('|')
+            pub_date = parse_datetime(pub_date)
+            pk, number = int(pk), max(int(number), 1)
+        except (TypeError, ValueError, UnicodeError):
+            return None
+        if pub_date is None:
+            return None
+        return pub_date, pk, number
+
+    def get_cursor_page(self, cursor, before=False):
+        """Страница после (или перед) записью, закодированной в курсоре.
+
+        Число страниц не считается: достаточно знать, есть ли соседняя
+        страница, а это видно по лишней записи в выборке.
+        """
+        position = self.decode_cursor(cursor)
+        if position is None:
+            if not self.numbered:
+                return self.get_first_page()
+            return self.get_page(1)
+        pub_date, pk, number = position
+        limit = self.per_page + 1
+        if before:
+            rows = list(self.rows_before(pub_date, pk)[:limit])
+            number = max(number, 2) if len(rows) > self.per_page else 1
+            rows = rows[:self.per_page][::-1]
+            num_pages = number + 1
+        else:
+            rows = list(self.rows_after(pub_date, pk)[:limit])
+            number = max(number, 2)
+            num_pages = number + 1 if len(rows) > self.per_page else number
+            rows = rows[:self.per_page]
+        self.is_keyset = True
+        self.__dict__['num_pages'] = num_pages
+        return self._get_page(rows, number, self)
+
+    def get_first_page(self):
+        """Первая страница без COUNT(*): как и у страниц по курсору,
+        о следующей странице говорит лишняя запись в выборке."""
+        rows = list(self.object_list[:self.per_page + 1])
+        self.is_keyset = True
+        self.__dict__['num_pages'] = 2 if len(rows) > self.per_page else 1
+        return self._get_page(rows[:self.per_page], 1, self)
+
+    def rows_after(self, pub_date, pk):
+        """Записи ленты после ключа (pub_date, pk), от новых к старым."""
+        date_field, id_field = self.key
+        # Условие <= отдельно от OR позволяет базе начать чтение индекса
+        # сразу с нужного места, а не просматривать его с начала.
+        return self.object_list.filter(
+            Q(**{f'{date_field}__lte': pub_date}),
+            Q(**{f'{date_field}__lt': pub_date})
+            | Q(**{f'{id_field}__lt': pk}),
+        )
+
+    def rows_before(self, pub_date, pk):
+        """Записи ленты перед ключом (pub_date, pk), от старых к новым."""
+        date_field, id_field = self.key
+        return self.object_list.filter(
+            Q(**{f'{date_field}__gte': pub_date}),
+            Q(**{f'{date_field}__gt': pub_date})
+            | Q(**{f'{id_field}__gt': pk}),
+        ).reverse()
 
 
-def paginator(request, posts):
-    paginator = Paginator(posts, settings.NUMBER_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return page_obj
+def paginator(request, posts, key=None):
+    """Страница ленты. Ленты листаются только курсорами: номер страницы
+    (?page=N) не учитывается, а записи не считаются COUNT(*)."""
+    paginator = CursorPaginator(
+        posts, settings.NUMBER_POSTS, key=key, numbered=False
+    )
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    if after:
+        return paginator.get_cursor_page(after)
+    if before:
+        return paginator.get_cursor_page(before, before=True)
+    return paginator.get_first_page()
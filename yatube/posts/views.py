@@ -1,47 +1,101 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.db import IntegrityError, transaction
 from django.shortcuts import render, get_object_or_404, redirect
 
+from yatube.db.replicas import read_from_replica
+
+from .counters import profile_of
+from .feeds import FOLLOW_FEED_KEY, across_shards, follow_feed, with_archive
 from .forms import CommentForm, PostForm
+from .generations import (
+    ALL_POSTS, author_scope, conditional_page, feed_cache_key, follow_scope,
+    group_scope, post_page_scopes,
+)
 from .models import Group, Post, User, Follow
+from .page_cache import (
+    INDEX_KEY, author_key, cache_anonymous_page, group_key, post_key,
+    tag_response,
+)
+from .search import search_posts
+from .shards import get_post_or_404
+from .thumbnails import make_thumbnail_later
 from .utils import paginator
 
 
+@read_from_replica
+@conditional_page(lambda request: [ALL_POSTS])
+@cache_anonymous_page
 def index(request):
-    posts = Post.objects.select_related('author', 'group')
-    page_obj = paginator(request, posts)
+    page_obj = paginator(request, across_shards(Post.objects.all()))
     context = {
         'page_obj': page_obj,
+        'cache_key': feed_cache_key(page_obj, ALL_POSTS),
     }
-    return render(request, 'posts/index.html', context)
+    return tag_response(
+        render(request, 'posts/index.html', context),
+        INDEX_KEY, *(post_key(post.pk) for post in page_obj),
+    )
 
 
+@read_from_replica
+@conditional_page(lambda request, slug: [group_scope(slug)])
+@cache_anonymous_page
 def group_list(request, slug):
     group = get_object_or_404(Group, slug=slug)
     posts = group.posts.all()
-    page_obj = paginator(request, posts)
+    page_obj = paginator(request, with_archive(posts, across_shards(posts)))
     context = {
         'group': group,
         'page_obj': page_obj,
+        'cache_key': feed_cache_key(page_obj, group_scope(group.slug)),
     }
-    return render(request, 'posts/group_list.html', context)
+    return tag_response(
+        render(request, 'posts/group_list.html', context),
+        group_key(group.slug), *(post_key(post.pk) for post in page_obj),
+    )
+
+
+def profile_scopes(request, username):
+    scopes = [author_scope(username)]
+    if request.user.is_authenticated:
+        scopes.append(follow_scope(request.user.pk))
+    return scopes
 
 
+@read_from_replica
+@conditional_page(profile_scopes)
+@cache_anonymous_page
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    page_obj = paginator(request, author.posts.all())
+    author = get_object_or_404(
+        User.objects.select_related('profile'), username=username
+    )
+    # Шаблон выводит счётчик постов из профиля автора.
+    profile_of(author)
+    page_obj = paginator(request, with_archive(author.posts.all()))
     following = request.user.is_authenticated
     if following:
         following = author.following.filter(user=request.user).exists()
     context = {
         'page_obj': page_obj,
         'author': author,
-        'following': following
+        'following': following,
+        'cache_key': feed_cache_key(page_obj, author_scope(author.username)),
     }
-    return render(request, 'posts/profile.html', context)
+    return tag_response(
+        render(request, 'posts/profile.html', context),
+        author_key(author.pk), *(post_key(post.pk) for post in page_obj),
+    )
 
 
+@read_from_replica
+@conditional_page(post_page_scopes)
+@cache_anonymous_page
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_post_or_404(
+        post_id, Post.objects.with_relations('author__profile')
+    )
+    profile_of(post.author)
     form = CommentForm(request.POST or None)
     comments = post.comments.all()
     context = {
@@ -49,12 +103,30 @@ def post_detail(request, post_id):
         'form': form,
         'comments': comments,
     }
-    return render(request, 'posts/post_detail.html', context)
+    surrogate_keys = [post_key(post.pk), author_key(post.author_id)]
+    if post.group:
+        surrogate_keys.append(group_key(post.group.slug))
+    return tag_response(
+        render(request, 'posts/post_detail.html', context), *surrogate_keys
+    )
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    posts, next_cursor = search_posts(
+        query, request.GET.get('after'), limit=settings.NUMBER_POSTS
+    )
+    context = {
+        'query': query,
+        'posts': posts,
+        'next_cursor': next_cursor,
+    }
+    return render(request, 'posts/search.html', context)
 
 
 @login_required
 def post_create(request):
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     context = {
         'form': form,
     }
@@ -62,13 +134,14 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        make_thumbnail_later(post.image)
         return redirect('posts:profile', post.author)
     return render(request, 'posts/post_create.html', context)
 
 
 @login_required
 def post_edit(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_post_or_404(post_id)
     if request.user != post.author:
         return redirect('posts:post_detail', post_id=post_id)
     form = PostForm(
@@ -78,6 +151,8 @@ def post_edit(request, post_id):
     )
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data:
+            make_thumbnail_later(post.image)
         return redirect('posts:post_detail', post_id)
     context = {
         'post': post,
@@ -89,7 +164,7 @@ def post_edit(request, post_id):
 
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_post_or_404(post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
@@ -107,30 +182,51 @@ def add_comment(request, post_id):
     )
 
 
+def follow_scopes(request):
+    """Подписки пользователя и авторы, на которых он подписан: часть
+    постов ленты читается при открытии, минуя материализованную ленту,
+    и об их изменениях знают только области авторов."""
+    if not hasattr(request, '_follow_scopes'):
+        authors = Follow.objects.filter(user=request.user).values_list(
+            'author__username', flat=True
+        )
+        request._follow_scopes = [
+            follow_scope(request.user.pk),
+            *(author_scope(username) for username in authors),
+        ]
+    return request._follow_scopes
+
+
+@read_from_replica
 @login_required
+@conditional_page(follow_scopes)
 def follow_index(request):
-    posts = (Post.objects.filter(author__following__user=request.user))
-    page_obj = paginator(request, posts)
+    page_obj = paginator(
+        request, follow_feed(request.user), key=FOLLOW_FEED_KEY
+    )
     context = {
         'page_obj': page_obj,
+        'cache_key': feed_cache_key(page_obj, *follow_scopes(request)),
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
 def profile_follow(request, username):
-    user = request.user
-    author = User.objects.get(username=username)
-    is_follower = Follow.objects.filter(user=user, author=author)
-    if user != author and not is_follower.exists():
-        Follow.objects.create(user=user, author=author)
+    author = get_object_or_404(User, username=username)
+    if request.user != author:
+        # Повторная подписка отклоняется ограничением unique_follow,
+        # поэтому проверять её отдельным запросом не нужно.
+        try:
+            with transaction.atomic():
+                Follow.objects.create(user=request.user, author=author)
+        except IntegrityError:
+            pass
     return redirect('posts:profile', author)
 
 
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    is_follower = Follow.objects.filter(user=request.user, author=author)
-    if is_follower.exists():
-        is_follower.delete()
+    Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:profile', username=username)
@@ -1,5 +1,8 @@
-from django.contrib.auth.forms import UserCreationForm
+from django.contrib.auth.forms import PasswordResetForm, UserCreationForm
 from django.contrib.auth import get_user_model
+from django.contrib.sites.shortcuts import get_current_site
+
+from .tasks import send_password_reset
 
 User = get_user_model()
 
@@ -8,3 +11,35 @@ class CreationForm(UserCreationForm):
     class Meta(UserCreationForm.Meta):
         model = User
         fields = ('first_name', 'last_name', 'username', 'email')
+
+
+class QueuedPasswordResetForm(PasswordResetForm):
+    """Письмо для сброса пароля отправляется фоновой задачей.
+
+    В очередь попадает только id пользователя: письмо со ссылкой
+    собирает задача send_password_reset.
+    """
+
+    def save(self, domain_override=None,
+             subject_template_name='registration/password_reset_subject.txt',
+             email_template_name='registration/password_reset_email.html',
+             use_https=False, token_generator=None, from_email=None,
+             request=None, html_email_template_name=None,
+             extra_email_context=None):
+        if domain_override:
+            site_name = domain = domain_override
+        else:
+            current_site = get_current_site(request)
+            site_name, domain = current_site.name, current_site.domain
+        options = {
+            'domain': domain,
+            'site_name': site_name,
+            'use_https': use_https,
+            'subject_template_name': subject_template_name,
+            'email_template_name': email_template_name,
+            'html_email_template_name': html_email_template_name,
+            'from_email': from_email,
+            'extra_email_context': extra_email_context,
+        }
+        for user in self.get_users(self.cleaned_data['email']):
+            send_password_reset.delay(user.pk, options)
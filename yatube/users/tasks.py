@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.forms import PasswordResetForm
+from django.contrib.auth.tokens import default_token_generator
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from core.queue import task
+
+User = get_user_model()
+
+
+@task(max_attempts=5, retry_delay=60)
+def send_password_reset(user_id, options):
+    """Отправляет письмо для сброса пароля.
+
+    Ссылка с токеном создаётся здесь, а не при постановке в очередь:
+    в таблице задач не должно быть действующих ссылок на смену пароля.
+    options — параметры PasswordResetForm.save без token_generator.
+    """
+    user = User._default_manager.filter(pk=user_id, is_active=True).first()
+    if user is None or not user.has_usable_password():
+        return
+    email = getattr(user, User.get_email_field_name())
+    context = {
+        'email': email,
+        'domain': options['domain'],
+        'site_name': options['site_name'],
+        'uid': urlsafe_base64_encode(force_bytes(user.pk)),
+        'user': user,
+        'token': default_token_generator.make_token(user),
+        'protocol': 'https' if options['use_https'] else 'http',
+        **(options['extra_email_context'] or {}),
+    }
+    PasswordResetForm().send_mail(
+        options['subject_template_name'], options['email_template_name'],
+        context, options['from_email'], email,
+        options['html_email_template_name'],
+    )
@@ -12,6 +12,7 @@ from django.contrib.auth.views import (
 )
 
 from . import views
+from .forms import QueuedPasswordResetForm
 
 app_name = 'users'
 
@@ -46,7 +47,8 @@ urlpatterns = [
     path(
         'password_reset/',
         PasswordResetView.as_view
-        (template_name='users/password_reset_form.html'),
+        (template_name='users/password_reset_form.html',
+         form_class=QueuedPasswordResetForm),
         name='password_reset',
     ),
     path(
@@ -0,0 +1,119 @@
+"""SQLite с настройками для работы под нагрузкой.
+
+Движок 'yatube.db.backends.sqlite3' — обычный бэкенд Django, который
+после открытия соединения выполняет PRAGMA из OPTIONS['pragmas'] и
+начинает транзакции с BEGIN OPTIONS['transaction_mode']. Закрытые
+соединения возвращаются в пул из OPTIONS['pool'] (см. pool.py).
+OPTIONS['foreign_keys'] = False отключает проверку внешних ключей —
+для баз, ссылки из которых ведут в таблицы другой базы.
+
+В режиме WAL читатели не ждут писателя, а BEGIN IMMEDIATE берёт
+блокировку записи в начале транзакции: иначе транзакция, которая
+сначала читала, при первой записи сразу получает «database is
+locked», не дожидаясь busy_timeout.
+"""
+import time
+
+from django.db.backends.sqlite3 import base
+
+from .pool import get_pool
+
+# Порядок важен: busy_timeout должен действовать уже при смене
+# journal_mode, которой нужна блокировка базы.
+DEFAULT_PRAGMAS = {
+    'busy_timeout': 5000,
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'mmap_size': 256 * 1024 * 1024,
+    # Отрицательное значение — размер в КиБ, а не в страницах.
+    'cache_size': -64 * 1024,
+    'temp_store': 'memory',
+}
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+# size — сколько простаивающих соединений держать, 0 отключает пул;
+# max_age — через сколько секунд соединение закрывается насовсем.
+DEFAULT_POOL = {'size': 0, 'max_age': 600}
+
+
+def apply_pragmas(connection, pragmas):
+    """Выполняет PRAGMA на соединении sqlite3. Значение None оставляет
+    настройку SQLite по умолчанию."""
+    for name, value in pragmas.items():
+        if value is not None:
+            connection.execute(f'PRAGMA {name} = {value}')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        options = self.settings_dict['OPTIONS']
+        self.pragmas = {**DEFAULT_PRAGMAS, **options.get('pragmas', {})}
+        self.transaction_mode = options.get(
+            'transaction_mode', 'DEFERRED'
+        ).upper()
+        if self.transaction_mode not in TRANSACTION_MODES:
+            raise ValueError(
+                f'transaction_mode должен быть одним из {TRANSACTION_MODES}'
+            )
+        self.pool_options = {**DEFAULT_POOL, **options.get('pool', {})}
+        self.foreign_keys = options.get('foreign_keys', True)
+        self.connected_at = None
+
+    @property
+    def pool(self):
+        """Пул соединений процесса или None, если пул отключён.
+
+        База в памяти живёт, пока открыто соединение, и Django её не
+        закрывает, поэтому для неё пул не нужен.
+        """
+        if self.pool_options['size'] <= 0 or self.is_in_memory_db():
+            return None
+        return get_pool(
+            self.alias, self.settings_dict['NAME'], **self.pool_options
+        )
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        for option in (
+            'pragmas', 'transaction_mode', 'pool', 'foreign_keys',
+        ):
+            params.pop(option, None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        pooled = pool.acquire() if pool is not None else None
+        if pooled is not None:
+            connection, self.connected_at = pooled
+            return connection
+        connection = super().get_new_connection(conn_params)
+        apply_pragmas(connection, self.pragmas)
+        if not self.foreign_keys:
+            connection.execute('PRAGMA foreign_keys = OFF')
+        self.connected_at = time.monotonic()
+        if pool is not None:
+            pool.opened()
+        return connection
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        if self.in_atomic_block:
+            # Соединение закрывают посреди транзакции из-за ошибки:
+            # такое в пул не возвращается.
+            pool.discard(self.connection)
+        else:
+            pool.release(self.connection, self.connected_at)
+
+    def enable_constraint_checking(self):
+        # Вызывается после миграций, которые отключают проверку.
+        if self.foreign_keys:
+            super().enable_constraint_checking()
+
+    def check_constraints(self, table_names=None):
+        if self.foreign_keys:
+            super().check_constraints(table_names)
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
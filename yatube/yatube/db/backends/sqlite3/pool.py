@@ -0,0 +1,139 @@
+"""Пул открытых соединений SQLite.
+
+Django открывает соединение в начале запроса и закрывает в конце, а
+каждое новое соединение — это открытие файла, PRAGMA и регистрация
+десятков SQL-функций Django. Пул забирает закрытые соединения и отдаёт
+их следующему запросу любого потока процесса, проверив, что
+соединение живо.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, deque
+
+# Пулы процесса: (псевдоним, имя базы) -> ConnectionPool.
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    def __init__(self, size, max_age):
+        self.size = size
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.idle = deque()
+        self.in_use = 0
+        self.counters = Counter()
+        self.pid = os.getpid()
+
+    def _check_fork(self):
+        # Соединение SQLite нельзя использовать в дочернем процессе:
+        # после fork пул начинается заново, не трогая унаследованные.
+        if self.pid != os.getpid():
+            self.idle = deque()
+            self.in_use = 0
+            self.pid = os.getpid()
+
+    def acquire(self):
+        """(соединение, время создания) из пула или None."""
+        with self.lock:
+            self._check_fork()
+            while self.idle:
+                connection, created = self.idle.pop()
+                if time.monotonic() - created > self.max_age:
+                    self.counters['expired'] += 1
+                    connection.close()
+                    continue
+                if not self._healthy(connection):
+                    self.counters['discarded'] += 1
+                    try:
+                        connection.close()
+                    except sqlite3.Error:
+                        pass
+                    continue
+                self.in_use += 1
+                self.counters['reused'] += 1
+                return connection, created
+            return None
+
+    def opened(self):
+        """Отмечает новое соединение, созданное вместо взятого из пула."""
+        with self.lock:
+            self._check_fork()
+            self.in_use += 1
+            self.counters['created'] += 1
+
+    def release(self, connection, created):
+        """Возвращает соединение в пул или закрывает, если пул полон,
+        соединение устарело или сломано."""
+        with self.lock:
+            self._check_fork()
+            self.in_use = max(self.in_use - 1, 0)
+            keep = (
+                len(self.idle) < self.size
+                and time.monotonic() - created <= self.max_age
+                and self._reset(connection)
+            )
+            if keep:
+                self.idle.append((connection, created))
+                self.counters['returned'] += 1
+                return
+            self.counters['closed'] += 1
+        connection.close()
+
+    def discard(self, connection):
+        """Закрывает взятое из пула соединение, не возвращая его."""
+        with self.lock:
+            self._check_fork()
+            self.in_use = max(self.in_use - 1, 0)
+            self.counters['closed'] += 1
+        connection.close()
+
+    @staticmethod
+    def _reset(connection):
+        """Откатывает незавершённую транзакцию соединения."""
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+            return True
+        except sqlite3.Error:
+            return False
+
+    @staticmethod
+    def _healthy(connection):
+        try:
+            connection.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def stats(self):
+        with self.lock:
+            return {
+                'size': self.size,
+                'idle': len(self.idle),
+                'in_use': self.in_use,
+                **self.counters,
+            }
+
+    def clear(self):
+        with self.lock:
+            idle, self.idle = self.idle, deque()
+        for connection, _ in idle:
+            connection.close()
+
+
+def get_pool(alias, name, size, max_age):
+    key = alias, str(name)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(size, max_age)
+        return _pools[key]
+
+
+def pool_stats():
+    """Статистика пулов процесса: псевдоним базы -> счётчики."""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {alias: pool.stats() for (alias, _), pool in pools.items()}
@@ -0,0 +1,133 @@
+"""Чтение страниц-лент с реплик базы.
+
+Реплика описывается в DATABASES с ключом REPLICA_OF — псевдонимом
+основной базы, а читают с неё, только если она перечислена в
+settings.DATABASE_REPLICAS, и только представления, обёрнутые в
+read_from_replica. Все остальные запросы и любые записи идут в
+основную базу.
+
+Реплика отстаёт от основной базы, поэтому после изменяющего запроса
+(POST и т. п.) StickyPrimaryMiddleware ставит cookie, и пока она жива,
+пользователь читает из основной базы и видит свои изменения.
+
+Страница, которую кэшируют, читается с реплики, только если реплика
+уже получила все изменения страницы (require_changes): иначе отставшая
+копия попала бы в кэш страниц, фрагментов и ETag под новыми ключами.
+"""
+import functools
+import random
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+STICKY_COOKIE = 'primary_reads'
+# Приложения, которые всегда читаются из основной базы: сессия,
+# записанная при входе, должна быть видна сразу.
+PRIMARY_APPS = {'sessions'}
+
+_state = threading.local()
+
+
+def current_replica():
+    """Реплика для чтения в текущем потоке или None."""
+    if getattr(_state, 'pinned', False):
+        return None
+    return getattr(_state, 'replica', None)
+
+
+def _synced_key(alias):
+    return f'replica-synced:{alias}'
+
+
+def mark_synced(alias, copied_at):
+    """Запоминает, что реплика содержит все изменения основной базы,
+    зафиксированные до copied_at (time.time_ns())."""
+    cache.set(_synced_key(alias), copied_at, None)
+
+
+def require_changes(changed_at):
+    """Переключает текущий запрос на основную базу, если его реплика
+    скопирована раньше changed_at (time.time_ns()) или неизвестно когда.
+    """
+    replica = getattr(_state, 'replica', None)
+    if replica is None:
+        return
+    copied_at = cache.get(_synced_key(replica))
+    if copied_at is None or copied_at < changed_at:
+        _state.replica = None
+
+
+def read_from_replica(view):
+    """Выполняет представление с чтением из случайной реплики.
+
+    Реплика выбирается один раз на запрос, чтобы все его запросы видели
+    одно и то же состояние базы.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or request.method not in ('GET', 'HEAD'):
+            return view(request, *args, **kwargs)
+        previous = getattr(_state, 'replica', None)
+        _state.replica = random.choice(replicas)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _state.replica = previous
+    return wrapper
+
+
+class StickyPrimaryMiddleware:
+    """Закрепляет чтение за основной базой после записи."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        safe = request.method in ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+        _state.pinned = not safe or STICKY_COOKIE in request.COOKIES
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.pinned = False
+        if not safe and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                STICKY_COOKIE, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+
+def primary_of(alias):
+    """Псевдоним основной базы для реплики или сам alias."""
+    return settings.DATABASES.get(alias, {}).get('REPLICA_OF', alias)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB_ALIAS
+        return current_replica()
+
+    def db_for_write(self, model, **hints):
+        # Объект, прочитанный с реплики, сохраняется в её основную базу,
+        # как и объекты, связанные с ним.
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return primary_of(instance._state.db)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if primary_of(obj1._state.db) == primary_of(obj2._state.db):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Реплики — копии основной базы, схема приходит вместе с данными.
+        if primary_of(db) != db:
+            return False
+        return None
@@ -36,6 +36,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ServerTimingMiddleware',
+    'yatube.db.replicas.StickyPrimaryMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -69,11 +71,86 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'yatube.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        'OPTIONS': {
+            # Транзакция сразу берёт блокировку записи и ждёт её
+            # busy_timeout, а не падает с «database is locked».
+            'transaction_mode': 'IMMEDIATE',
+            # Закрытые в конце запроса соединения остаются открытыми
+            # для следующих запросов любого потока процесса.
+            'pool': {'size': 8, 'max_age': 600},
+            # Дополняют и переопределяют DEFAULT_PRAGMAS бэкенда,
+            # None отключает PRAGMA.
+            'pragmas': {
+                'busy_timeout': 5000,
+                'journal_mode': 'wal',
+                'synchronous': 'normal',
+                'mmap_size': 256 * 1024 * 1024,
+                'cache_size': -64 * 1024,
+            },
+        },
+    },
+    # Локальная копия основной базы для чтения лент, обновляется
+    # командой sync_replicas. Используется, только если указана
+    # в DATABASE_REPLICAS.
+    'replica': {
+        'ENGINE': 'yatube.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db-replica.sqlite3'),
+        'REPLICA_OF': 'default',
+        'OPTIONS': {
+            'pragmas': {
+                'journal_mode': 'wal',
+                'mmap_size': 256 * 1024 * 1024,
+                'cache_size': -64 * 1024,
+            },
+        },
+    },
+    # Вторая база для постов и комментариев (posts.shards). Используется,
+    # только если указана в POST_SHARDS.
+    'shard_1': {
+        'ENGINE': 'yatube.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db-shard-1.sqlite3'),
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'pool': {'size': 8, 'max_age': 600},
+            # Авторы и группы постов лежат в основной базе.
+            'foreign_keys': False,
+        },
+    },
+    # Архив старых постов (posts.shards). Используется, только если
+    # указан в POST_ARCHIVE.
+    'archive': {
+        'ENGINE': 'yatube.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db-archive.sqlite3'),
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'foreign_keys': False,
+        },
+    },
 }
 
+DATABASE_ROUTERS = [
+    'posts.shards.ShardRouter',
+    'yatube.db.replicas.ReplicaRouter',
+]
+
+# Псевдонимы баз, с которых читают ленты (yatube.db.replicas).
+DATABASE_REPLICAS = []
+
+# Сколько секунд после записи пользователь читает из основной базы.
+REPLICA_STICKY_SECONDS = 10
+
+# Базы, между которыми посты и комментарии делятся по автору
+# (posts.shards). Порядок менять нельзя: от него зависят база автора
+# и диапазоны id. После добавления базы посты переносит rebalance_shards.
+POST_SHARDS = ['default']
+
+# База, в которую archive_posts переносит посты старше
+# POST_ARCHIVE_AFTER_DAYS дней; None — архива нет.
+POST_ARCHIVE = None
+POST_ARCHIVE_AFTER_DAYS = 365
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -117,8 +194,69 @@ NUMBER_POSTS = 10
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# Двухуровневый кэш: LRU в памяти процесса перед общим для всех
+# процессов кэшем в файле SQLite.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.TieredCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'LOCAL_MAX_ENTRIES': 1000,
+            'LOCAL_TIMEOUT': 5,
+            # Поколения кэша (posts.generations) читаются только из общего
+            # кэша: запись, изменённая в другом процессе, не должна
+            # показывать старую страницу или отвечать 304.
+            'SHARED_ONLY_PREFIXES': ('generation:',),
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    },
+}
+
+TEST_RUNNER = 'core.testing.IsolatedCachesRunner'
+
+# Авторы, у которых подписчиков больше этого числа, не раздают посты
+# в ленты подписчиков: их посты подмешиваются в ленту при чтении.
+TIMELINE_FANOUT_LIMIT = 1000
+# Сколько последних постов автора копируется в ленту при подписке
+# и при пересборке ленты.
+TIMELINE_LENGTH = 800
+
+# Доля запросов, для которых ServerTimingMiddleware собирает показатели.
+SERVER_TIMING_SAMPLE_RATE = 1.0 if DEBUG else 0.01
+
+# Строки ServerTimingMiddleware (JSON на каждый измеренный запрос)
+# выводятся в stderr процесса, только если уровень поднят до 'INFO':
+# по умолчанию они не засоряют вывод тестов и сервера разработки.
+SERVER_TIMING_LOG_LEVEL = 'WARNING'
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {
+            'format': '%(message)s',
+        },
+    },
+    'handlers': {
+        'server_timing': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'core.middleware': {
+            'handlers': ['server_timing'],
+            'level': SERVER_TIMING_LOG_LEVEL,
+            'propagate': False,
+        },
+    },
 }
+
+# Сколько секунд анонимным читателям отдаётся закэшированная страница.
+# Изменения моделей удаляют затронутые страницы из кэша сразу.
+PAGE_CACHE_TIMEOUT = 60 * 60